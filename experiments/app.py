@@ -12,10 +12,55 @@ from src.constants import (
     SECTION_STRUCTURE,
     SEMESTERS,
 )
-from src.pipeline import main
+from src.pipeline import SearchEngine
 
 torch.classes.__path__ = []  # add this line to manually set it to empty.
 
+# config.yamlと同形式
+APP_CONFIG: Dict[str, Any] = {
+    "data": {"input_dir": "data/raw"},
+    "summary": {"summary_dir": "data/summary", "summary_name": "summary_data.json"},
+    "index": {
+        "index_dir": "data/index_selected",
+        "embedding_name": "faiss_index.bin",
+        "processed_data_name": "processed_data.json",
+        "vectors_name": "vectors.npy",
+        "vectors_dtype": "float32",
+    },
+    "preprocessing": {"method": "simple_selected", "chunk_size": 2048, "normalization": True},
+    "embedding": {
+        "method": "e5",
+        "model": "intfloat/multilingual-e5-small",
+        "batch_size": 32,
+        "query_cache_size": 1024,
+    },
+    "search": {
+        "method": "simple",
+        "metadata_filter": {},
+        "top_k": 10,
+    },
+    "reranking": {
+        "method": "bge",
+        "model": "BAAI/bge-reranker-large",
+        "cache_size": 65536,
+        "cache_ttl": 86400,
+    },
+}
+
+
+@st.cache_resource
+def load_search_engine() -> SearchEngine:
+    """
+    検索エンジンを初期化する関数。
+    インデックスとモデルはプロセスごとに一度だけロードされ、以降の検索で使い回される。
+
+    Returns
+    -------
+    SearchEngine
+        初期化済みの検索エンジン
+    """
+    return SearchEngine.from_config(APP_CONFIG)
+
 
 def run_search(
     search_sentence: str,
@@ -67,33 +112,13 @@ def run_search(
         検索結果を辞書形式で返す。結果は以下の形式を持つ。
         {
             "query": str,
+            "num_reranked": int,
             "results": [
-                {"distance": float, "score": float, "metadata": dict},
+                {"distance": float, "score": Optional[float], "metadata": dict},
                 ...
             ]
         }
     """
-    # config.yamlと同形式
-    config: Dict[str, Any] = {
-        "data": {"input_dir": "data/raw"},
-        "summary": {"summary_dir": "data/summary", "summary_name": "summary_data.json"},
-        "index": {
-            "index_dir": "data/index_selected",
-            "embedding_name": "faiss_index.bin",
-            "processed_data_name": "processed_data.json",
-        },
-        "preprocessing": {"method": "simple_selected", "chunk_size": 2048, "normalization": True},
-        "embedding": {"method": "e5", "model": "intfloat/multilingual-e5-small", "batch_size": 32},
-        "search": {
-            "method": "simple",
-            "metadata_filter": {},
-            "top_k": 10,
-        },
-        "reranking": {"method": "bge", "model": "BAAI/bge-reranker-large"},
-        "queries": None,
-    }
-
-    config["queries"] = [search_sentence]
     metadata_filter = {
         "department": selected_department,
         "section": selected_section,
@@ -108,11 +133,10 @@ def run_search(
     if search_teacher == "":
         del metadata_filter["氏名"]
     metadata_filter = {k: v for k, v in metadata_filter.items() if v != EMPTY_OPTION}
-    config["search"]["metadata_filter"] = metadata_filter
-
-    reranked_results_list = main(config)
 
-    return reranked_results_list[0]
+    # st.cache_resourceで包んだ関数の戻り値は型が失われるため、明示的に注釈する
+    engine: SearchEngine = load_search_engine()
+    return engine.search(search_sentence, metadata_filter=metadata_filter, top_k=APP_CONFIG["search"]["top_k"])
 
 
 # ページの設定
@@ -0,0 +1,104 @@
+"""
+モックサーバ(scripts/mock_openai_server.py)を起動し、非同期クライアントのスループットと障害時の挙動を計測するスクリプト。
+
+同時実行数ごとに埋め込みリクエストを送信し、スループット・リトライ数・レイテンシを表示する。
+
+使い方:
+    python scripts/benchmark_api_client.py [n_texts] [latency_ms] [failure_rate]
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from aiohttp import web
+from loguru import logger
+from mock_openai_server import MockOpenAIServer  # スクリプトと同じディレクトリから読み込む
+from src.utils import AsyncApiClient
+
+PORT = 8765
+CONCURRENCY_SETTINGS = [1, 4, 16]
+
+
+async def start_server(server: MockOpenAIServer) -> web.AppRunner:
+    runner = web.AppRunner(server.build_app())
+    await runner.setup()
+    await web.TCPSite(runner, "localhost", PORT).start()
+    return runner
+
+
+async def embed_all(client: AsyncApiClient, texts: List[str]) -> int:
+    batches = await asyncio.gather(*[client.embeddings("mock", texts[i : i + 100]) for i in range(0, len(texts), 100)])
+    return sum(len(batch) for batch in batches)
+
+
+def run_benchmark(n_texts: int = 5000, latency_ms: float = 50.0, failure_rate: float = 0.1) -> List[Dict]:
+    """
+    同時実行数ごとのスループットを計測する。
+
+    Parameters
+    ----------
+    n_texts : int, optional
+        埋め込むテキスト数, by default 5000
+    latency_ms : float, optional
+        モックサーバの各リクエストの遅延(ミリ秒), by default 50.0
+    failure_rate : float, optional
+        モックサーバが429/503を返す割合, by default 0.1
+
+    Returns
+    -------
+    List[Dict]
+        同時実行数ごとの計測結果
+    """
+    server = MockOpenAIServer(latency_ms=latency_ms, failure_rate=failure_rate, dimension=256)
+    server_loop = asyncio.new_event_loop()
+    runner = server_loop.run_until_complete(start_server(server))
+    texts = [f"text {i}" for i in range(n_texts)]
+
+    thread = threading.Thread(target=server_loop.run_forever, daemon=True)
+    thread.start()
+
+    report = []
+    for max_concurrency in CONCURRENCY_SETTINGS:
+        client = AsyncApiClient(
+            f"http://localhost:{PORT}", "dummy", max_concurrency=max_concurrency, backoff_base=0.05, max_retries=10
+        )
+        start = time.perf_counter()
+        n_embedded = client.run(embed_all(client, texts))
+        elapsed = time.perf_counter() - start
+        stats = client.stats()["embeddings"]
+        client.close()
+        report.append(
+            {
+                "max_concurrency": max_concurrency,
+                "texts_per_sec": n_embedded / elapsed,
+                "requests": stats["requests"],
+                "retries": stats["retries"],
+                "failures": stats["failures"],
+                "latency_ms_p50": stats["latency_ms_p50"],
+                "latency_ms_p95": stats["latency_ms_p95"],
+            }
+        )
+        logger.info(f"max_concurrency={max_concurrency}: {n_embedded} texts in {elapsed:.2f}s")
+
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), server_loop).result()
+    server_loop.call_soon_threadsafe(server_loop.stop)
+
+    print("| concurrency | texts/s | requests | retries | failures | p50 (ms) | p95 (ms) |")
+    print("| --- | --- | --- | --- | --- | --- | --- |")
+    for row in report:
+        print(
+            f"| {row['max_concurrency']} | {row['texts_per_sec']:.1f} | {row['requests']} | {row['retries']} "
+            f"| {row['failures']} | {row['latency_ms_p50']:.1f} | {row['latency_ms_p95']:.1f} |"
+        )
+    return report
+
+
+if __name__ == "__main__":
+    n_texts = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50.0
+    failure_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+
+    run_benchmark(n_texts, latency_ms, failure_rate)
@@ -0,0 +1,154 @@
+"""
+インデックスの種類・検索時パラメータごとに、Flatインデックスに対する再現率と検索レイテンシを比較するスクリプト。
+
+インデックス構築時に保存したベクトル行列(vectors.npy)から一部をクエリとして取り出し、
+残りのベクトルで各インデックスを構築して評価する。
+
+使い方:
+    python scripts/benchmark_index.py configs/base_config.yaml [n_queries] [top_k]
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+import yaml
+from loguru import logger
+from src.pipeline import build_faiss_index, get_vectors_path
+from src.search import build_search_parameters
+from src.utils import load_npy, save_json
+
+# 評価するインデックスの設定と、それぞれで試す検索時パラメータ
+BENCHMARK_SETTINGS: List[Dict] = [
+    {"index": {"type": "flat", "quantization": "fp16"}, "search_params": [{}]},
+    {"index": {"type": "flat", "quantization": "int8"}, "search_params": [{}]},
+    {"index": {"type": "ivf_flat", "nlist": 256}, "search_params": [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)]},
+    {
+        "index": {"type": "ivf_pq", "nlist": 256, "pq_m": 16, "pq_nbits": 8},
+        "search_params": [{"nprobe": n} for n in (1, 4, 8, 16, 32, 64)],
+    },
+    {
+        "index": {"type": "hnsw", "hnsw_m": 32, "ef_construction": 200},
+        "search_params": [{"ef_search": n} for n in (16, 32, 64, 128, 256)],
+    },
+]
+
+
+def measure(index: faiss.Index, queries: np.ndarray, top_k: int, params: Optional[faiss.SearchParameters]) -> Dict:
+    """
+    1クエリずつ検索した際のレイテンシと、一括検索の結果を返す。
+    """
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query.reshape(1, -1), top_k, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+    _, indices = index.search(queries, top_k, params=params)
+    return {
+        "indices": indices,
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+    }
+
+
+def recall_at_k(ground_truth: np.ndarray, indices: np.ndarray) -> float:
+    """
+    Flatインデックスの検索結果に対する再現率(recall@k)を計算する。
+    """
+    hits = [len(set(gt[gt >= 0]) & set(pred[pred >= 0])) for gt, pred in zip(ground_truth, indices)]
+    return float(np.sum(hits) / np.sum(ground_truth >= 0))
+
+
+def run_benchmark(config_path: str, n_queries: int = 200, top_k: int = 10) -> List[Dict]:
+    """
+    再現率とレイテンシのレポートを作成して保存する。
+
+    Parameters
+    ----------
+    config_path : str
+        インデックスを構築した設定ファイルのパス
+    n_queries : int, optional
+        クエリとして使うベクトル数, by default 200
+    top_k : int, optional
+        取得する上位K件, by default 10
+
+    Returns
+    -------
+    List[Dict]
+        設定ごとの評価結果
+    """
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    vectors = np.asarray(load_npy(get_vectors_path(config)), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    query_mask = np.zeros(len(vectors), dtype=bool)
+    query_mask[rng.choice(len(vectors), size=min(n_queries, len(vectors) // 2), replace=False)] = True
+    queries = np.ascontiguousarray(vectors[query_mask])
+    database = np.ascontiguousarray(vectors[~query_mask])
+    logger.info(f"Benchmarking with {len(database)} vectors and {len(queries)} queries (top_k={top_k})")
+
+    # 正解となるFlatインデックスの結果
+    flat_index = build_faiss_index(database, {"type": "flat"})
+    flat = measure(flat_index, queries, top_k, None)
+    ground_truth = flat["indices"]
+
+    report = [
+        {
+            "index": {"type": "flat"},
+            "search_params": {},
+            "recall": 1.0,
+            "latency_ms_p50": flat["latency_ms_p50"],
+            "latency_ms_p95": flat["latency_ms_p95"],
+            "build_sec": 0.0,
+            "index_mb": len(faiss.serialize_index(flat_index)) / 1024**2,
+        }
+    ]
+    for setting in BENCHMARK_SETTINGS:
+        start = time.perf_counter()
+        index = build_faiss_index(database, setting["index"])
+        build_sec = time.perf_counter() - start
+        index_mb = len(faiss.serialize_index(index)) / 1024**2
+        for search_params in setting["search_params"]:
+            result = measure(index, queries, top_k, build_search_parameters(index, None, search_params))
+            report.append(
+                {
+                    "index": setting["index"],
+                    "search_params": search_params,
+                    "recall": recall_at_k(ground_truth, result["indices"]),
+                    "latency_ms_p50": result["latency_ms_p50"],
+                    "latency_ms_p95": result["latency_ms_p95"],
+                    "build_sec": build_sec,
+                    "index_mb": index_mb,
+                }
+            )
+
+    print(f"| index | search params | recall@{top_k} | p50 (ms) | p95 (ms) | build (s) | size (MB) |")
+    print("| --- | --- | --- | --- | --- | --- | --- |")
+    for row in report:
+        print(
+            f"| {row['index']} | {row['search_params']} | {row['recall']:.3f} | {row['latency_ms_p50']:.3f} "
+            f"| {row['latency_ms_p95']:.3f} | {row['build_sec']:.1f} | {row['index_mb']:.1f} |"
+        )
+
+    output_path = os.path.join("results/index_benchmark", f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    save_json(report, output_path)
+    logger.info(f"Saved benchmark report to {output_path}")
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python scripts/benchmark_index.py <config_path> [n_queries] [top_k]")
+        sys.exit(1)
+
+    config_path = sys.argv[1]
+    n_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    top_k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+
+    run_benchmark(config_path, n_queries, top_k)
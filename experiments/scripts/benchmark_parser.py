@@ -0,0 +1,88 @@
+"""
+SyllabusParserのパース方式ごとの処理時間を比較し、通常のモードと抽出結果が一致するかを確認するスクリプト。
+
+通常のモード(見出しごとに文書全体を探索する)の結果を正解として、1回の走査で見出しを索引化するモードや
+lxmlパーサの結果と全ページで比較する。一致しないページがある場合は終了コード1で終了する。
+
+使い方:
+    python scripts/benchmark_parser.py [html_dir_or_archive] [max_pages]
+"""
+
+import sys
+import time
+from typing import Dict, List
+
+from loguru import logger
+from src.utils import SyllabusParser, load_htmls_under_dir
+
+# 比較するパース方式 (名前, SyllabusParserの引数)
+PARSER_SETTINGS: List[Dict] = [
+    {"name": "baseline", "single_pass": False, "features": "html.parser"},
+    {"name": "single_pass", "single_pass": True, "features": "html.parser"},
+    {"name": "single_pass+lxml", "single_pass": True, "features": "lxml"},
+]
+
+
+def run_benchmark(html_dir: str = "data/raw", max_pages: int = 0) -> List[Dict]:
+    """
+    パース方式ごとの処理時間と、通常のモードとの不一致ページ数を計測する。
+
+    Parameters
+    ----------
+    html_dir : str, optional
+        HTMLファイルが格納されているディレクトリ、またはアーカイブのパス, by default "data/raw"
+    max_pages : int, optional
+        計測に使うページ数の上限(0の場合は全ページ), by default 0
+
+    Returns
+    -------
+    List[Dict]
+        パース方式ごとの計測結果
+    """
+    pages = load_htmls_under_dir(html_dir)
+    if max_pages:
+        pages = pages[:max_pages]
+    logger.info(f"Loaded {len(pages)} pages from {html_dir}")
+
+    golden: List[Dict] = []
+    report: List[Dict] = []
+    for setting in PARSER_SETTINGS:
+        try:
+            start = time.perf_counter()
+            parsed = [
+                SyllabusParser(page["html_content"], setting["single_pass"], setting["features"]).parse()
+                for page in pages
+            ]
+            elapsed = time.perf_counter() - start
+        except Exception as e:  # lxmlがインストールされていない場合など
+            logger.warning(f"{setting['name']}: skipped ({e})")
+            continue
+        if not golden:
+            golden = parsed
+        mismatches = [page["lecture_no"] for page, a, b in zip(pages, golden, parsed) if a != b]
+        for lecture_no in mismatches[:10]:
+            logger.warning(f"{setting['name']}: mismatch on {lecture_no}")
+        report.append(
+            {
+                "name": setting["name"],
+                "pages_per_sec": len(pages) / elapsed if elapsed > 0 else float("inf"),
+                "speedup": report[0]["elapsed"] / elapsed if report and elapsed > 0 else 1.0,
+                "elapsed": elapsed,
+                "mismatches": len(mismatches),
+            }
+        )
+
+    print("| parser | pages/s | speedup | mismatches |")
+    print("| --- | --- | --- | --- |")
+    for row in report:
+        print(f"| {row['name']} | {row['pages_per_sec']:.1f} | {row['speedup']:.2f}x | {row['mismatches']} |")
+    return report
+
+
+if __name__ == "__main__":
+    html_dir = sys.argv[1] if len(sys.argv) > 1 else "data/raw"
+    max_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+    report = run_benchmark(html_dir, max_pages)
+    if any(row["mismatches"] for row in report):
+        sys.exit(1)
@@ -0,0 +1,176 @@
+"""
+OpenAI互換APIのモックサーバ。ネットワークやAPIキーなしで、埋め込み・リランキング・要約バッチの動作確認や
+スループット・リトライの検証を行うために使う。
+
+以下のエンドポイントを提供する。
+    POST /embeddings, POST /chat/completions, POST /files, GET /files/{id}/content,
+    POST /batches, GET /batches/{id}
+
+使い方:
+    python scripts/mock_openai_server.py [--port 8000] [--latency-ms 50] [--failure-rate 0.1] [--dimension 768]
+
+クライアント側はベースURLに http://localhost:8000 を指定する (設定の embedding.base_url / reranking.base_url、
+要約スクリプトでは環境変数 OPEN_AI_BASE_URL)。
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from typing import Dict, List
+
+import numpy as np
+from aiohttp import web
+
+
+def mock_embedding(text: str, dimension: int) -> List[float]:
+    """
+    テキストのハッシュ値から決まる、再現性のある単位ベクトル。
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension)
+    embedding: List[float] = (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+    return embedding
+
+
+def mock_chat_content(messages: List[Dict]) -> str:
+    """
+    リランキングのプロンプトには番号付きの講義数分のスコアを、それ以外には要約を模したテキストを返す。
+    """
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    n_items = len(re.findall(r"^\d+\. 講義名:", prompt, flags=re.MULTILINE))
+    if n_items:
+        rng = random.Random(prompt)
+        return json.dumps({"scores": [rng.randint(1, 10) for _ in range(n_items)]})
+    return "- " + prompt[:100].replace("\n", " ")
+
+
+def chat_completion_response(model: str, content: str) -> Dict:
+    return {
+        "id": f"chatcmpl-{random.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+
+class MockOpenAIServer:
+    """
+    OpenAI互換APIのモック。レイテンシと、一定の割合で429/503を返す障害を注入できる。
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        dimension: int = 768,
+        batch_duration: float = 1.0,
+    ):
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.dimension = dimension
+        self.batch_duration = batch_duration
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict] = {}
+        self.n_requests = 0
+        self.n_failures = 0
+
+    @web.middleware
+    async def inject(self, request: web.Request, handler):  # type: ignore
+        """
+        レイテンシと障害を注入するミドルウェア。
+        """
+        self.n_requests += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        if random.random() < self.failure_rate:
+            self.n_failures += 1
+            if random.random() < 0.5:
+                return web.json_response(
+                    {"error": {"message": "Rate limit exceeded"}}, status=429, headers={"Retry-After": "0.1"}
+                )
+            return web.json_response({"error": {"message": "Service unavailable"}}, status=503)
+        return await handler(request)
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = [
+            {"object": "embedding", "index": i, "embedding": mock_embedding(text, self.dimension)}
+            for i, text in enumerate(texts)
+        ]
+        return web.json_response({"object": "list", "data": data, "model": body["model"]})
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        return web.json_response(chat_completion_response(body["model"], mock_chat_content(body["messages"])))
+
+    async def create_file(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        file = form["file"]
+        file_id = f"file-{len(self.files)}"
+        self.files[file_id] = file.file.read() if hasattr(file, "file") else str(file).encode("utf-8")
+        return web.json_response({"id": file_id, "object": "file", "purpose": form.get("purpose")})
+
+    async def file_content(self, request: web.Request) -> web.Response:
+        file_id = request.match_info["file_id"]
+        if file_id not in self.files:
+            return web.json_response({"error": {"message": "File not found"}}, status=404)
+        return web.Response(body=self.files[file_id], content_type="application/jsonl")
+
+    async def create_batch(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        batch_id = f"batch-{len(self.batches)}"
+        self.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "input_file_id": body["input_file_id"],
+            "status": "in_progress",
+            "output_file_id": None,
+            "created_at": time.time(),
+        }
+        return web.json_response(self.batches[batch_id])
+
+    async def retrieve_batch(self, request: web.Request) -> web.Response:
+        batch = self.batches.get(request.match_info["batch_id"])
+        if batch is None:
+            return web.json_response({"error": {"message": "Batch not found"}}, status=404)
+        if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= self.batch_duration:
+            # 一定時間経過したバッチは、入力ファイルの各行にチャット補完を実行して完了とする
+            lines = []
+            for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines():
+                task = json.loads(line)
+                content = mock_chat_content(task["body"]["messages"])
+                response = {"status_code": 200, "body": chat_completion_response(task["body"]["model"], content)}
+                lines.append(json.dumps({"custom_id": task["custom_id"], "response": response}, ensure_ascii=False))
+            output_file_id = f"file-{len(self.files)}"
+            self.files[output_file_id] = "\n".join(lines).encode("utf-8")
+            batch.update({"status": "completed", "output_file_id": output_file_id})
+        return web.json_response(batch)
+
+    def build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self.inject], client_max_size=1024**3)
+        app.router.add_post("/embeddings", self.embeddings)
+        app.router.add_post("/chat/completions", self.chat_completions)
+        app.router.add_post("/files", self.create_file)
+        app.router.add_get("/files/{file_id}/content", self.file_content)
+        app.router.add_post("/batches", self.create_batch)
+        app.router.add_get("/batches/{batch_id}", self.retrieve_batch)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI互換APIのモックサーバ")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="各リクエストに加える遅延(ミリ秒)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="429/503を返す割合")
+    parser.add_argument("--dimension", type=int, default=768, help="埋め込みベクトルの次元数")
+    parser.add_argument("--batch-duration", type=float, default=1.0, help="バッチジョブが完了するまでの秒数")
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(args.latency_ms, args.failure_rate, args.dimension, args.batch_duration)
+    web.run_app(server.build_app(), host=args.host, port=args.port)
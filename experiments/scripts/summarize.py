@@ -1,14 +1,21 @@
+import asyncio
 import json
 import os
 import re
-import time
+from itertools import islice
 from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
 from loguru import logger
-from openai import OpenAI
 from src.constants import ID_TO_LECTURE
-from src.utils import SyllabusParser, load_htmls_under_dir, save_json, save_list_json
+from src.utils import (
+    AsyncApiClient,
+    ParsedSyllabusStore,
+    SyllabusParser,
+    iter_htmls_under_dir,
+    save_json,
+    save_list_json,
+)
 
 
 def parse_html(html_content: str) -> Dict[str, Optional[str]]:
@@ -25,7 +32,7 @@ def parse_html(html_content: str) -> Dict[str, Optional[str]]:
     Dict[str, Optional[str]]
         パース結果の辞書
     """
-    parser = SyllabusParser(html_content)
+    parser = SyllabusParser(html_content, single_pass=True)
     data = parser.parse()
     return data
 
@@ -49,7 +56,7 @@ def normalize_text(text: str) -> str:
     return text
 
 
-def batch_json_data(model: str, data: List[Dict]) -> List[Dict]:
+def batch_json_data(model: str, data: List[Dict], parsed_store: Optional[ParsedSyllabusStore] = None) -> List[Dict]:
     """
     バッチ処理のためのプロンプトの作成を行う。
 
@@ -61,27 +68,36 @@ def batch_json_data(model: str, data: List[Dict]) -> List[Dict]:
     data : List[Dict]
         要約するテキスト
 
+    parsed_store : ParsedSyllabusStore, optional
+        HTMLのパース結果のストア。前処理と共有し、保存済みの科目は再パースしない
+
     Returns
     -------
     List[Dict]
         バッチ処理のためのプロンプト
     """
     texts = []
+    lecture_nos = []
     for entry in data:
         html_content = entry.get("html_content", "")
         lecture_no = entry.get("lecture_no", "")
         lecture_info = ID_TO_LECTURE[lecture_no]
-        parsed_content = parse_html(html_content)
+        if parsed_store is not None:
+            parsed_content = parsed_store.get_or_parse(lecture_no, html_content, parse_html)
+        else:
+            parsed_content = parse_html(html_content)
         text = "\n".join([f"{k}: {v}" for k, v in parsed_content.items()])
         text = normalize_text(text)
         text = "科目名は" + lecture_info["lecture_name"] + "。" + text
         texts.append(text)
+        lecture_nos.append(lecture_no)
 
     tasks = []
 
     for i in range(len(texts)):
         task = {
-            "custom_id": f"task-{i}",
+            # バッチの出力は入力の順に並ぶとは限らないため、科目番号で要約を対応づける
+            "custom_id": lecture_nos[i],
             "method": "POST",
             "url": "/v1/chat/completions",
             "body": {
@@ -99,76 +115,112 @@ def batch_json_data(model: str, data: List[Dict]) -> List[Dict]:
     return tasks
 
 
-def summarize(file_name: str) -> List[str]:
+def is_prompt_data_current(prompt_data_path: str, lecture_nos: List[str]) -> bool:
+    """
+    保存済みのプロンプトデータが、指定した科目を同じ順に含むかを確認する。
+
+    以前の形式(custom_idが "task-{i}")のファイルや、読み込み順の変更・科目の追加削除で
+    対象の科目がずれたファイルはFalseとなり、作り直す。
+
+    Parameters
+    ----------
+    prompt_data_path : str
+        プロンプトデータのパス
+    lecture_nos : List[str]
+        プロンプトデータに含まれるべき科目番号のリスト
+
+    Returns
+    -------
+    bool
+        保存済みのプロンプトデータをそのまま使えるかどうか
+    """
+    if not os.path.exists(prompt_data_path):
+        return False
+    with open(prompt_data_path, "r", encoding="utf-8") as f:
+        custom_ids = [json.loads(line)["custom_id"] for line in f if line.strip()]
+    return custom_ids == lecture_nos
+
+
+async def summarize(client: AsyncApiClient, file_name: str) -> Dict[str, str]:
     """
     要約を実行する。
 
     Parameters
     ----------
+    client : AsyncApiClient
+        OpenAI APIのクライアント
     file_name : str
         プロンプトのデータ。
     Returns
     -------
-    List[str]
-        要約したデータ。
+    Dict[str, str]
+        科目番号から要約への対応。
     """
-    load_dotenv()
-
-    api_key = os.getenv("OPEN_AI_API_KEY")
-
-    if not api_key:
-        raise ValueError("OpenAI API key must be provided either via parameter or environment variable.")
-
-    client = OpenAI(
-        api_key=api_key,
-        base_url="https://api.openai.com/v1",
-    )
-    batch_file = client.files.create(file=open(file_name, "rb"), purpose="batch")
-    batch_job = client.batches.create(
-        input_file_id=batch_file.id, endpoint="/v1/chat/completions", completion_window="24h"
-    )
-    batch_job = client.batches.retrieve(batch_job.id)
-
-    while batch_job.status != "completed":
-        time.sleep(10)
-        batch_job = client.batches.retrieve(batch_job.id)
-        if batch_job.status == "failed":
-            raise ValueError("Input file is too large or its format is wrong")
-
-    result_file_id = batch_job.output_file_id
+    batch_file = await client.upload_file(file_name, purpose="batch")
+    batch_job = await client.create_batch(batch_file["id"], endpoint="/v1/chat/completions", completion_window="24h")
+    logger.info(f"Submitted batch job {batch_job['id']} for {file_name}")
+
+    batch_job = await client.wait_for_batch(batch_job["id"])
+    if batch_job["status"] != "completed":
+        raise ValueError("Input file is too large or its format is wrong")
+
+    result_file_id = batch_job.get("output_file_id")
     if result_file_id is None:
         raise ValueError("result_file_id is None")
     else:
-        result = client.files.content(result_file_id).content
+        result = await client.file_content(result_file_id)
 
     result_str = result.decode("utf-8")
     json_lines = result_str.splitlines()
 
-    results = []
+    results = {}
     for line in json_lines:
         json_object = json.loads(line)
-        results.append(json_object["response"]["body"]["choices"][0]["message"]["content"])
+        results[json_object["custom_id"]] = json_object["response"]["body"]["choices"][0]["message"]["content"]
     return results
 
 
-summary_data_path = os.path.join("data/summary", "summary_data.json")
-model = "gpt-4o-mini"
+async def summarize_all(client: AsyncApiClient, file_names: List[str]) -> Dict[str, str]:
+    """
+    複数のプロンプトファイルのバッチジョブを同時に投入し、科目番号から要約への対応にまとめる。
+    """
+    results = await asyncio.gather(*[summarize(client, file_name) for file_name in file_names])
+    return {lecture_no: summary for summaries in results for lecture_no, summary in summaries.items()}
 
-raw_data = load_htmls_under_dir("data/raw")
-logger.info(f"Loaded {len(raw_data)} records from data/raw")
 
-summary_data = []
-for i in range(0, len(raw_data), 3000):
-    prompt_data_path = os.path.join("data/summary", f"summary_prompt{i//3000+1}.json")
-    if not os.path.exists(prompt_data_path):
-        # プロンプトデータ保存
-        prompt_data = batch_json_data(model, raw_data[i : i + 3000])
+summary_data_path = os.path.join("data/summary", "summary_data.json")
+model = "gpt-4o-mini"
+parsed_store = ParsedSyllabusStore(os.getenv("PARSED_STORE_PATH", "data/cache/parsed_syllabi.sqlite"))
+
+# HTMLを1件ずつ読み込み、3000件ごとにプロンプトデータを作成する(メモリに載せるのは3000件分のみ)
+raw_data_path = os.getenv("RAW_DATA_PATH", "data/raw")
+raw_data = iter_htmls_under_dir(raw_data_path, prefetch_workers=4)
+n_records = 0
+prompt_data_paths: List[str] = []
+while True:
+    entries = list(islice(raw_data, 3000))
+    if not entries:
+        break
+    n_records += len(entries)
+    prompt_data_path = os.path.join("data/summary", f"summary_prompt{len(prompt_data_paths)+1}.json")
+    if not is_prompt_data_current(prompt_data_path, [entry["lecture_no"] for entry in entries]):
+        # プロンプトデータ保存(保存済みのファイルが古い場合は作り直す)
+        prompt_data = batch_json_data(model, entries, parsed_store)
         os.makedirs(os.path.dirname(prompt_data_path), exist_ok=True)
         save_list_json(prompt_data, prompt_data_path)
         logger.info(f"Saved prompt data to {prompt_data_path}")
-
-    # 要約データ保存
-    summary_data.extend(summarize(prompt_data_path))
+    prompt_data_paths.append(prompt_data_path)
+logger.info(f"Loaded {n_records} records from {raw_data_path}")
+
+# 要約データ保存
+load_dotenv()
+api_key = os.getenv("OPEN_AI_API_KEY")
+if not api_key:
+    raise ValueError("OpenAI API key must be provided either via parameter or environment variable.")
+client = AsyncApiClient(base_url=os.getenv("OPEN_AI_BASE_URL", "https://api.openai.com/v1"), api_key=api_key)
+summary_data = client.run(summarize_all(client, prompt_data_paths))
+logger.info(f"API stats: {client.stats()}")
+client.close()
 os.makedirs(os.path.dirname(summary_data_path), exist_ok=True)
 save_json(summary_data, summary_data_path)
 logger.info(f"Saved summary data to {summary_data_path}")
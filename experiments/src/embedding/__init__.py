@@ -1,7 +1,22 @@
 # src/embedding/__init__.py
 
 from .base import BaseEmbedder
+from .cache import EmbeddingCache
 from .e5_embedder import E5Embedder
 from .gemini_embedder import GeminiEmbedder
+from .onnx_encoder import OnnxEncoder, backend_model_name
+from .parallel import ParallelEmbedder
+from .query_cache import QueryCachingEmbedder
+from .writer import CheckpointedEmbeddingWriter
 
-__all__ = ["BaseEmbedder", "GeminiEmbedder", "E5Embedder"]
+__all__ = [
+    "BaseEmbedder",
+    "CheckpointedEmbeddingWriter",
+    "EmbeddingCache",
+    "GeminiEmbedder",
+    "E5Embedder",
+    "OnnxEncoder",
+    "ParallelEmbedder",
+    "QueryCachingEmbedder",
+    "backend_model_name",
+]
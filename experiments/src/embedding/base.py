@@ -1,9 +1,12 @@
 # src/embedding/base.py
 
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Callable, Dict, List, Optional
 
 import numpy as np
+from loguru import logger
+
+from .cache import EmbeddingCache
 
 
 class BaseEmbedder(ABC):
@@ -11,6 +14,13 @@ class BaseEmbedder(ABC):
     埋め込み生成の基底クラス
     """
 
+    # キャッシュのキーに使うモデル名と、埋め込みの永続キャッシュ
+    model_name: str = ""
+    cache: Optional[EmbeddingCache] = None
+    # モデルに入力する前にパッセージ・クエリに付与する接頭辞。キャッシュのキーに含める
+    passage_prefix: str = ""
+    query_prefix: str = ""
+
     @abstractmethod
     def embed_passage(self, texts: List[str]) -> np.ndarray:
         """
@@ -44,3 +54,42 @@ class BaseEmbedder(ABC):
             埋め込みベクトルの配列
         """
         pass
+
+    def _embed_with_cache(
+        self, texts: List[str], prefix: str, embed_fn: Callable[[List[str]], np.ndarray]
+    ) -> np.ndarray:
+        """
+        キャッシュに存在しないテキストのみを `embed_fn` で埋め込み、結果をキャッシュに保存する。
+
+        Parameters
+        ----------
+        texts : List[str]
+            埋め込むテキストのリスト
+        prefix : str
+            `embed_fn` がテキストに付与する接頭辞。キャッシュのキーに含める。
+        embed_fn : Callable[[List[str]], np.ndarray]
+            テキストのリストを埋め込む関数
+
+        Returns
+        -------
+        np.ndarray
+            埋め込みベクトルの配列
+        """
+        if self.cache is None:
+            return embed_fn(texts)
+
+        keys = [EmbeddingCache.make_key(self.model_name, prefix, text) for text in texts]
+        vectors = self.cache.get_many(list(set(keys)))
+
+        # キャッシュにないテキストは重複を除いて埋め込む
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} of {len(texts)} texts served without the model")
+        if missing:
+            new_vectors = dict(zip(missing.keys(), embed_fn(list(missing.values()))))
+            self.cache.put_many(new_vectors)
+            vectors.update(new_vectors)
+
+        return np.array([vectors[key] for key in keys], dtype=np.float32)
@@ -0,0 +1,146 @@
+# src/embedding/cache.py
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from src.utils import text_hash
+
+
+class EmbeddingCache:
+    """
+    埋め込みベクトルをSQLiteに保存する永続キャッシュ。
+    (モデル名, 接頭辞, テキストのハッシュ値) をキーとし、件数・容量の上限を超えた場合は最終参照が古いものから削除する。
+    """
+
+    def __init__(self, path: str, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        """
+        Parameters
+        ----------
+        path : str
+            SQLiteファイルのパス
+        max_entries : int, optional
+            保存する最大件数
+        max_bytes : int, optional
+            保存するベクトルの最大合計バイト数
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, nbytes INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model: str, prefix: str, text: str) -> str:
+        """
+        キャッシュのキーを作成する。
+
+        Parameters
+        ----------
+        model : str
+            埋め込みモデル名
+        prefix : str
+            テキストに付与する接頭辞 ("query: " など)
+        text : str
+            埋め込むテキスト
+
+        Returns
+        -------
+        str
+            キャッシュのキー
+        """
+        return f"{model}\t{prefix}\t{text_hash(text)}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        キーに対応する埋め込みベクトルを取得し、最終参照時刻を更新する。
+
+        Parameters
+        ----------
+        keys : List[str]
+            キャッシュのキーのリスト
+
+        Returns
+        -------
+        Dict[str, np.ndarray]
+            キャッシュに存在したキーと埋め込みベクトルの辞書
+        """
+        found: Dict[str, np.ndarray] = {}
+        with self.lock:
+            # SQLiteの変数の上限を超えないよう分割して問い合わせる
+            for i in range(0, len(keys), 500):
+                batch = keys[i : i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE key = ?", [(time.time(), key) for key, _ in rows]
+                )
+            self.conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        """
+        埋め込みベクトルを保存し、上限を超えた分を削除する。
+
+        Parameters
+        ----------
+        items : Dict[str, np.ndarray]
+            キャッシュのキーと埋め込みベクトルの辞書
+        """
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            data = np.ascontiguousarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, data, len(data), now))
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, nbytes, last_access) VALUES (?, ?, ?, ?)", rows
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        """
+        件数・容量の上限を超えている場合、最終参照が古いものから削除する。
+        """
+        if self.max_entries is not None:
+            (n_entries,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if n_entries > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_access ASC LIMIT ?)",
+                    (n_entries - self.max_entries,),
+                )
+        if self.max_bytes is not None:
+            (total_bytes,) = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()
+            if total_bytes > self.max_bytes:
+                excess = total_bytes - self.max_bytes
+                keys = []
+                for key, nbytes in self.conn.execute("SELECT key, nbytes FROM embeddings ORDER BY last_access ASC"):
+                    keys.append((key,))
+                    excess -= nbytes
+                    if excess <= 0:
+                        break
+                self.conn.executemany("DELETE FROM embeddings WHERE key = ?", keys)
+
+    def __len__(self) -> int:
+        with self.lock:
+            (n_entries,) = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return int(n_entries)
@@ -1,14 +1,16 @@
 # src/embedding/e5_embedder.py
 
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 import torch
 from loguru import logger
 from tqdm import tqdm
-from transformers import AutoModel, AutoTokenizer
+from transformers import AutoConfig, AutoModel, AutoTokenizer, BatchEncoding
 
 from .base import BaseEmbedder
+from .cache import EmbeddingCache
+from .onnx_encoder import OnnxEncoder, backend_model_name
 
 
 class E5Embedder(BaseEmbedder):
@@ -16,9 +18,57 @@ class E5Embedder(BaseEmbedder):
     multilingual-e5-smallの埋め込みモデルを使用するクラス。
     """
 
-    def __init__(self, model: str = "intfloat/multilingual-e5-small", batch_size: int = 16) -> None:
+    passage_prefix = "passage: "
+    query_prefix = "query: "
+
+    def __init__(
+        self,
+        model: str = "intfloat/multilingual-e5-small",
+        batch_size: int = 16,
+        cache: Optional[EmbeddingCache] = None,
+        max_tokens_per_batch: Optional[int] = None,
+        backend: str = "torch",
+        quantize: bool = False,
+        onnx_cache_dir: str = "data/cache/onnx",
+        num_threads: Optional[int] = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        model : str
+            埋め込みモデル名
+        batch_size : int
+            1バッチあたりのテキスト数
+        cache : EmbeddingCache, optional
+            埋め込みの永続キャッシュ
+        max_tokens_per_batch : int, optional
+            指定した場合、テキストをトークン長の順に並べ、パディング込みのトークン数がこの値以下になるようにバッチを作る
+        backend : str
+            推論に使うバックエンド ("torch" または "onnx")
+        quantize : bool
+            ONNXバックエンドで、重みをint8に動的量子化したグラフを使うかどうか
+        onnx_cache_dir : str
+            書き出したONNXグラフを保存するディレクトリ
+        num_threads : int, optional
+            ONNXバックエンドのintra-opスレッド数
+        """
         self.model = model
+        # ONNX・int8量子化のモデルの埋め込みは、キャッシュ上でtorchのモデルと区別する
+        self.model_name = backend_model_name(model, backend, quantize)
         self.batch_size = batch_size
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.cache = cache
+        self.hidden_size = AutoConfig.from_pretrained(model).hidden_size
+        self.onnx_encoder: Optional[OnnxEncoder] = None
+        if backend == "onnx":
+            # GPUのないCPU環境向けに、ONNX Runtimeで推論する
+            self.onnx_encoder = OnnxEncoder(
+                model, cache_dir=onnx_cache_dir, quantize=quantize, num_threads=num_threads
+            )
+            self.tokenizer = self.onnx_encoder.tokenizer
+            logger.info(f"Backend: onnx (quantize={quantize})")
+            return
+
         if torch.cuda.is_available():
             self.device = torch.device("cuda")
         elif torch.backends.mps.is_available():
@@ -43,7 +93,10 @@ class E5Embedder(BaseEmbedder):
         np.ndarray
             埋め込みベクトルの配列
         """
-        embeddings: List[np.ndarray] = []
+        if self.max_tokens_per_batch is not None:
+            return self._embed_by_token_budget(texts)
+
+        embeddings = np.zeros((len(texts), self.hidden_size), dtype=np.float32)
         for i in tqdm(range(0, len(texts), self.batch_size)):
             batch_dict = self.tokenizer(
                 texts[i : i + self.batch_size],
@@ -52,19 +105,91 @@ class E5Embedder(BaseEmbedder):
                 truncation=True,
                 return_tensors="pt",
             )
-            with torch.no_grad():
-                outputs = self.model(**batch_dict.to(self.device))  # type: ignore
-            embeddings.extend(
-                self._average_pool(
-                    outputs.last_hidden_state,
-                    batch_dict["attention_mask"],
-                )
-                .cpu()
-                .detach()
-                .numpy()
+            embeddings[i : i + self.batch_size] = self._forward(batch_dict)
+
+        return embeddings
+
+    def _embed_by_token_budget(self, texts: List[str]) -> np.ndarray:
+        """
+        テキストをトークン長の降順に並べ、パディング込みのトークン数が `max_tokens_per_batch` 以下になるように
+        バッチを作って埋め込む。出力は入力と同じ順に並べ直す。
+
+        Parameters
+        ----------
+        texts : List[str]
+            埋め込むテキストのリスト
+
+        Returns
+        -------
+        np.ndarray
+            埋め込みベクトルの配列
+        """
+        # トークン化は全テキストで1回だけ行い、バッチごとにパディングする
+        encodings = self.tokenizer(texts, max_length=512, truncation=True)
+        input_ids = encodings["input_ids"]
+        lengths = np.array([len(ids) for ids in input_ids])
+        batches = self._token_budget_batches(lengths, self.max_tokens_per_batch or 0)
+
+        embeddings = np.zeros((len(texts), self.hidden_size), dtype=np.float32)
+        for batch in tqdm(batches):
+            batch_dict = self.tokenizer.pad(
+                {key: [encodings[key][i] for i in batch] for key in encodings.keys()},
+                padding=True,
+                return_tensors="pt",
             )
+            embeddings[batch] = self._forward(batch_dict)
+        return embeddings
+
+    def _forward(self, batch_dict: BatchEncoding) -> np.ndarray:
+        """
+        トークン化済みの1バッチを平均プーリングでベクトルにする。
+
+        Parameters
+        ----------
+        batch_dict : BatchEncoding
+            トークナイザの出力
+
+        Returns
+        -------
+        np.ndarray
+            埋め込みベクトルの配列
+        """
+        if self.onnx_encoder is not None:
+            return self.onnx_encoder.mean_pool({key: value.numpy() for key, value in batch_dict.items()})
+        with torch.no_grad():
+            outputs = self.model(**batch_dict.to(self.device))  # type: ignore
+        embeddings: np.ndarray = (
+            self._average_pool(outputs.last_hidden_state, batch_dict["attention_mask"]).cpu().detach().numpy()
+        )
+        return embeddings
 
-        return np.array(embeddings, dtype=np.float32)
+    @staticmethod
+    def _token_budget_batches(lengths: np.ndarray, max_tokens: int) -> List[np.ndarray]:
+        """
+        トークン長の降順に並べたインデックスを、(バッチ内の最大長 × 件数) が `max_tokens` 以下になるように分割する。
+        1件で上限を超えるテキストは単独のバッチとする。
+
+        Parameters
+        ----------
+        lengths : np.ndarray
+            テキストごとのトークン長
+        max_tokens : int
+            1バッチあたりのパディング込みのトークン数の上限
+
+        Returns
+        -------
+        List[np.ndarray]
+            バッチごとの元のインデックスの配列
+        """
+        order = np.argsort(-lengths, kind="stable")
+        batches: List[np.ndarray] = []
+        start = 0
+        while start < len(order):
+            # 降順に並べているため、バッチ内の最大長は先頭のテキストの長さになる
+            n_items = max(1, max_tokens // int(lengths[order[start]]))
+            batches.append(order[start : start + n_items])
+            start += n_items
+        return batches
 
     def _average_pool(self, last_hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
         """
@@ -90,11 +215,15 @@ class E5Embedder(BaseEmbedder):
         パッセージ(シラバステキスト)を埋め込む。
         文頭に"passage: "を付与して埋め込む。
         """
-        return self._embed(["passage: " + text for text in texts])
+        return self._embed_with_cache(
+            texts, self.passage_prefix, lambda batch: self._embed([self.passage_prefix + text for text in batch])
+        )
 
     def embed_query(self, texts: List[str]) -> np.ndarray:
         """
         クエリを埋め込む。
         文頭に"query: "を付与して埋め込む。
         """
-        return self._embed(["query: " + text for text in texts])
+        return self._embed_with_cache(
+            texts, self.query_prefix, lambda batch: self._embed([self.query_prefix + text for text in batch])
+        )
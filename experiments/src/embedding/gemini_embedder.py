@@ -1,13 +1,15 @@
 # src/embedding/gemini_embedder.py
 
+import asyncio
 import os
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 from dotenv import load_dotenv
-from openai import OpenAI
+from src.utils import get_api_client
 
 from .base import BaseEmbedder
+from .cache import EmbeddingCache
 
 
 class GeminiEmbedder(BaseEmbedder):
@@ -15,22 +17,48 @@ class GeminiEmbedder(BaseEmbedder):
     Geminiの埋め込みモデルを使用するクラス。
     """
 
-    def __init__(self, model: str, api_key: str = ""):
+    def __init__(
+        self,
+        model: str,
+        api_key: str = "",
+        cache: Optional[EmbeddingCache] = None,
+        base_url: str = "https://generativelanguage.googleapis.com/v1beta/",
+        max_concurrency: int = 8,
+        requests_per_second: Optional[float] = None,
+    ):
+        """
+        Parameters
+        ----------
+        model : str
+            埋め込みモデル名
+        api_key : str
+            APIキー。指定しない場合は環境変数GEMINI_API_KEYを使う
+        cache : EmbeddingCache, optional
+            埋め込みの永続キャッシュ
+        base_url : str
+            APIのベースURL。動作確認時はモックサーバのURLを指定する
+        max_concurrency : int
+            同時に送信するリクエスト数の上限
+        requests_per_second : float, optional
+            1秒あたりのリクエスト数の上限
+        """
         load_dotenv()
 
         self.model = model
+        self.model_name = model
+        self.cache = cache
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
         if not self.api_key:
             raise ValueError("Gemini API key must be provided either via parameter or environment variable.")
 
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url="https://generativelanguage.googleapis.com/v1beta/",
+        self.client = get_api_client(
+            base_url, self.api_key, max_concurrency=max_concurrency, requests_per_second=requests_per_second
         )
 
     def embed_passage(self, texts: List[str]) -> np.ndarray:
         """
         テキストリストをGeminiの埋め込みモデルでベクトルに埋め込む。
+        キャッシュが設定されている場合は、キャッシュにないテキストのみAPIに送信する。
 
         Parameters
         ----------
@@ -42,16 +70,30 @@ class GeminiEmbedder(BaseEmbedder):
         np.ndarray
             埋め込みベクトルの配列
         """
-        # 1バッチ=100個
-        embeddings = []
-        for i in range(0, len(texts), 100):
-            response = self.client.embeddings.create(
-                model=self.model,
-                input=texts[i : i + 100],
-                encoding_format="float",
-            )
-            embeddings.extend([item.embedding for item in response.data])
-        return np.array(embeddings, dtype=np.float32)
+        return self._embed_with_cache(texts, "", self._embed)
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """
+        テキストリストをGeminiの埋め込みAPIでベクトルに埋め込む。
+
+        Parameters
+        ----------
+        texts : List[str]
+            埋め込むテキストのリスト
+
+        Returns
+        -------
+        np.ndarray
+            埋め込みベクトルの配列
+        """
+        # 1バッチ=100個。バッチは同時実行数の上限まで並行して送信する
+        return self.client.run(self._embed_async(texts))
+
+    async def _embed_async(self, texts: List[str]) -> np.ndarray:
+        batches = await asyncio.gather(
+            *[self.client.embeddings(self.model, texts[i : i + 100]) for i in range(0, len(texts), 100)]
+        )
+        return np.array([embedding for batch in batches for embedding in batch], dtype=np.float32)
 
     def embed_query(self, texts: List[str]) -> np.ndarray:
         # クエリの埋め込みはパッセージの埋め込みと同じ
@@ -0,0 +1,215 @@
+# src/embedding/onnx_encoder.py
+
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from loguru import logger
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import AutoModel, AutoTokenizer
+
+
+def backend_model_name(model: str, backend: str = "torch", quantize: bool = False) -> str:
+    """
+    推論バックエンドと量子化の有無を含めたモデル名を返す。
+    ONNX・int8量子化のモデルはtorchのモデルと出力が一致しないため、キャッシュのキーや保存するファイル名で区別する。
+
+    Parameters
+    ----------
+    model : str
+        Hugging Faceのモデル名
+    backend : str
+        推論に使うバックエンド ("torch" または "onnx")
+    quantize : bool
+        ONNXバックエンドで、重みをint8に動的量子化したグラフを使うかどうか
+
+    Returns
+    -------
+    str
+        torchバックエンドではモデル名、ONNXバックエンドでは "<モデル名>@onnx" または "<モデル名>@onnx-int8"
+    """
+    if backend == "onnx":
+        return f"{model}@onnx-int8" if quantize else f"{model}@onnx"
+    return model
+
+
+class _LastHiddenState(torch.nn.Module):
+    """
+    ONNXへの書き出し用に、Transformerモデルの最終層の隠れ状態のみを返すラッパー。
+    """
+
+    def __init__(self, model: torch.nn.Module, input_names: List[str]):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs: torch.Tensor) -> torch.Tensor:
+        return self.model(**dict(zip(self.input_names, inputs)))[0]
+
+
+class OnnxEncoder:
+    """
+    Transformerモデルを書き出したONNXグラフをONNX Runtimeで実行するクラス。
+    書き出したグラフ(およびint8に動的量子化したグラフ)はディスクにキャッシュし、次回以降は再利用する。
+    """
+
+    def __init__(
+        self,
+        model: str,
+        cache_dir: str = "data/cache/onnx",
+        quantize: bool = False,
+        num_threads: Optional[int] = None,
+        max_length: int = 512,
+    ):
+        """
+        Parameters
+        ----------
+        model : str
+            Hugging Faceのモデル名
+        cache_dir : str
+            書き出したONNXグラフを保存するディレクトリ
+        quantize : bool
+            重みをint8に動的量子化したグラフを使うかどうか
+        num_threads : int, optional
+            ONNX Runtimeのintra-opスレッド数。指定しない場合はONNX Runtimeの既定値
+        max_length : int
+            トークン化する際の最大長
+        """
+        self.model = model
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model)
+
+        path = self.prepare(model, cache_dir=cache_dir, quantize=quantize)
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        logger.info(f"Loaded ONNX model from {path}")
+
+    @classmethod
+    def prepare(cls, model: str, cache_dir: str = "data/cache/onnx", quantize: bool = False) -> str:
+        """
+        ONNXグラフ(およびint8に動的量子化したグラフ)がキャッシュにない場合は書き出し、そのパスを返す。
+        複数のプロセスで同じモデルを読み込む場合は、同じパスへ同時に書き出さないよう事前に親プロセスで呼び出す。
+
+        Parameters
+        ----------
+        model : str
+            Hugging Faceのモデル名
+        cache_dir : str
+            書き出したONNXグラフを保存するディレクトリ
+        quantize : bool
+            重みをint8に動的量子化したグラフを使うかどうか
+
+        Returns
+        -------
+        str
+            推論に使うONNXグラフのパス
+        """
+        model_dir = os.path.join(cache_dir, model.replace("/", "__"))
+        fp32_path = os.path.join(model_dir, "model.onnx")
+        if not os.path.exists(fp32_path):
+            cls._export(model, fp32_path)
+        if not quantize:
+            return fp32_path
+        path = os.path.join(model_dir, "model.int8.onnx")
+        if not os.path.exists(path):
+            logger.info(f"Quantizing {fp32_path} to int8")
+            quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+        return path
+
+    @staticmethod
+    def _export(model: str, path: str) -> None:
+        """
+        モデルをONNXに書き出す。バッチサイズと系列長は可変とする。
+        """
+        logger.info(f"Exporting {model} to {path}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model)
+        transformer = AutoModel.from_pretrained(model).eval()
+        dummy = tokenizer(["ダミーの入力です。"], return_tensors="pt")
+        input_names = list(dummy.keys())
+        with torch.no_grad():
+            torch.onnx.export(
+                _LastHiddenState(transformer, input_names),
+                tuple(dummy[name] for name in input_names),
+                path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    **{name: {0: "batch", 1: "sequence"} for name in input_names},
+                    "last_hidden_state": {0: "batch", 1: "sequence"},
+                },
+                opset_version=17,
+            )
+
+    def run(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        トークン化済みの入力から最終層の隠れ状態を計算する。
+
+        Parameters
+        ----------
+        inputs : Dict[str, np.ndarray]
+            トークナイザの出力(input_ids, attention_maskなど)
+
+        Returns
+        -------
+        np.ndarray
+            (バッチサイズ, 系列長, 隠れ層の次元) の配列
+        """
+        feeds = {name: np.asarray(inputs[name], dtype=np.int64) for name in self.input_names}
+        return np.asarray(self.session.run(["last_hidden_state"], feeds)[0])
+
+    def mean_pool(self, inputs: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        トークン化済みの入力を、パディングを除いた平均プーリングでベクトルにする。
+
+        Parameters
+        ----------
+        inputs : Dict[str, np.ndarray]
+            トークナイザの出力(input_ids, attention_maskなど)
+
+        Returns
+        -------
+        np.ndarray
+            (バッチサイズ, 隠れ層の次元) の配列
+        """
+        last_hidden = self.run(inputs)
+        mask = np.asarray(inputs["attention_mask"], dtype=np.float32)[..., None]
+        return np.asarray((last_hidden * mask).sum(axis=1) / mask.sum(axis=1), dtype=np.float32)
+
+    def encode(self, texts: List[str], batch_size: int = 32, normalize: bool = False) -> np.ndarray:
+        """
+        テキストリストを平均プーリングでベクトルに埋め込む。
+
+        Parameters
+        ----------
+        texts : List[str]
+            埋め込むテキストのリスト
+        batch_size : int
+            1バッチあたりのテキスト数
+        normalize : bool
+            L2正規化するかどうか
+
+        Returns
+        -------
+        np.ndarray
+            埋め込みベクトルの配列
+        """
+        embeddings = []
+        for i in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[i : i + batch_size],
+                max_length=self.max_length,
+                padding=True,
+                truncation=True,
+                return_tensors="np",
+            )
+            embeddings.append(self.mean_pool(dict(inputs)))
+        vectors = np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+        if normalize:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors
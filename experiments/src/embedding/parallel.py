@@ -0,0 +1,132 @@
+# src/embedding/parallel.py
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import torch
+from loguru import logger
+
+from .base import BaseEmbedder
+from .cache import EmbeddingCache
+
+# ワーカープロセスごとに1つだけ保持する埋め込みモデル
+_worker_embedder: Optional[BaseEmbedder] = None
+
+
+def _init_worker(embedder_factory: Callable[[], BaseEmbedder], num_threads: int) -> None:
+    """
+    ワーカープロセスの初期化。スレッド数を固定し、埋め込みモデルを読み込む。
+    """
+    global _worker_embedder
+    torch.set_num_threads(num_threads)
+    _worker_embedder = embedder_factory()
+
+
+def _embed_shard(texts: List[str], is_query: bool) -> Tuple[np.ndarray, int, float]:
+    """
+    ワーカープロセスで1シャード分のテキストを埋め込む。
+    """
+    assert _worker_embedder is not None
+    start = time.perf_counter()
+    if is_query:
+        embeddings = _worker_embedder.embed_query(texts)
+    else:
+        embeddings = _worker_embedder.embed_passage(texts)
+    return embeddings, os.getpid(), time.perf_counter() - start
+
+
+class ParallelEmbedder(BaseEmbedder):
+    """
+    テキストを連続したシャードに分割し、複数のワーカープロセスで並列に埋め込むクラス。
+    各ワーカーは `embedder_factory` で自身の埋め込みモデルを読み込み、結果は入力と同じ順に結合する。
+    ワーカープロセスは最初の呼び出し時に起動し、`close` まで使い回す。
+
+    埋め込みの永続キャッシュは親プロセスのみで読み書きし、ワーカーにはキャッシュにないテキストだけを渡す。
+    `embedder_factory` はキャッシュを持たない埋め込みモデルを作成する必要がある。
+    """
+
+    def __init__(
+        self,
+        embedder_factory: Callable[[], BaseEmbedder],
+        num_workers: int,
+        num_threads: Optional[int] = None,
+        model_name: str = "",
+        cache: Optional[EmbeddingCache] = None,
+        passage_prefix: str = "",
+        query_prefix: str = "",
+    ):
+        """
+        Parameters
+        ----------
+        embedder_factory : Callable[[], BaseEmbedder]
+            埋め込みモデルを作成する関数。ワーカープロセスに渡すためpickle可能である必要がある
+        num_workers : int
+            ワーカープロセス数
+        num_threads : int, optional
+            ワーカーごとのtorchのスレッド数。指定しない場合はCPUコア数をワーカー数で割った値
+        model_name : str
+            ワーカーが読み込む埋め込みモデル名(キャッシュのキーに使う)
+        cache : EmbeddingCache, optional
+            埋め込みの永続キャッシュ
+        passage_prefix : str
+            ワーカーの埋め込みモデルがパッセージに付与する接頭辞(キャッシュのキーに使う)
+        query_prefix : str
+            ワーカーの埋め込みモデルがクエリに付与する接頭辞(キャッシュのキーに使う)
+        """
+        self.model_name = model_name
+        self.cache = cache
+        self.passage_prefix = passage_prefix
+        self.query_prefix = query_prefix
+        self.embedder_factory = embedder_factory
+        self.num_workers = num_workers
+        self.num_threads = num_threads or max(1, (os.cpu_count() or 1) // num_workers)
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            logger.info(f"Starting {self.num_workers} embedding workers ({self.num_threads} threads each)")
+            # torchを読み込んだ親プロセスをforkしないよう、spawnでワーカーを起動する
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.embedder_factory, self.num_threads),
+            )
+        return self.executor
+
+    def _embed(self, texts: List[str], is_query: bool) -> np.ndarray:
+        """
+        テキストをワーカー数のシャードに分割して埋め込み、入力と同じ順に結合する。
+        """
+        shards = [shard.tolist() for shard in np.array_split(np.array(texts, dtype=object), self.num_workers)]
+        shards = [shard for shard in shards if shard]
+        if not shards:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        start = time.perf_counter()
+        executor = self._get_executor()
+        results = list(executor.map(_embed_shard, shards, [is_query] * len(shards)))
+
+        for shard, (_, pid, elapsed) in zip(shards, results):
+            logger.info(f"Worker {pid}: {len(shard)} texts in {elapsed:.1f}s ({len(shard) / elapsed:.1f} texts/s)")
+        elapsed = time.perf_counter() - start
+        logger.info(f"Embedded {len(texts)} texts in {elapsed:.1f}s ({len(texts) / elapsed:.1f} texts/s)")
+        return np.concatenate([embeddings for embeddings, _, _ in results]).astype(np.float32, copy=False)
+
+    def embed_passage(self, texts: List[str]) -> np.ndarray:
+        return self._embed_with_cache(texts, self.passage_prefix, lambda batch: self._embed(batch, is_query=False))
+
+    def embed_query(self, texts: List[str]) -> np.ndarray:
+        return self._embed_with_cache(texts, self.query_prefix, lambda batch: self._embed(batch, is_query=True))
+
+    def close(self) -> None:
+        """
+        ワーカープロセスを終了する。
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,114 @@
+# src/embedding/query_cache.py
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+from src.utils import normalize_query
+
+from .base import BaseEmbedder
+from .cache import EmbeddingCache
+
+
+class QueryCachingEmbedder(BaseEmbedder):
+    """
+    クエリの埋め込みをメモリ上のLRUキャッシュに保持する埋め込みクラスのラッパー。
+    正規化したクエリとモデル名をキーとし、同じクエリの再入力ではモデルを呼び出さない。
+    LRUから追い出されたクエリは、`spill` を指定した場合にディスク上のキャッシュからも引ける。
+    """
+
+    def __init__(self, embedder: BaseEmbedder, max_size: int = 1024, spill: Optional[EmbeddingCache] = None):
+        """
+        Parameters
+        ----------
+        embedder : BaseEmbedder
+            実際に埋め込みを行うクラス
+        max_size : int
+            メモリ上に保持するクエリ数の上限
+        spill : EmbeddingCache, optional
+            ディスク上のキャッシュ
+        """
+        self.embedder = embedder
+        self.model_name = embedder.model_name
+        self.max_size = max_size
+        self.spill = spill
+        self.entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+
+    def embed_passage(self, texts: List[str]) -> np.ndarray:
+        return self.embedder.embed_passage(texts)
+
+    def embed_query(self, texts: List[str]) -> np.ndarray:
+        """
+        クエリを埋め込む。正規化したクエリはキャッシュのキーにのみ使い、キャッシュにないクエリは元のテキストのまま
+        元の埋め込みクラスに渡す(キャッシュの有無で埋め込みが変わらないようにする)。
+        """
+        queries = [normalize_query(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        # キーごとの取得元 ("hits" / "spill_hits" / "misses")
+        sources: Dict[str, str] = {}
+
+        # メモリ上のキャッシュ
+        with self.lock:
+            for query in queries:
+                if query in self.entries and query not in vectors:
+                    self.entries.move_to_end(query)
+                    vectors[query] = self.entries[query]
+                    sources[query] = "hits"
+        # キャッシュにないクエリは、キーごとに最初に現れた元のテキストを埋め込む
+        missing_texts: Dict[str, str] = {}
+        for query, text in zip(queries, texts):
+            if query not in vectors and query not in missing_texts:
+                missing_texts[query] = text
+
+        # ディスク上のキャッシュ
+        if missing_texts and self.spill is not None:
+            keys = {EmbeddingCache.make_key(self.model_name, "query_cache", query): query for query in missing_texts}
+            for key, vector in self.spill.get_many(list(keys)).items():
+                vectors[keys[key]] = vector
+                sources[keys[key]] = "spill_hits"
+            missing_texts = {query: text for query, text in missing_texts.items() if query not in vectors}
+
+        # キャッシュにないクエリのみモデルで埋め込む
+        if missing_texts:
+            new_vectors = dict(zip(missing_texts, self.embedder.embed_query(list(missing_texts.values()))))
+            vectors.update(new_vectors)
+            sources.update({query: "misses" for query in new_vectors})
+            if self.spill is not None:
+                self.spill.put_many(
+                    {
+                        EmbeddingCache.make_key(self.model_name, "query_cache", query): vector
+                        for query, vector in new_vectors.items()
+                    }
+                )
+
+        with self.lock:
+            # ヒット数・ミス数は、入力されたクエリ1件ごとに数える
+            self.hits += sum(sources[query] == "hits" for query in queries)
+            self.spill_hits += sum(sources[query] == "spill_hits" for query in queries)
+            self.misses += sum(sources[query] == "misses" for query in queries)
+            for query in queries:
+                self.entries[query] = vectors[query]
+                self.entries.move_to_end(query)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        logger.info(f"Query embedding cache: {self.stats()}")
+        return np.array([vectors[query] for query in queries], dtype=np.float32)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        キャッシュのヒット数・ミス数を返す。
+
+        Returns
+        -------
+        Dict[str, int]
+            {"hits": メモリ上のヒット数, "spill_hits": ディスク上のヒット数, "misses": ミス数, "size": 保持数}
+        """
+        return {"hits": self.hits, "spill_hits": self.spill_hits, "misses": self.misses, "size": len(self.entries)}
@@ -0,0 +1,109 @@
+# src/embedding/writer.py
+
+import hashlib
+import os
+import time
+from typing import List
+
+import faiss
+import numpy as np
+from loguru import logger
+from numpy.lib.format import open_memmap
+from src.utils import load_json, save_json
+
+from .base import BaseEmbedder
+
+
+class CheckpointedEmbeddingWriter:
+    """
+    埋め込みベクトルを事前に確保した.npyのメモリマップへ逐次書き込むクラス。
+    `checkpoint_every` 件ごとに書き込み済みの行数をチェックポイントに保存し、中断した場合は次回その続きから再開する。
+    """
+
+    def __init__(self, path: str, dtype: str = "float32", checkpoint_every: int = 4096):
+        """
+        Parameters
+        ----------
+        path : str
+            書き込む先の.npyファイルのパス
+        dtype : str
+            保存するベクトルのdtype
+        checkpoint_every : int
+            チェックポイントを保存する間隔(件数)
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_path = f"{path}.checkpoint.json"
+
+    def fingerprint(self, model_name: str, texts: List[str], normalize: bool = False) -> str:
+        """
+        モデル名・書き込むベクトルの形式(L2正規化の有無、dtype)・入力テキスト列のハッシュ値。
+        チェックポイントが同じ設定・同じ入力に対するものかの判定に使う。
+        """
+        digest = hashlib.sha256(f"{model_name}\t{normalize}\t{self.dtype.str}".encode("utf-8"))
+        for text in texts:
+            digest.update(hashlib.sha256(text.encode("utf-8")).digest())
+        return digest.hexdigest()
+
+    def _load_checkpoint(self, fingerprint: str, n_rows: int) -> int:
+        """
+        同じ入力に対するチェックポイントがあれば、書き込み済みの行数を返す。
+        """
+        if not (os.path.exists(self.checkpoint_path) and os.path.exists(self.path)):
+            return 0
+        checkpoint = load_json(self.checkpoint_path)
+        if checkpoint["fingerprint"] != fingerprint or checkpoint["n_rows"] != n_rows:
+            logger.info(f"Ignoring stale checkpoint {self.checkpoint_path}")
+            return 0
+        return int(checkpoint["completed"])
+
+    def run(self, embedder: BaseEmbedder, texts: List[str], normalize: bool = False) -> np.ndarray:
+        """
+        テキストを `checkpoint_every` 件ずつ埋め込み、メモリマップに書き込む。
+
+        Parameters
+        ----------
+        embedder : BaseEmbedder
+            埋め込みモデル
+        texts : List[str]
+            埋め込むテキストのリスト
+        normalize : bool
+            L2正規化してから書き込むかどうか
+
+        Returns
+        -------
+        np.ndarray
+            書き込んだ.npyファイルの読み取り専用メモリマップ
+        """
+        fingerprint = self.fingerprint(embedder.model_name, texts, normalize)
+        completed = self._load_checkpoint(fingerprint, len(texts))
+        vectors = open_memmap(self.path, mode="r+") if completed else None
+        if completed:
+            logger.info(f"Resuming embedding from row {completed} / {len(texts)}")
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        start_time = time.perf_counter()
+        for start in range(completed, len(texts), self.checkpoint_every):
+            end = min(start + self.checkpoint_every, len(texts))
+            embeddings = np.ascontiguousarray(embedder.embed_passage(texts[start:end]), dtype=np.float32)
+            if normalize:
+                faiss.normalize_L2(embeddings)
+            if vectors is None:
+                # 次元数は最初のバッチから決まるため、ここで全行分の領域を確保する
+                vectors = open_memmap(self.path, mode="w+", dtype=self.dtype, shape=(len(texts), embeddings.shape[1]))
+            vectors[start:end] = embeddings
+            vectors.flush()
+            save_json({"fingerprint": fingerprint, "n_rows": len(texts), "completed": end}, self.checkpoint_path)
+
+            rate = (end - completed) / (time.perf_counter() - start_time)
+            logger.info(f"Embedded {end} / {len(texts)} texts ({rate:.1f} texts/s)")
+
+        if vectors is None:
+            raise ValueError("No texts to embed.")
+        del vectors
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        logger.info(f"Saved vectors to {self.path}")
+        saved: np.ndarray = np.load(self.path, mmap_mode="r")
+        return saved
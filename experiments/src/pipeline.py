@@ -1,39 +1,692 @@
 # src/pipeline.py
 
+import json
 import os
-from typing import Dict, List, Tuple
+import time
+from functools import partial
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import faiss
 import numpy as np
 from loguru import logger
-from src.embedding import BaseEmbedder, E5Embedder, GeminiEmbedder
+from src.embedding import (
+    BaseEmbedder,
+    CheckpointedEmbeddingWriter,
+    E5Embedder,
+    EmbeddingCache,
+    GeminiEmbedder,
+    OnnxEncoder,
+    ParallelEmbedder,
+    QueryCachingEmbedder,
+    backend_model_name,
+)
 from src.preprocessing import BasePreprocessor, SelectedPreprocessor, SimplePreprocessor
-from src.reranking import BaseReranker, BgeReranker, GeminiReranker
-from src.search import SimpleSearcher
-from src.utils import load_htmls_under_dir, load_json, save_json
-
-
-def build_faiss_index(embeddings: np.ndarray) -> faiss.Index:
+from src.reranking import (
+    BaseReranker,
+    BgeReranker,
+    CachedReranker,
+    CascadeBudget,
+    GeminiReranker,
+    RerankDocumentBuilder,
+    ScoreCache,
+)
+from src.search import BaseSearcher, SimpleSearcher
+from src.utils import iter_htmls_under_dir, load_json, load_npy, save_json, save_npy, text_hash
+
+# ベクトルの保持形式(スカラー量子化)
+SCALAR_QUANTIZERS = {
+    "none": None,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+
+# FAISSインデックスに一度に追加するベクトル数
+INDEX_ADD_BATCH_SIZE = 65536
+
+
+def build_faiss_index(embeddings: np.ndarray, index_config: Optional[Dict] = None) -> faiss.Index:
     """
     FAISSインデックスを構築する関数。
+    学習が必要なインデックス(IVF系、int8量子化)はここで埋め込みベクトルを用いて学習する。
 
     Parameters
     ----------
     embeddings : np.ndarray
         埋め込みベクトルの配列
+    index_config : Dict, optional
+        設定の`index`セクション。`type`に以下のいずれかを指定する。
+        - "flat": 全件探索 (デフォルト)
+        - "ivf_flat": 転置ファイル (`nlist`, `nprobe`)
+        - "ivf_pq": 転置ファイル+直積量子化 (`nlist`, `nprobe`, `pq_m`, `pq_nbits`)
+        - "hnsw": グラフ探索 (`hnsw_m`, `ef_construction`, `ef_search`)
+        `quantization`に"fp16"または"int8"を指定すると、flat, ivf_flat, hnswのベクトルをスカラー量子化して保持する。
 
     Returns
     -------
     faiss.Index
         構築されたFAISSインデックス
     """
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings)
+    index_config = index_config or {}
+    index_type = index_config.get("type", "flat")
+    quantization = index_config.get("quantization", "none")
+    if quantization not in SCALAR_QUANTIZERS:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    qtype = SCALAR_QUANTIZERS[quantization]
+    n_vectors, dimension = embeddings.shape
+
+    index: faiss.Index
+    if index_type == "flat":
+        if qtype is None:
+            index = faiss.IndexFlatL2(dimension)
+        else:
+            index = faiss.IndexScalarQuantizer(dimension, qtype, faiss.METRIC_L2)
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        # クラスタ数はベクトル数を超えないようにする
+        nlist = max(1, min(index_config.get("nlist", 256), n_vectors))
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf_pq":
+            if qtype is not None:
+                raise ValueError("Scalar quantization cannot be combined with ivf_pq.")
+            index = faiss.IndexIVFPQ(
+                quantizer, dimension, nlist, index_config.get("pq_m", 16), index_config.get("pq_nbits", 8)
+            )
+        elif qtype is None:
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, qtype, faiss.METRIC_L2)
+        index.nprobe = index_config.get("nprobe", 16)
+    elif index_type == "hnsw":
+        if qtype is None:
+            index = faiss.IndexHNSWFlat(dimension, index_config.get("hnsw_m", 32))
+        else:
+            # SWIGのラッパーは量子化の種類(int)を受け取るが、型スタブはScalarQuantizerを要求している
+            index = faiss.IndexHNSWSQ(dimension, qtype, index_config.get("hnsw_m", 32))  # type: ignore[arg-type]
+        index.hnsw.efConstruction = index_config.get("ef_construction", 200)
+        index.hnsw.efSearch = index_config.get("ef_search", 64)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(embeddings, dtype=np.float32))
+        logger.info(f"Trained {index_type} index with {n_vectors} vectors")
+    # メモリマップされたベクトル行列でもメモリ使用量が増えないよう、分割して追加する
+    for start in range(0, n_vectors, INDEX_ADD_BATCH_SIZE):
+        index.add(np.ascontiguousarray(embeddings[start : start + INDEX_ADD_BATCH_SIZE], dtype=np.float32))
     return index
 
 
-def pipeline_indexing(config: Dict) -> Tuple[faiss.Index, List[Dict], List[str]]:
+def get_search_params(config: Dict) -> Dict:
+    """
+    設定からインデックスの検索時パラメータ(nprobe, ef_search)を取り出す関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+
+    Returns
+    -------
+    Dict
+        検索時パラメータ
+    """
+    return {key: config["index"][key] for key in ("nprobe", "ef_search") if config["index"].get(key) is not None}
+
+
+def build_embedding_cache(config: Dict) -> Optional[EmbeddingCache]:
+    """
+    設定に応じた埋め込みの永続キャッシュを初期化する関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+
+    Returns
+    -------
+    EmbeddingCache, optional
+        埋め込みの永続キャッシュ。`embedding.cache_path` が指定されていない場合はNone
+    """
+    if not config["embedding"].get("cache_path"):
+        return None
+    max_mb = config["embedding"].get("cache_max_mb")
+    return EmbeddingCache(
+        config["embedding"]["cache_path"],
+        max_entries=config["embedding"].get("cache_max_entries"),
+        max_bytes=int(max_mb * 1024**2) if max_mb else None,
+    )
+
+
+def build_embedder(config: Dict, use_cache: bool = True) -> BaseEmbedder:
+    """
+    設定に応じた埋め込みモデルを初期化する関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+    use_cache : bool, optional
+        Falseの場合は埋め込みの永続キャッシュを使わない, by default True
+
+    Returns
+    -------
+    BaseEmbedder
+        初期化された埋め込みモデル
+    """
+    # 埋め込みの永続キャッシュ
+    cache = build_embedding_cache(config) if use_cache else None
+
+    embedder: BaseEmbedder
+    if config["embedding"]["method"] == "gemini":
+        embedder = GeminiEmbedder(
+            model=config["embedding"]["model"],
+            cache=cache,
+            base_url=config["embedding"].get("base_url", "https://generativelanguage.googleapis.com/v1beta/"),
+            max_concurrency=config["embedding"].get("max_concurrency", 8),
+            requests_per_second=config["embedding"].get("requests_per_second"),
+        )
+    elif config["embedding"]["method"] == "e5":
+        embedder = E5Embedder(
+            model=config["embedding"]["model"],
+            batch_size=config["embedding"]["batch_size"],
+            cache=cache,
+            max_tokens_per_batch=config["embedding"].get("max_tokens_per_batch"),
+            backend=config["embedding"].get("backend", "torch"),
+            quantize=config["embedding"].get("quantize", False),
+            onnx_cache_dir=config["embedding"].get("onnx_cache_dir", "data/cache/onnx"),
+            num_threads=config["embedding"].get("num_threads"),
+        )
+    return embedder
+
+
+def build_reranker(config: Dict) -> BaseReranker:
+    """
+    設定に応じたリランキングモデルを初期化する関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+
+    Returns
+    -------
+    BaseReranker
+        初期化されたリランキングモデル
+    """
+    reranker: BaseReranker
+    if config["reranking"]["method"] == "gemini":
+        reranker = GeminiReranker(
+            model=config["reranking"]["model"],
+            base_url=config["reranking"].get("base_url", "https://generativelanguage.googleapis.com/v1beta/"),
+            max_concurrency=config["reranking"].get("max_concurrency", 8),
+            requests_per_second=config["reranking"].get("requests_per_second"),
+        )
+    elif config["reranking"]["method"] == "bge":
+        reranker = BgeReranker(
+            model=config["reranking"]["model"],
+            backend=config["reranking"].get("backend", "torch"),
+            quantize=config["reranking"].get("quantize", False),
+            onnx_cache_dir=config["reranking"].get("onnx_cache_dir", "data/cache/onnx"),
+            num_threads=config["reranking"].get("num_threads"),
+        )
+    return reranker
+
+
+def build_searcher(config: Dict, index: faiss.Index, id_to_metadata: Dict[int, Dict]) -> BaseSearcher:
+    """
+    設定に応じた検索システムを初期化する関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+    index : faiss.Index
+        FAISSインデックス
+    id_to_metadata : Dict[int, Dict]
+        チャンクIDからメタデータへの対応
+
+    Returns
+    -------
+    BaseSearcher
+        初期化された検索システム
+    """
+    # インデックス構築時に保存したベクトル行列があればメモリマップで読み込む
+    vectors_path = get_vectors_path(config)
+    vectors = load_npy(vectors_path, mmap=True) if os.path.exists(vectors_path) else None
+
+    searcher: BaseSearcher
+    if config["search"]["method"] == "simple":
+        searcher = SimpleSearcher(
+            index=index,
+            id_to_metadata=id_to_metadata,
+            vectors=vectors,
+            search_params=get_search_params(config),
+            exact_search_threshold=config["index"].get("exact_search_threshold", 0),
+            normalize=config["index"].get("normalize", False),
+            rescore_factor=config["index"].get("rescore_factor", 0),
+        )
+    return searcher
+
+
+def get_vectors_path(config: Dict) -> str:
+    """
+    インデックスと併せて保存するベクトル行列(.npy)のパスを返す関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+
+    Returns
+    -------
+    str
+        ベクトル行列のパス
+    """
+    index_dir: str = config["index"]["index_dir"]
+    return os.path.join(index_dir, config["index"].get("vectors_name", "vectors.npy"))
+
+
+def save_vectors(config: Dict, vectors: np.ndarray) -> None:
+    """
+    ベクトル行列を設定のdtype(float32またはfloat16)で.npyファイルに保存する関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+    vectors : np.ndarray
+        保存するベクトル行列
+    """
+    vectors_path = get_vectors_path(config)
+    dtype = np.dtype(config["index"].get("vectors_dtype", "float32"))
+    os.makedirs(os.path.dirname(vectors_path), exist_ok=True)
+    save_npy(vectors.astype(dtype, copy=False), vectors_path)
+    logger.info(f"Saved vectors with shape {vectors.shape} ({dtype}) to {vectors_path}")
+
+
+def get_rerank_documents_path(config: Dict, model: str) -> str:
+    """
+    リランキングモデルの文書側の埋め込みを保存する.npzファイルのパスを返す関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+    model : str
+        推論バックエンドを含めたリランキングモデル名 (`BgeReranker.model_name`)
+
+    Returns
+    -------
+    str
+        文書側の埋め込みのパス
+    """
+    return os.path.join(config["index"]["index_dir"], f"rerank_documents_{model.replace('/', '__')}.npz")
+
+
+def prepare_rerank_documents(
+    config: Dict, id_to_metadata: Dict[int, Dict]
+) -> Tuple[Dict[str, str], RerankDocumentBuilder]:
+    """
+    科目ごとのリランキング用の文書を作成し、インデックスと併せて保存する関数。
+    保存済みの文書が同じ設定で作成されていれば読み込み、文書がない科目と、差分更新や要約の更新で
+    メタデータが変わった科目のみ作成し直す。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+    id_to_metadata : Dict[int, Dict]
+        チャンクIDからメタデータへの対応
+
+    Returns
+    -------
+    Dict[str, str]
+        科目番号から文書への対応
+    RerankDocumentBuilder
+        文書の作成方法
+    """
+    documents_config = config["reranking"]["documents"]
+    builder = RerankDocumentBuilder(**documents_config)
+    documents_path = os.path.join(config["index"]["index_dir"], "rerank_documents.json")
+
+    # 科目ごとに、文書の元になるメタデータ(最初のチャンクのもの)のハッシュ値を求める
+    sources: Dict[str, Dict] = {}
+    for metadata in id_to_metadata.values():
+        sources.setdefault(metadata["lecture_no"], metadata)
+    source_hashes = {
+        lecture_no: text_hash(json.dumps(metadata, ensure_ascii=False, sort_keys=True))
+        for lecture_no, metadata in sources.items()
+    }
+
+    documents: Dict[str, str] = {}
+    if os.path.exists(documents_path):
+        saved = load_json(documents_path)
+        if saved["config"] == documents_config and saved.get("format_version") == builder.format_version:
+            saved_hashes = saved.get("source_hashes", {})
+            documents = {
+                lecture_no: document
+                for lecture_no, document in saved["documents"].items()
+                if saved_hashes.get(lecture_no) == source_hashes.get(lecture_no)
+            }
+
+    missing = [metadata for lecture_no, metadata in sources.items() if lecture_no not in documents]
+    if missing:
+        documents.update(builder.build_all(missing))
+        documents = {lecture_no: documents[lecture_no] for lecture_no in sources}
+        os.makedirs(os.path.dirname(documents_path), exist_ok=True)
+        save_json(
+            {
+                "config": documents_config,
+                "format_version": builder.format_version,
+                "documents": documents,
+                "source_hashes": source_hashes,
+            },
+            documents_path,
+        )
+        logger.info(f"Saved {len(documents)} rerank documents to {documents_path} ({len(missing)} rebuilt)")
+    return documents, builder
+
+
+def build_preprocessor(config: Dict) -> BasePreprocessor:
+    """
+    設定に応じた前処理クラスを初期化する関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+
+    Returns
+    -------
+    BasePreprocessor
+        初期化された前処理クラス
+    """
+    preprocessor: BasePreprocessor
+    if config["preprocessing"]["method"] == "simple":
+        preprocessor = SimplePreprocessor(
+            chunk_size=config["preprocessing"]["chunk_size"],
+            normalization=config["preprocessing"]["normalization"],
+            num_workers=config["preprocessing"].get("num_workers", 1),
+            parser_single_pass=config["preprocessing"].get("parser_single_pass", False),
+            parser_features=config["preprocessing"].get("parser_features", "html.parser"),
+            parsed_store_path=config["preprocessing"].get("parsed_store_path"),
+        )
+    elif config["preprocessing"]["method"] == "simple_selected":
+        preprocessor = SelectedPreprocessor(
+            chunk_size=config["preprocessing"]["chunk_size"],
+            normalization=config["preprocessing"]["normalization"],
+            num_workers=config["preprocessing"].get("num_workers", 1),
+            parser_single_pass=config["preprocessing"].get("parser_single_pass", False),
+            parser_features=config["preprocessing"].get("parser_features", "html.parser"),
+            parsed_store_path=config["preprocessing"].get("parsed_store_path"),
+        )
+    return preprocessor
+
+
+def build_passage_embedder(config: Dict) -> BaseEmbedder:
+    """
+    コーパスの埋め込みに使う埋め込みモデルを初期化する関数。
+    `embedding.num_workers` が2以上の場合は、複数プロセスで並列に埋め込むモデルを返す。
+    この場合、埋め込みの永続キャッシュの読み書きとONNXグラフの書き出しは親プロセスで行う。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+
+    Returns
+    -------
+    BaseEmbedder
+        初期化された埋め込みモデル
+    """
+    num_workers = config["embedding"].get("num_workers", 1)
+    if num_workers > 1:
+        method = config["embedding"]["method"]
+        backend = config["embedding"].get("backend", "torch")
+        quantize = config["embedding"].get("quantize", False)
+        if method == "e5" and backend == "onnx":
+            # ワーカーが同じパスへ同時に書き出さないよう、ONNXグラフの書き出しと量子化は親プロセスで済ませる
+            OnnxEncoder.prepare(
+                config["embedding"]["model"],
+                cache_dir=config["embedding"].get("onnx_cache_dir", "data/cache/onnx"),
+                quantize=quantize,
+            )
+        # キャッシュは親プロセスのみで読み書きし、ワーカーはキャッシュにないテキストの埋め込みだけを計算する
+        embedder_class = E5Embedder if method == "e5" else GeminiEmbedder
+        return ParallelEmbedder(
+            partial(build_embedder, config, use_cache=False),
+            num_workers=num_workers,
+            num_threads=config["embedding"].get("threads_per_worker"),
+            model_name=backend_model_name(config["embedding"]["model"], backend, quantize),
+            cache=build_embedding_cache(config),
+            passage_prefix=embedder_class.passage_prefix,
+            query_prefix=embedder_class.query_prefix,
+        )
+    return build_embedder(config)
+
+
+def embed_passages(config: Dict, texts: List[str]) -> np.ndarray:
+    """
+    パッセージを埋め込み、設定に応じてL2正規化する関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+    texts : List[str]
+        埋め込むテキストのリスト
+
+    Returns
+    -------
+    np.ndarray
+        埋め込みベクトルの配列
+    """
+    embedder = build_passage_embedder(config)
+    embeddings = embedder.embed_passage(texts)
+    if isinstance(embedder, ParallelEmbedder):
+        embedder.close()
+    logger.info(f"Generated embeddings with shape {embeddings.shape}")
+    if config["index"].get("normalize", False):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        faiss.normalize_L2(embeddings)
+        logger.info("Normalized embeddings")
+    return embeddings
+
+
+def embed_passages_to_vectors_file(config: Dict, texts: List[str]) -> np.ndarray:
+    """
+    パッセージを埋め込み、ベクトル行列(.npy)へ逐次書き込む関数。
+    中断した場合は、次回の呼び出しで最後に保存したチェックポイントから再開する。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+    texts : List[str]
+        埋め込むテキストのリスト
+
+    Returns
+    -------
+    np.ndarray
+        書き込んだベクトル行列の読み取り専用メモリマップ
+    """
+    writer = CheckpointedEmbeddingWriter(
+        get_vectors_path(config),
+        dtype=config["index"].get("vectors_dtype", "float32"),
+        checkpoint_every=config["embedding"].get("checkpoint_every", 4096),
+    )
+    embedder = build_passage_embedder(config)
+    try:
+        embeddings = writer.run(embedder, texts, normalize=config["index"].get("normalize", False))
+    finally:
+        if isinstance(embedder, ParallelEmbedder):
+            embedder.close()
+    logger.info(f"Generated embeddings with shape {embeddings.shape}")
+    return embeddings
+
+
+def get_hashes_path(config: Dict) -> str:
+    """
+    科目ごとのHTMLのハッシュ値を保存するJSONファイルのパスを返す関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+
+    Returns
+    -------
+    str
+        ハッシュ値のJSONファイルのパス
+    """
+    index_dir: str = config["index"]["index_dir"]
+    return os.path.join(index_dir, config["index"].get("hashes_name", "lecture_hashes.json"))
+
+
+def iter_raw_data(config: Dict, hashes: Dict[str, str]) -> Iterator[Dict]:
+    """
+    入力ディレクトリのHTMLを1件ずつ読み込み、科目ごとのHTMLのハッシュ値を `hashes` に記録しながら返す関数。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+    hashes : Dict[str, str]
+        科目番号からHTMLのハッシュ値への対応を書き込む辞書
+
+    Yields
+    ------
+    Dict
+        {"html_content": "...", "lecture_no": "..."} 形式のレコード
+    """
+    for entry in iter_htmls_under_dir(config["data"]["input_dir"], config["data"].get("prefetch_workers", 0)):
+        hashes[entry["lecture_no"]] = text_hash(entry["html_content"])
+        yield entry
+
+
+def update_index_incrementally(
+    config: Dict, index: faiss.Index, processed_data: List[Dict]
+) -> Tuple[faiss.Index, List[Dict]]:
+    """
+    科目ごとのHTMLのハッシュ値を比較し、追加・変更・削除された科目についてのみインデックスを更新する関数。
+
+    変更・削除された科目のチャンクを取り除き、追加・変更された科目のチャンクを末尾に追加する。
+    チャンクIDは前処理済みデータとベクトル行列の行番号に一致させたまま詰め直す。
+
+    Parameters
+    ----------
+    config : Dict
+        設定
+    index : faiss.Index
+        既存のFAISSインデックス
+    processed_data : List[Dict]
+        既存の前処理済みデータ
+
+    Returns
+    -------
+    faiss.Index
+        更新されたFAISSインデックス
+    List[Dict]
+        更新された前処理済みデータ
+    """
+    index_dir = config["index"]["index_dir"]
+    embedding_path = os.path.join(index_dir, config["index"]["embedding_name"])
+    processed_data_path = os.path.join(index_dir, config["index"]["processed_data_name"])
+    hashes_path = get_hashes_path(config)
+
+    # HTMLを1件ずつ読み込み、ハッシュ値を記録しながら、追加・変更された科目のレコードのみを残す
+    current_hashes: Dict[str, str] = {}
+    if os.path.exists(hashes_path):
+        previous_hashes = load_json(hashes_path)
+        updated_data = [
+            entry
+            for entry in iter_raw_data(config, current_hashes)
+            if previous_hashes.get(entry["lecture_no"]) != current_hashes[entry["lecture_no"]]
+        ]
+    else:
+        # ハッシュ値が保存されていない場合は、インデックス済みの科目は最新であるとみなす
+        indexed_lecture_nos = {entry["metadata"]["lecture_no"] for entry in processed_data}
+        updated_data = [
+            entry for entry in iter_raw_data(config, current_hashes) if entry["lecture_no"] not in indexed_lecture_nos
+        ]
+        previous_hashes = {k: v for k, v in current_hashes.items() if k in indexed_lecture_nos}
+        logger.warning(f"{hashes_path} does not exist. Assuming indexed lectures are up to date.")
+
+    added = current_hashes.keys() - previous_hashes.keys()
+    removed = previous_hashes.keys() - current_hashes.keys()
+    changed = {k for k in current_hashes.keys() & previous_hashes.keys() if current_hashes[k] != previous_hashes[k]}
+    logger.info(f"Incremental update: {len(added)} added, {len(changed)} changed, {len(removed)} removed lectures")
+    if not (added or changed or removed):
+        save_json(current_hashes, hashes_path)
+        return index, processed_data
+
+    # 追加・変更された科目の前処理と埋め込み
+    stale = removed | changed
+    keep_mask = np.array([entry["metadata"]["lecture_no"] not in stale for entry in processed_data], dtype=bool)
+    new_data = build_preprocessor(config).run(updated_data)
+    if new_data:
+        new_embeddings = embed_passages(config, [entry["text_chunk"] for entry in new_data])
+    else:
+        new_embeddings = np.empty((0, index.d), dtype=np.float32)
+
+    # ベクトル行列と前処理済みデータを詰め直す
+    vectors = np.concatenate(
+        [np.asarray(load_npy(get_vectors_path(config), mmap=True)[keep_mask], dtype=np.float32), new_embeddings]
+    )
+    processed_data = [entry for entry, keep in zip(processed_data, keep_mask) if keep] + new_data
+
+    # インデックスの更新
+    if isinstance(index, faiss.IndexFlatCodes):
+        # Flat・スカラー量子化は削除後にIDが詰められるため、その場で削除・追加する
+        index.remove_ids(faiss.IDSelectorBatch(np.flatnonzero(~keep_mask).astype(np.int64)))
+        index.add(new_embeddings)
+    else:
+        # IVF・HNSWは削除してもIDが詰められないため、学習済みの状態を残して全ベクトルを追加し直す
+        index.reset()
+        index.add(vectors)
+    logger.info(f"Updated FAISS index: {len(keep_mask)} -> {index.ntotal} chunks")
+
+    # 保存
+    save_json(processed_data, processed_data_path)
+    faiss.write_index(index, embedding_path)
+    save_vectors(config, vectors)
+    save_json(current_hashes, hashes_path)
+    logger.info(f"Saved incrementally updated index to {index_dir}")
+
+    return index, processed_data
+
+
+def load_summary_data(summary_data_path: str) -> Dict[str, str]:
+    """
+    科目番号から要約への対応を読み込む関数。
+
+    以前の形式(科目の読み込み順に並んだ要約のリスト)は、前処理済みデータの科目の順と一致する保証がないため使わない。
+
+    Parameters
+    ----------
+    summary_data_path : str
+        要約データ(scripts/summarize.pyの出力)のパス
+
+    Returns
+    -------
+    Dict[str, str]
+        科目番号から要約への対応。要約データがない場合は空の辞書
+    """
+    if not os.path.exists(summary_data_path):
+        logger.warning(f"{summary_data_path} does not exist. Lectures will have no summaries.")
+        return {}
+    summary_data = load_json(summary_data_path)
+    if not isinstance(summary_data, dict):
+        logger.warning(
+            f"{summary_data_path} is a list of summaries in load order and cannot be matched to lectures. "
+            "Re-run scripts/summarize.py to regenerate it keyed by lecture_no."
+        )
+        return {}
+    logger.info(f"Loaded summary data from {summary_data_path}")
+    return summary_data
+
+
+def pipeline_indexing(config: Dict) -> Tuple[faiss.Index, List[Dict], Dict[str, str]]:
     """
     インデックス構築のパイプラインを実行する関数。
 
@@ -48,138 +701,304 @@ def pipeline_indexing(config: Dict) -> Tuple[faiss.Index, List[Dict], List[str]]
         構築されたFAISSインデックス
     List[Dict]
         前処理済みデータ
-    List[str]
-        要約したデータ
+    Dict[str, str]
+        科目番号から要約への対応
     """
     index_dir = config["index"]["index_dir"]
     embedding_path = os.path.join(index_dir, config["index"]["embedding_name"])
     processed_data_path = os.path.join(index_dir, config["index"]["processed_data_name"])
+    hashes_path = get_hashes_path(config)
     summarize_dir = config["summary"]["summary_dir"]
     summary_data_path = os.path.join(summarize_dir, config["summary"]["summary_name"])
 
+    # 今回の呼び出しで前処理・埋め込みをやり直したかどうか
+    rebuilt = False
+
     # すでに同名の前処理済みデータが存在する場合はそれをロード
     if os.path.exists(processed_data_path):
         processed_data = load_json(processed_data_path)
         logger.info(f"Loaded processed data from {processed_data_path}")
     else:
-        # データロード
-        raw_data = load_htmls_under_dir(config["data"]["input_dir"])
-        logger.info(f"Loaded {len(raw_data)} records from {config['data']['input_dir']}")
-
-        # 前処理
-        preprocessor: BasePreprocessor
-        if config["preprocessing"]["method"] == "simple":
-            preprocessor = SimplePreprocessor(
-                chunk_size=config["preprocessing"]["chunk_size"],
-                normalization=config["preprocessing"]["normalization"],
-            )
-        elif config["preprocessing"]["method"] == "simple_selected":
-            preprocessor = SelectedPreprocessor(
-                chunk_size=config["preprocessing"]["chunk_size"],
-                normalization=config["preprocessing"]["normalization"],
-            )
-        processed_data = preprocessor.run(raw_data)
+        # データロード・前処理: HTMLを1件ずつ読み込みながら前処理し、コーパス全体をメモリに載せない
+        current_hashes: Dict[str, str] = {}
+        preprocessor = build_preprocessor(config)
+        processed_data = preprocessor.run(iter_raw_data(config, current_hashes))
+        logger.info(f"Loaded {len(current_hashes)} records from {config['data']['input_dir']}")
         logger.info(f"Processed data into {len(processed_data)} chunks")
+        rebuilt = True
 
         # 前処理済みデータ保存
         os.makedirs(os.path.dirname(processed_data_path), exist_ok=True)
         save_json(processed_data, processed_data_path)
         logger.info(f"Saved processed data to {processed_data_path}")
 
+        # 差分更新用に科目ごとのHTMLのハッシュ値を保存
+        save_json(current_hashes, hashes_path)
+
     # すでに同名のインデックスファイルが存在する場合はそれをロード
     if os.path.exists(embedding_path):
         index = faiss.read_index(embedding_path)
         logger.info(f"Loaded FAISS index from {embedding_path}")
     else:
-        # 埋め込み生成
-        embedder: BaseEmbedder
-        if config["embedding"]["method"] == "gemini":
-            embedder = GeminiEmbedder(model=config["embedding"]["model"])
-        elif config["embedding"]["method"] == "e5":
-            embedder = E5Embedder(model=config["embedding"]["model"], batch_size=config["embedding"]["batch_size"])
-        texts = [entry["text_chunk"] for entry in processed_data]
-        embeddings = embedder.embed_passage(texts)
-        logger.info(f"Generated embeddings with shape {embeddings.shape}")
+        # 埋め込み生成: ベクトル行列へ逐次書き込み、中断した場合は続きから再開する
+        embeddings = embed_passages_to_vectors_file(config, [entry["text_chunk"] for entry in processed_data])
+        rebuilt = True
 
         # FAISSインデックス構築
-        index = build_faiss_index(embeddings)
-        logger.info("Built FAISS index")
+        index = build_faiss_index(embeddings, config["index"])
+        logger.info(f"Built FAISS index ({config['index'].get('type', 'flat')})")
 
         # インデックス保存
         os.makedirs(os.path.dirname(embedding_path), exist_ok=True)
         faiss.write_index(index, embedding_path)
         logger.info(f"Saved FAISS index to {embedding_path}")
 
+    # ベクトル行列が保存されていない既存のインデックスは、ベクトル行列を用意して保存する
+    if not os.path.exists(get_vectors_path(config)):
+        if isinstance(index, faiss.IndexFlat):
+            # 全件探索のインデックスは元のベクトルを保持しているため、インデックスから復元する
+            save_vectors(config, index.reconstruct_n(0, index.ntotal))
+        else:
+            # 量子化・近似インデックスから復元したベクトルは誤差を含み、正確な距離での並べ替えに使えないため埋め込み直す
+            logger.warning(
+                f"{get_vectors_path(config)} does not exist. Re-embedding passages to restore exact vectors."
+            )
+            embed_passages_to_vectors_file(config, [entry["text_chunk"] for entry in processed_data])
+
+    # 差分更新: 追加・変更・削除された科目のみ前処理・埋め込みをやり直す
+    if config["index"].get("incremental", False) and not rebuilt:
+        index, processed_data = update_index_incrementally(config, index, processed_data)
+
     # 要約したデータをロード
-    if os.path.exists(summary_data_path):
-        summary_data = load_json(summary_data_path)
-        logger.info(f"Loaded summary data from {summary_data_path}")
-    else:
-        ValueError("Summary data does not exist.")
+    summary_data = load_summary_data(summary_data_path)
 
     return index, processed_data, summary_data
 
 
-def pipeline_search(config: Dict, index: faiss.Index, processed_data: list, summary_data: list) -> List[Dict]:
-    # メタデータの準備
-    id_to_metadata = {str(idx): entry["metadata"] for idx, entry in enumerate(processed_data)}
+def build_id_to_metadata(processed_data: List[Dict], summary_data: Dict[str, str]) -> Dict[int, Dict]:
+    """
+    チャンクIDからメタデータへの対応を作成し、要約を科目番号で対応づけてメタデータに追加する関数。
+
+    Parameters
+    ----------
+    processed_data : List[Dict]
+        前処理済みデータ
+    summary_data : Dict[str, str]
+        科目番号から要約への対応
+
+    Returns
+    -------
+    Dict[int, Dict]
+        チャンクIDからメタデータへの対応
+    """
+    id_to_metadata = {idx: entry["metadata"] for idx, entry in enumerate(processed_data)}
 
     # 要約をmetadataに追加する
-    idx = 0
-    lecture_no = ""
+    missing = set()
     for v in id_to_metadata.values():
-        v["summary"] = summary_data[idx]
-        lecture_no_ = v["lecture_no"]
-        if lecture_no != lecture_no_:
-            idx += 1
-            lecture_no = lecture_no_
+        # 差分更新で追加された科目など、要約がない場合は空文字とする
+        if v["lecture_no"] not in summary_data:
+            missing.add(v["lecture_no"])
+        v["summary"] = summary_data.get(v["lecture_no"], "")
+    if missing:
+        logger.warning(f"{len(missing)} lectures have no summary (e.g. {sorted(missing)[:5]})")
+    return id_to_metadata
 
-    logger.info("Prepared id to metadata mapping")
 
-    # 検索システムの初期化
-    if config["search"]["method"] == "simple":
-        searcher = SimpleSearcher(index=index, id_to_metadata=id_to_metadata)
-    logger.info("Initialized Searcher")
+class SearchEngine:
+    """
+    インデックスとモデルを保持し、クエリごとの検索とリランキングを行うクラス。
 
-    # リランキングシステムの初期化
-    reranker: BaseReranker
-    if config["reranking"]["method"] == "gemini":
-        reranker = GeminiReranker(model=config["reranking"]["model"])
-    elif config["reranking"]["method"] == "bge":
-        reranker = BgeReranker(model=config["reranking"]["model"])
-    logger.info("Initialized Reranker")
+    インデックスのロードやモデルの初期化はインスタンス生成時に一度だけ行うため、
+    Streamlitアプリやコマンドライン実行から `search` を繰り返し呼び出しても再構築は発生しない。
+    """
 
-    # 検索クエリの例
-    embedder: BaseEmbedder
-    if config["embedding"]["method"] == "gemini":
-        embedder = GeminiEmbedder(model=config["embedding"]["model"])
-    elif config["embedding"]["method"] == "e5":
-        embedder = E5Embedder(model=config["embedding"]["model"], batch_size=config["embedding"]["batch_size"])
-    queries = config["queries"]
-    query_vector = embedder.embed_query(queries)
-    logger.info("Encoded query")
+    def __init__(self, config: Dict, index: faiss.Index, processed_data: List[Dict], summary_data: Dict[str, str]):
+        self.config = config
+
+        # メタデータの準備
+        id_to_metadata = build_id_to_metadata(processed_data, summary_data)
+        logger.info("Prepared id to metadata mapping")
+
+        # 検索システムの初期化
+        self.searcher = build_searcher(config, index, id_to_metadata)
+        logger.info("Initialized Searcher")
+
+        # リランキングシステムの初期化
+        # 同じクエリ・科目の組み合わせではモデルを呼び出さないよう、スコアをキャッシュする
+        self.reranker = build_reranker(config)
+        if "documents" in config["reranking"]:
+            self.reranker.set_documents(*prepare_rerank_documents(config, id_to_metadata))
+        if isinstance(self.reranker, BgeReranker) and config["reranking"].get("precompute_documents", False):
+            # 文書側の埋め込みは科目ごとに一度だけ計算し、インデックスと併せて保存する
+            self.reranker.precompute_documents(
+                list(id_to_metadata.values()), get_rerank_documents_path(config, self.reranker.model_name)
+            )
+        score_cache_size = config["reranking"].get("cache_size", 0)
+        if score_cache_size > 0:
+            self.reranker = CachedReranker(
+                self.reranker, ScoreCache(max_size=score_cache_size, ttl=config["reranking"].get("cache_ttl"))
+            )
+        # カスケード: 一次検索の上位のみをリランキングし、残りは一次検索の順のまま返す
+        self.cascade: Optional[CascadeBudget] = None
+        if "cascade" in config["reranking"]:
+            self.cascade = CascadeBudget(**config["reranking"]["cascade"])
+        logger.info("Initialized Reranker")
+
+        # クエリ埋め込みモデルの初期化
+        # 同じクエリの再入力ではモデルを呼び出さないよう、クエリの埋め込みをLRUキャッシュに保持する
+        self.embedder = build_embedder(config)
+        query_cache_size = config["embedding"].get("query_cache_size", 0)
+        if query_cache_size > 0:
+            spill = self.embedder.cache if config["embedding"].get("query_cache_spill", False) else None
+            self.embedder = QueryCachingEmbedder(self.embedder, max_size=query_cache_size, spill=spill)
+        logger.info("Initialized Embedder")
+
+    @classmethod
+    def from_config(cls, config: Dict) -> "SearchEngine":
+        """
+        インデックス構築のパイプラインを実行し、検索エンジンを初期化する。
+
+        Parameters
+        ----------
+        config : Dict
+            設定
+
+        Returns
+        -------
+        SearchEngine
+            初期化された検索エンジン
+        """
+        index, processed_data, summary_data = pipeline_indexing(config)
+        return cls(config, index, processed_data, summary_data)
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        検索エンジンが保持するキャッシュのヒット数・ミス数を返す。
+
+        Returns
+        -------
+        Dict[str, Dict[str, int]]
+            キャッシュ名ごとの統計
+        """
+        stats = {}
+        if isinstance(self.embedder, QueryCachingEmbedder):
+            stats["query_embedding"] = self.embedder.stats()
+        if isinstance(self.reranker, CachedReranker):
+            stats["rerank_score"] = self.reranker.cache.stats()
+        return stats
+
+    def search(
+        self,
+        query: str,
+        metadata_filter: Optional[Dict] = None,
+        top_k: Optional[int] = None,
+        search_params: Optional[Dict] = None,
+    ) -> Dict:
+        """
+        1件のクエリに対して検索とリランキングを行う。
+
+        Parameters
+        ----------
+        query : str
+            検索クエリ
+        metadata_filter : Dict, optional
+            メタデータによるフィルタリング条件
+        top_k : int, optional
+            取得する上位K件。指定しない場合は設定の値を使う。
+        search_params : Dict, optional
+            インデックスの検索時パラメータ(nprobe, ef_search)。指定しない場合は設定の値を使う。
+
+        Returns
+        -------
+        Dict
+            {"query": str, "num_reranked": int, "results": List[Dict]} 形式の検索結果
+        """
+        return self.search_queries([query], metadata_filter=metadata_filter, top_k=top_k, search_params=search_params)[
+            0
+        ]
+
+    def search_queries(
+        self,
+        queries: List[str],
+        metadata_filter: Optional[Dict] = None,
+        top_k: Optional[int] = None,
+        search_params: Optional[Dict] = None,
+    ) -> List[Dict]:
+        """
+        複数のクエリに対して検索とリランキングを行う。クエリの埋め込みはまとめて計算する。
+
+        Parameters
+        ----------
+        queries : List[str]
+            検索クエリのリスト
+        metadata_filter : Dict, optional
+            メタデータによるフィルタリング条件
+        top_k : int, optional
+            取得する上位K件。指定しない場合は設定の値を使う。
+        search_params : Dict, optional
+            インデックスの検索時パラメータ(nprobe, ef_search)。指定しない場合は設定の値を使う。
+
+        Returns
+        -------
+        List[Dict]
+            クエリごとの {"query": str, "num_reranked": int, "results": List[Dict]} のリスト
+        """
+        if top_k is None:
+            top_k = self.config["search"]["top_k"]
+
+        query_vector = self.embedder.embed_query(queries)
+        logger.info("Encoded query")
 
-    reranked_results_list = []
-    for i, query in enumerate(queries):
         # 検索実行
-        logger.info(f"===== Searching for: {query} =====")
-        search_results = searcher.search(
-            query_vector=query_vector[i].tolist(),
-            metadata_filter=config["search"]["metadata_filter"],
-            top_k=config["search"]["top_k"],
+        search_results_list = self.searcher.search_batch(
+            query_vector, metadata_filter=metadata_filter, top_k=top_k, search_params=search_params
         )
-        logger.info(f"Retrieved {len(search_results)} search results")
-
-        # リランキング実行
-        reranked_results = {"query": query}
-        reranked_results["results"] = reranker.rerank(query=query, results=search_results)
-        logger.info("Completed reranking:")
-        for result in reranked_results["results"]:
-            logger.debug(
-                f"  - {result['metadata']['lecture_name']} (score: {result['score']}, distance: {result['distance']})"
-            )
 
-        reranked_results_list.append(reranked_results)
+        # リランキング対象の候補数をクエリごとに決める
+        if self.cascade is not None:
+            n_rerank_list = [self.cascade.select(search_results) for search_results in search_results_list]
+        else:
+            n_rerank_list = [len(search_results) for search_results in search_results_list]
+
+        # リランキング実行: API経由のリランキングはクエリをまとめて並行に送信する
+        start = time.perf_counter()
+        sorted_results_list = self.reranker.rerank_batch(
+            queries,
+            [search_results[:n_rerank] for search_results, n_rerank in zip(search_results_list, n_rerank_list)],
+        )
+        if self.cascade is not None:
+            self.cascade.update(sum(n_rerank_list), (time.perf_counter() - start) * 1000)
+
+        reranked_results_list = []
+        for query, search_results, sorted_results, n_rerank in zip(
+            queries, search_results_list, sorted_results_list, n_rerank_list
+        ):
+            logger.info(f"===== Searching for: {query} =====")
+            logger.info(f"Retrieved {len(search_results)} search results")
+
+            # リランキングしなかった候補は、スコアなしで一次検索の順のまま後ろに続ける
+            for result in search_results[n_rerank:]:
+                result["score"] = None
+            reranked_results: Dict[str, Any] = {"query": query, "num_reranked": n_rerank}
+            reranked_results["results"] = sorted_results + search_results[n_rerank:]
+            logger.info(f"Completed reranking ({n_rerank} of {len(search_results)} candidates):")
+            for result in reranked_results["results"]:
+                lecture_name = result["metadata"]["lecture_name"]
+                logger.debug(f"  - {lecture_name} (score: {result['score']}, distance: {result['distance']})")
+
+            reranked_results_list.append(reranked_results)
+
+        return reranked_results_list
+
+
+def pipeline_search(config: Dict, index: faiss.Index, processed_data: list, summary_data: dict) -> List[Dict]:
+    engine = SearchEngine(config, index, processed_data, summary_data)
+    reranked_results_list = engine.search_queries(
+        config["queries"],
+        metadata_filter=config["search"]["metadata_filter"],
+        top_k=config["search"]["top_k"],
+    )
 
     # 結果保存
     if "output_path" in config["data"]:
@@ -1,7 +1,13 @@
 # src/preprocessing/base.py
 
+import multiprocessing
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, Iterable, Iterator, List, Tuple
+
+from loguru import logger
 
 
 class BasePreprocessor(ABC):
@@ -9,14 +15,36 @@ class BasePreprocessor(ABC):
     前処理の基底クラス
     """
 
+    # 前処理に使うプロセス数と、1プロセスにまとめて渡すレコード数
+    num_workers: int = 1
+    records_per_task: int = 64
+
     @abstractmethod
-    def run(self, data: List[Dict]) -> List[Dict]:
+    def process_entry(self, entry: Dict) -> List[Dict]:
+        """
+        1科目分のレコードを前処理する。
+
+        Parameters
+        ----------
+        entry : Dict
+            {"html_content": "...", "lecture_no": "..."} 形式のレコード
+
+        Returns
+        -------
+        List[Dict]
+            前処理後のチャンクのリスト
+        """
+        pass
+
+    def run(self, data: Iterable[Dict]) -> List[Dict]:
         """
         前処理を実行する。
+        `num_workers` が2以上の場合は、レコードを `records_per_task` 件ずつプロセスプールに分配して並列に処理する。
+        いずれの場合も出力は入力の順に並ぶ。
 
         Parameters
         ----------
-        data : List[Dict]
+        data : Iterable[Dict]
             前処理対象のデータ。以下の形式を持つ。
             [
                 {"html_content": "...", "lecture_no": "..."},
@@ -29,9 +57,67 @@ class BasePreprocessor(ABC):
         List[Dict]
             前処理後のデータ。結果は以下の形式を持つ。
             [
-                {"text": "...", "metadata": {"lecture_no": "...", ...}},
-                {"text": "...", "metadata": {"lecture_no": "...", ...}},
+                {"text_chunk": "...", "metadata": {"lecture_no": "...", ...}},
+                {"text_chunk": "...", "metadata": {"lecture_no": "...", ...}},
                 ...
             ]
         """
-        pass
+        start = time.perf_counter()
+        processed_data: List[Dict] = []
+        n_records = 0
+        for records, processed in self._process_tasks(data):
+            n_records += records
+            processed_data.extend(processed)
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Preprocessed {n_records} records in {elapsed:.1f}s ({n_records / max(elapsed, 1e-9):.1f} records/s, "
+            f"{self.num_workers} workers)"
+        )
+        return processed_data
+
+    def _process_task(self, entries: List[Dict]) -> List[Dict]:
+        """
+        レコードのまとまりを前処理する。プロセスプールの1タスクに相当する。
+        """
+        processed_data = []
+        for entry in entries:
+            processed_data.extend(self.process_entry(entry))
+        return processed_data
+
+    def _chunked(self, data: Iterable[Dict]) -> Iterator[List[Dict]]:
+        """
+        レコードを `records_per_task` 件ずつのまとまりに分ける。
+        """
+        entries: List[Dict] = []
+        for entry in data:
+            entries.append(entry)
+            if len(entries) >= self.records_per_task:
+                yield entries
+                entries = []
+        if entries:
+            yield entries
+
+    def _process_tasks(self, data: Iterable[Dict]) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        まとまりごとに (レコード数, 前処理結果) を入力の順に返す。
+        並列処理では、投入済みで結果を受け取っていないタスクを `num_workers` の2倍までに抑え、
+        入力全体をメモリに載せずに処理する。
+        """
+        if self.num_workers <= 1:
+            for entries in self._chunked(data):
+                yield len(entries), self._process_task(entries)
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=self.num_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            pending: Deque[Tuple[int, Future]] = deque()
+            for entries in self._chunked(data):
+                pending.append((len(entries), executor.submit(self._process_task, entries)))
+                if len(pending) >= self.num_workers * 2:
+                    n_entries, future = pending.popleft()
+                    yield n_entries, future.result()
+            while pending:
+                n_entries, future = pending.popleft()
+                yield n_entries, future.result()
@@ -5,7 +5,7 @@ from typing import Dict, List, Optional
 
 from src.constants import ID_TO_LECTURE
 
-from ..utils import SyllabusParser
+from ..utils import ParsedSyllabusStore, SyllabusParser
 from .base import BasePreprocessor
 
 
@@ -14,25 +14,45 @@ class SelectedPreprocessor(BasePreprocessor):
     選別したテキスト前処理を行うクラス。
     """
 
-    def __init__(self, chunk_size: int = 512, normalization: bool = True):
+    def __init__(
+        self,
+        chunk_size: int = 512,
+        normalization: bool = True,
+        num_workers: int = 1,
+        parser_single_pass: bool = False,
+        parser_features: str = "html.parser",
+        parsed_store_path: Optional[str] = None,
+    ):
         self.chunk_size = chunk_size
         self.normalization = normalization
+        self.num_workers = num_workers
+        self.parser_single_pass = parser_single_pass
+        self.parser_features = parser_features
+        self.parsed_store = ParsedSyllabusStore(parsed_store_path, parser_features) if parsed_store_path else None
 
-    def parse_html(self, html_content: str) -> Dict[str, Optional[str]]:
+    def parse_html(self, html_content: str, lecture_no: str = "") -> Dict[str, Optional[str]]:
         """
         HTMLコンテンツをパースして、必要な情報を抽出する。
+        パース結果のストアを使う場合は、保存済みの結果を返し、未保存の場合のみパースして保存する。
 
         Parameters
         ----------
         html_content : str
             HTMLコンテンツ
+        lecture_no : str, optional
+            科目番号(パース結果のストアのキー)
 
         Returns
         -------
         Dict[str, Optional[str]]
             パース結果の辞書
         """
-        parser = SyllabusParser(html_content)
+        if self.parsed_store is not None:
+            return self.parsed_store.get_or_parse(lecture_no, html_content, self._parse)
+        return self._parse(html_content)
+
+    def _parse(self, html_content: str) -> Dict[str, Optional[str]]:
+        parser = SyllabusParser(html_content, single_pass=self.parser_single_pass, features=self.parser_features)
         data = parser.parse()
         return data
 
@@ -79,60 +99,52 @@ class SelectedPreprocessor(BasePreprocessor):
                 chunks.append(chunk)
         return chunks
 
-    def run(self, data: List[Dict]) -> List[Dict]:
+    def process_entry(self, entry: Dict) -> List[Dict]:
         """
-        前処理を実行する。
+        1科目分のレコードを前処理する。
 
         Parameters
         ----------
-        data : List[Dict]
-            前処理対象のデータ。以下の形式を持つ。
-            [
-                {"html_content": "...", "lecture_no": "..."},
-                {"html_content": "...", "lecture_no": "..."},
-                ...
-            ]
+        entry : Dict
+            {"html_content": "...", "lecture_no": "..."} 形式のレコード
 
         Returns
         -------
         List[Dict]
-            前処理後のデータ。結果は以下の形式を持つ。
+            前処理後のチャンクのリスト。以下の形式を持つ。
             [
-                {"text_chunk": "...", "metadata": {"lecture_no": "...", ...}},
                 {"text_chunk": "...", "metadata": {"lecture_no": "...", ...}},
                 ...
             ]
         """
+        html_content = entry.get("html_content", "")
+        lecture_no = entry.get("lecture_no", "")
+        lecture_info = ID_TO_LECTURE[lecture_no]
+        parsed_content = self.parse_html(html_content, lecture_no)
+        selected_list = [lecture_info["lecture_name"]]
+        for k, v in parsed_content.items():
+            if k in ["授業の概要・目的", "到達目標", "授業計画と内容"]:
+                selected_list.append(f"{k}: {v}")
+        text = "\n".join(selected_list)
+
+        if self.normalization:
+            text = self.normalize_text(text)
+        chunks = self.chunk_text(text)
+
         processed_data = []
-        for entry in data:
-
-            html_content = entry.get("html_content", "")
-            lecture_no = entry.get("lecture_no", "")
-            lecture_info = ID_TO_LECTURE[lecture_no]
-            parsed_content = self.parse_html(html_content)
-            selected_list = [lecture_info["lecture_name"]]
-            for k, v in parsed_content.items():
-                if k in ["授業の概要・目的", "到達目標", "授業計画と内容"]:
-                    selected_list.append(f"{k}: {v}")
-            text = "\n".join(selected_list)
-
-            if self.normalization:
-                text = self.normalize_text(text)
-            chunks = self.chunk_text(text)
-
-            for chunk in chunks:
-                processed_entry = {
-                    "text_chunk": chunk,
-                    "metadata": {
-                        "lecture_no": lecture_no,
-                        "lecture_name": lecture_info["lecture_name"],
-                        "department": lecture_info["department"],
-                        "section": lecture_info["section"],
-                        "url": lecture_info["url"],
-                    },
-                }
-                if isinstance(processed_entry["metadata"], dict):
-                    processed_entry["metadata"].update(parsed_content)
-                processed_data.append(processed_entry)
+        for chunk in chunks:
+            processed_entry = {
+                "text_chunk": chunk,
+                "metadata": {
+                    "lecture_no": lecture_no,
+                    "lecture_name": lecture_info["lecture_name"],
+                    "department": lecture_info["department"],
+                    "section": lecture_info["section"],
+                    "url": lecture_info["url"],
+                },
+            }
+            if isinstance(processed_entry["metadata"], dict):
+                processed_entry["metadata"].update(parsed_content)
+            processed_data.append(processed_entry)
 
         return processed_data
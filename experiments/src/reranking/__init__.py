@@ -2,6 +2,17 @@
 
 from .base import BaseReranker
 from .bge_reranker import BgeReranker
+from .cache import CachedReranker, ScoreCache
+from .cascade import CascadeBudget
+from .documents import RerankDocumentBuilder
 from .gemini_reranker import GeminiReranker
 
-__all__ = ["BaseReranker", "GeminiReranker", "BgeReranker"]
+__all__ = [
+    "BaseReranker",
+    "GeminiReranker",
+    "BgeReranker",
+    "CachedReranker",
+    "CascadeBudget",
+    "RerankDocumentBuilder",
+    "ScoreCache",
+]
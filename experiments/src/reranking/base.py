@@ -3,16 +3,57 @@
 from abc import ABC, abstractmethod
 from typing import Dict, List
 
+from .documents import RerankDocumentBuilder
+
 
 class BaseReranker(ABC):
     """
     リランキング機能の基底クラス
     """
 
-    @abstractmethod
+    # キャッシュのキーに使うモデル名
+    model_name: str = ""
+    # 科目番号ごとに事前に作成したリランキング用の文書と、文書がない科目に使う作成方法
+    documents: Dict[str, str] = {}
+    document_builder: RerankDocumentBuilder = RerankDocumentBuilder()
+
+    def set_documents(self, documents: Dict[str, str], document_builder: RerankDocumentBuilder) -> None:
+        """
+        事前に作成したリランキング用の文書を設定する。
+
+        Parameters
+        ----------
+        documents : Dict[str, str]
+            科目番号から文書への対応
+        document_builder : RerankDocumentBuilder
+            文書がない科目(差分更新で追加された科目など)の文書の作成方法
+        """
+        self.documents = documents
+        self.document_builder = document_builder
+
+    def build_document(self, metadata: Dict) -> str:
+        """
+        1科目のリランキング用の文書を返す。事前に作成した文書があればそれを使う。
+
+        Parameters
+        ----------
+        metadata : Dict
+            科目のメタデータ
+
+        Returns
+        -------
+        str
+            リランキング用の文書
+        """
+        document = self.documents.get(metadata.get("lecture_no", ""))
+        if document is None:
+            document = self.document_builder.build(metadata)
+        return document
+
     def rerank(self, query: str, results: List[Dict]) -> List[Dict]:
         """
         リランキングを実行するメソッド。
+        `score` で計算したスコアを各結果に追加し、スコアの降順(同点は距離の昇順)に並べ替える。
 
         Parameters
         ----------
@@ -26,4 +67,69 @@ class BaseReranker(ABC):
         List[Dict]
             リランキング後の検索結果のリスト
         """
+        return self.rerank_batch([query], [results])[0]
+
+    def rerank_batch(self, queries: List[str], results_list: List[List[Dict]]) -> List[List[Dict]]:
+        """
+        複数のクエリの検索結果をまとめてリランキングする。
+
+        Parameters
+        ----------
+        queries : List[str]
+            ユーザーのクエリのリスト
+        results_list : List[List[Dict]]
+            クエリごとの検索結果のリスト
+
+        Returns
+        -------
+        List[List[Dict]]
+            クエリごとのリランキング後の検索結果のリスト
+        """
+        targets = [i for i, results in enumerate(results_list) if results]
+        scores_list = self.score_batch([queries[i] for i in targets], [results_list[i] for i in targets])
+
+        # スコアを結果に追加してソート
+        sorted_results_list: List[List[Dict]] = [[] for _ in results_list]
+        for i, scores in zip(targets, scores_list):
+            for result, score in zip(results_list[i], scores):
+                result["score"] = score
+            sorted_results_list[i] = sorted(results_list[i], key=lambda x: (x["score"], -x["distance"]), reverse=True)
+        return sorted_results_list
+
+    @abstractmethod
+    def score(self, query: str, results: List[Dict]) -> List[float]:
+        """
+        検索結果ごとのクエリとの関連度スコアを計算するメソッド。
+
+        Parameters
+        ----------
+        query : str
+            ユーザーのクエリ
+        results : List[Dict]
+            検索結果のリスト
+
+        Returns
+        -------
+        List[float]
+            検索結果と同じ順のスコアのリスト
+        """
         pass
+
+    def score_batch(self, queries: List[str], results_list: List[List[Dict]]) -> List[List[float]]:
+        """
+        複数のクエリについて検索結果のスコアを計算するメソッド。
+        デフォルトではクエリごとに `score` を呼び出す。まとめて計算できるリランキングクラスはオーバーライドする。
+
+        Parameters
+        ----------
+        queries : List[str]
+            ユーザーのクエリのリスト
+        results_list : List[List[Dict]]
+            クエリごとの検索結果のリスト
+
+        Returns
+        -------
+        List[List[float]]
+            クエリごとのスコアのリスト
+        """
+        return [self.score(query, results) for query, results in zip(queries, results_list)]
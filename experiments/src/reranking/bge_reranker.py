@@ -1,8 +1,13 @@
 # src/reranking/llm_reranker.py
 
-from typing import Dict, List
+import os
+from typing import Dict, List, Optional
 
+import numpy as np
+from loguru import logger
 from sentence_transformers import SentenceTransformer
+from src.embedding import OnnxEncoder, backend_model_name
+from src.utils import text_hash
 
 from .base import BaseReranker
 
@@ -12,12 +17,45 @@ class BgeReranker(BaseReranker):
     Cohereを用いたリランキングクラス。
     """
 
-    def __init__(self, model: str):
-        self.model = SentenceTransformer(model)
+    def __init__(
+        self,
+        model: str,
+        backend: str = "torch",
+        quantize: bool = False,
+        onnx_cache_dir: str = "data/cache/onnx",
+        num_threads: Optional[int] = None,
+    ):
+        """
+        Parameters
+        ----------
+        model : str
+            リランキングに使うモデル名
+        backend : str
+            推論に使うバックエンド ("torch" または "onnx")
+        quantize : bool
+            ONNXバックエンドで、重みをint8に動的量子化したグラフを使うかどうか
+        onnx_cache_dir : str
+            書き出したONNXグラフを保存するディレクトリ
+        num_threads : int, optional
+            ONNXバックエンドのintra-opスレッド数
+        """
+        # ONNX・int8量子化のモデルのスコアや文書の埋め込みは、torchのモデルと区別して保存する
+        self.model_name = backend_model_name(model, backend, quantize)
+        # 事前計算した文書側の埋め込み (文書のハッシュ値 -> 行番号)
+        self.document_ids: Dict[str, int] = {}
+        self.document_vectors = np.zeros((0, 0), dtype=np.float32)
+        self.onnx_encoder: Optional[OnnxEncoder] = None
+        if backend == "onnx":
+            self.onnx_encoder = OnnxEncoder(
+                model, cache_dir=onnx_cache_dir, quantize=quantize, num_threads=num_threads
+            )
+        else:
+            self.model = SentenceTransformer(model)
 
-    def rerank(self, query: str, results: List[Dict]) -> List[Dict]:
+    def score(self, query: str, results: List[Dict]) -> List[float]:
         """
-        Geminiを用いて検索結果をリランキングする。
+        BGEの埋め込みの内積で検索結果のスコアを計算する。
+        文書側の埋め込みは事前計算したものを使い、存在しない文書のみその場で埋め込む。
 
         Parameters
         ----------
@@ -28,21 +66,11 @@ class BgeReranker(BaseReranker):
 
         Returns
         -------
-        List[Dict]
-            リランキング後の検索結果のリスト
+        List[float]
+            検索結果と同じ順のスコアのリスト
         """
-        # LLMにプロンプトを送信してスコアを取得
         documents = self.build_documents(results)
-        scores = self.calculate_rerank_scores(
-            query=query,
-            documents=documents,
-        )
-
-        # スコアを結果に追加してソート
-        for result, score in zip(results, scores):
-            result["score"] = score
-        sorted_results = sorted(results, key=lambda x: (x["score"], -x["distance"]), reverse=True)
-        return sorted_results
+        return self.calculate_rerank_scores(query=query, documents=documents)
 
     def build_documents(self, results: List[Dict]) -> List[str]:
         """
@@ -50,25 +78,52 @@ class BgeReranker(BaseReranker):
 
         Parameters
         ----------
-        query : str
-            ユーザーのクエリ
         results : List[Dict]
             検索結果のリスト
 
         Returns
         -------
-        str
-            構築されたプロンプト
+        List[str]
+            検索結果と同じ順の文書のリスト
         """
-        documents = []
-        for idx, result in enumerate(results, 1):
-            lecture_name = result["metadata"]["lecture_name"]
-            description = ", ".join(
-                [f"{key}: {value}" for key, value in result["metadata"].items() if key != "lecture_no"]
-            )
-            document = f"{idx}. 講義名: {lecture_name}\n   説明: {description}\n\n"
-            documents.append(document)
-        return documents
+        return [self.build_document(result["metadata"]) for result in results]
+
+    def precompute_documents(self, metadata_list: List[Dict], path: Optional[str] = None) -> None:
+        """
+        科目ごとの文書側の埋め込みを計算する。
+        `path` に保存済みの埋め込みがあれば読み込み、まだ埋め込んでいない文書のみ計算して保存し直す。
+
+        Parameters
+        ----------
+        metadata_list : List[Dict]
+            科目のメタデータのリスト
+        path : str, optional
+            埋め込みを保存する.npzファイルのパス
+        """
+        if path is not None and os.path.exists(path):
+            saved = np.load(path)
+            self.document_ids = {str(key): i for i, key in enumerate(saved["keys"])}
+            self.document_vectors = saved["vectors"]
+            logger.info(f"Loaded {len(self.document_ids)} rerank document embeddings from {path}")
+
+        missing: Dict[str, str] = {}
+        for metadata in metadata_list:
+            document = self.build_document(metadata)
+            key = text_hash(document)
+            if key not in self.document_ids:
+                missing.setdefault(key, document)
+        if not missing:
+            return
+
+        logger.info(f"Encoding {len(missing)} rerank documents")
+        vectors = self.encode(list(missing.values())).astype(np.float32)
+        offset = len(self.document_ids)
+        self.document_ids.update({key: offset + i for i, key in enumerate(missing)})
+        self.document_vectors = vectors if offset == 0 else np.concatenate([self.document_vectors, vectors])
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            np.savez(path, keys=np.array(list(self.document_ids)), vectors=self.document_vectors)
+            logger.info(f"Saved {len(self.document_ids)} rerank document embeddings to {path}")
 
     def calculate_rerank_scores(self, query: str, documents: list[str]) -> List[float]:
         """
@@ -79,14 +134,42 @@ class BgeReranker(BaseReranker):
         query : str
             ユーザーのクエリ
         documents : list[str]
-            検索結果のリスト
+            検索結果の文書のリスト
 
         Returns
         -------
-        List[Dict]
-            リランキング後の検索結果のリスト
+        List[float]
+            文書と同じ順のスコアのリスト
         """
-        q_embeddings = self.model.encode([query], normalize_embeddings=True)
-        p_embeddings = self.model.encode(documents, normalize_embeddings=True)
+        q_embeddings = self.encode([query])
+        keys = [text_hash(document) for document in documents]
+        p_embeddings = np.zeros((len(documents), q_embeddings.shape[1]), dtype=np.float32)
+
+        # 事前計算していない文書(差分更新で追加された科目など)のみ埋め込む
+        missing = [i for i, key in enumerate(keys) if key not in self.document_ids]
+        found = [i for i, key in enumerate(keys) if key in self.document_ids]
+        if found:
+            p_embeddings[found] = self.document_vectors[[self.document_ids[keys[i]] for i in found]]
+        if missing:
+            p_embeddings[missing] = self.encode([documents[i] for i in missing])
         rerank_scores = q_embeddings @ p_embeddings.T
         return list(map(float, rerank_scores[0].tolist()))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        テキストをL2正規化した埋め込みベクトルに変換する。
+        ONNXバックエンドでは、SentenceTransformerと同じ平均プーリングで計算する。
+
+        Parameters
+        ----------
+        texts : List[str]
+            埋め込むテキストのリスト
+
+        Returns
+        -------
+        np.ndarray
+            埋め込みベクトルの配列
+        """
+        if self.onnx_encoder is not None:
+            return self.onnx_encoder.encode(texts, normalize=True)
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True))
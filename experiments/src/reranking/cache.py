@@ -0,0 +1,124 @@
+# src/reranking/cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, cast
+
+from loguru import logger
+from src.utils import normalize_query
+
+from .base import BaseReranker
+
+ScoreKey = Tuple[str, str, str]
+
+
+class ScoreCache:
+    """
+    (正規化したクエリ, 科目番号, リランキングモデル) ごとのスコアを保持するキャッシュ。
+    有効期限(TTL)を過ぎたものは無効とし、件数の上限を超えた場合は最終参照が古いものから削除する。
+    """
+
+    def __init__(self, max_size: int = 4096, ttl: Optional[float] = None):
+        """
+        Parameters
+        ----------
+        max_size : int
+            保持するスコアの件数の上限
+        ttl : float, optional
+            スコアの有効期限(秒)。指定しない場合は期限なし
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: OrderedDict[ScoreKey, Tuple[float, float]] = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: ScoreKey) -> Optional[float]:
+        """
+        スコアを取得する。存在しないか有効期限切れの場合はNoneを返す。
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (self.ttl is not None and entry[1] < time.time() - self.ttl):
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: ScoreKey, score: float) -> None:
+        """
+        スコアを保存し、上限を超えた分を削除する。
+        """
+        with self.lock:
+            self.entries[key] = (score, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        キャッシュのヒット数・ミス数を返す。
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+class CachedReranker(BaseReranker):
+    """
+    スコアをキャッシュするリランキングクラスのラッパー。
+    キャッシュにない検索結果のみ元のリランキングクラスに渡してスコアを計算する。
+    """
+
+    def __init__(self, reranker: BaseReranker, cache: ScoreCache):
+        """
+        Parameters
+        ----------
+        reranker : BaseReranker
+            実際にスコアを計算するリランキングクラス
+        cache : ScoreCache
+            スコアのキャッシュ
+        """
+        self.reranker = reranker
+        self.model_name = reranker.model_name
+        self.cache = cache
+
+    def score(self, query: str, results: List[Dict]) -> List[float]:
+        return self.score_batch([query], [results])[0]
+
+    def score_batch(self, queries: List[str], results_list: List[List[Dict]]) -> List[List[float]]:
+        keys_list = []
+        scores_list: List[List[Optional[float]]] = []
+        for query, results in zip(queries, results_list):
+            normalized_query = normalize_query(query)
+            keys = [(normalized_query, result["metadata"]["lecture_no"], self.model_name) for result in results]
+            keys_list.append(keys)
+            scores_list.append([self.cache.get(key) for key in keys])
+
+        # キャッシュにない検索結果のみ、クエリごとにまとめて元のリランキングクラスに渡す
+        missing_list = [[i for i, score in enumerate(scores) if score is None] for scores in scores_list]
+        targets = [q for q, missing in enumerate(missing_list) if missing]
+        new_scores_list = self.reranker.score_batch(
+            [queries[q] for q in targets], [[results_list[q][i] for i in missing_list[q]] for q in targets]
+        )
+        # スコアの件数が合わない場合に後続のスコアが別の検索結果にずれないよう、位置を保ったまま対応づける
+        if len(new_scores_list) != len(targets):
+            raise ValueError(f"{self.model_name} returned scores for {len(new_scores_list)} of {len(targets)} queries")
+        for q, new_scores in zip(targets, new_scores_list):
+            if len(new_scores) != len(missing_list[q]):
+                raise ValueError(
+                    f"{self.model_name} returned {len(new_scores)} scores for {len(missing_list[q])} results "
+                    f"of query {queries[q]!r}"
+                )
+            for i, score in zip(missing_list[q], new_scores):
+                scores_list[q][i] = score
+                self.cache.put(keys_list[q][i], score)
+
+        n_results = sum(len(results) for results in results_list)
+        n_missing = sum(len(missing) for missing in missing_list)
+        logger.info(f"Rerank score cache: {n_results - n_missing} hits, {n_missing} misses")
+        # 上の検証により、全ての検索結果にスコアが入っている
+        return cast(List[List[float]], scores_list)
@@ -0,0 +1,88 @@
+# src/reranking/cascade.py
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class CascadeBudget:
+    """
+    カスケード型リランキングで、クエリごとにリランキングする候補数を決めるクラス。
+
+    一次検索の距離で最上位の候補から `margin` × (候補の距離の標準偏差) 以内にある候補のみをリランキングの対象とし、
+    上位と明確に差がある候補は一次検索の順のまま残す。`latency_budget_ms` を指定した場合は、
+    候補1件あたりのリランキング時間の指数移動平均から、予算内に収まる件数までに制限する。
+    """
+
+    def __init__(
+        self,
+        min_candidates: int = 1,
+        max_candidates: Optional[int] = None,
+        margin: Optional[float] = None,
+        latency_budget_ms: Optional[float] = None,
+        ema_alpha: float = 0.2,
+    ):
+        """
+        Parameters
+        ----------
+        min_candidates : int
+            リランキングする候補数の下限
+        max_candidates : int, optional
+            リランキングする候補数の上限
+        margin : float, optional
+            最上位の候補との距離の差の閾値(候補の距離の標準偏差に対する倍率)。指定しない場合は距離で絞り込まない
+        latency_budget_ms : float, optional
+            1クエリあたりのリランキング時間の予算(ミリ秒)
+        ema_alpha : float
+            候補1件あたりのリランキング時間の指数移動平均の係数
+        """
+        self.min_candidates = min_candidates
+        self.max_candidates = max_candidates
+        self.margin = margin
+        self.latency_budget_ms = latency_budget_ms
+        self.ema_alpha = ema_alpha
+        self.ms_per_candidate: Optional[float] = None
+
+    def select(self, results: List[Dict]) -> int:
+        """
+        リランキングする上位の候補数を決める。
+
+        Parameters
+        ----------
+        results : List[Dict]
+            一次検索の順(距離の昇順)に並んだ検索結果のリスト
+
+        Returns
+        -------
+        int
+            リランキングする候補数
+        """
+        n_candidates = len(results)
+        if self.max_candidates is not None:
+            n_candidates = min(n_candidates, self.max_candidates)
+        if self.margin is not None and len(results) > 1:
+            distances = np.array([result["distance"] for result in results], dtype=np.float64)
+            threshold = distances[0] + self.margin * distances.std()
+            n_candidates = min(n_candidates, int(np.sum(distances <= threshold)))
+        if self.latency_budget_ms is not None and self.ms_per_candidate:
+            n_candidates = min(n_candidates, int(self.latency_budget_ms / self.ms_per_candidate))
+        return min(len(results), max(n_candidates, self.min_candidates))
+
+    def update(self, n_reranked: int, elapsed_ms: float) -> None:
+        """
+        実測したリランキング時間で、候補1件あたりの時間の指数移動平均を更新する。
+
+        Parameters
+        ----------
+        n_reranked : int
+            リランキングした候補数
+        elapsed_ms : float
+            リランキングにかかった時間(ミリ秒)
+        """
+        if n_reranked == 0:
+            return
+        cost = elapsed_ms / n_reranked
+        if self.ms_per_candidate is None:
+            self.ms_per_candidate = cost
+        else:
+            self.ms_per_candidate = self.ema_alpha * cost + (1 - self.ema_alpha) * self.ms_per_candidate
@@ -0,0 +1,92 @@
+# src/reranking/documents.py
+
+from typing import Dict, Iterable, List, Optional
+
+from transformers import AutoTokenizer
+
+
+class RerankDocumentBuilder:
+    """
+    科目のメタデータから、リランキングに使う文書を作成するクラス。
+
+    `fields` の順にメタデータの項目を並べ、文字数(`max_chars`)またはトークン数(`max_tokens`)の上限で末尾を切り詰める。
+    優先度の高い項目を先に指定することで、長い項目(授業計画と内容、教科書など)による切り詰めの影響を抑える。
+    いずれも指定しない場合は、従来の検索結果ごとの文書から先頭の順位 ("1. " など) を除いたものと同じ文書を作成する。
+    """
+
+    # 文書の形式。変更した場合は値を上げ、保存済みの文書を作り直す
+    format_version = 2
+
+    def __init__(
+        self,
+        fields: Optional[List[str]] = None,
+        max_chars: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        tokenizer: Optional[str] = None,
+    ):
+        """
+        Parameters
+        ----------
+        fields : List[str], optional
+            文書に含めるメタデータの項目(優先度の高い順)。指定しない場合はメタデータの全項目をその順で含める
+        max_chars : int, optional
+            文書の最大文字数
+        max_tokens : int, optional
+            文書の最大トークン数。`tokenizer` と併せて指定する
+        tokenizer : str, optional
+            トークン数を数えるトークナイザ(Hugging Faceのモデル名)
+        """
+        self.fields = fields
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer) if tokenizer and max_tokens else None
+
+    def build(self, metadata: Dict) -> str:
+        """
+        1科目のメタデータから文書を作成する。
+
+        Parameters
+        ----------
+        metadata : Dict
+            科目のメタデータ
+
+        Returns
+        -------
+        str
+            リランキング用の文書
+        """
+        keys: Iterable[str] = self.fields if self.fields is not None else metadata.keys()
+        description = ", ".join([f"{key}: {metadata[key]}" for key in keys if key != "lecture_no" and key in metadata])
+        return self.truncate(f"講義名: {metadata.get('lecture_name', '')}\n   説明: {description}") + "\n\n"
+
+    def truncate(self, document: str) -> str:
+        """
+        文書を文字数・トークン数の上限で切り詰める。
+        """
+        if self.max_chars is not None:
+            document = document[: self.max_chars]
+        if self.tokenizer is not None and self.max_tokens is not None:
+            offsets = self.tokenizer(document, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+            if len(offsets) > self.max_tokens:
+                document = document[: offsets[self.max_tokens - 1][1]]
+        return document
+
+    def build_all(self, metadata_list: Iterable[Dict]) -> Dict[str, str]:
+        """
+        科目ごとの文書を作成する。同じ科目のチャンクが複数ある場合は最初のメタデータを使う。
+
+        Parameters
+        ----------
+        metadata_list : Iterable[Dict]
+            チャンクごとのメタデータ
+
+        Returns
+        -------
+        Dict[str, str]
+            科目番号から文書への対応
+        """
+        documents: Dict[str, str] = {}
+        for metadata in metadata_list:
+            if metadata["lecture_no"] not in documents:
+                documents[metadata["lecture_no"]] = self.build(metadata)
+        return documents
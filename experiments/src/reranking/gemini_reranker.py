@@ -1,11 +1,12 @@
 # src/reranking/llm_reranker.py
 
+import asyncio
 import json
 import os
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from src.utils import get_api_client
 
 from .base import BaseReranker
 
@@ -15,23 +16,44 @@ class GeminiReranker(BaseReranker):
     Geminiを用いたリランキングクラス。
     """
 
-    def __init__(self, model: str, api_key: str = ""):
+    def __init__(
+        self,
+        model: str,
+        api_key: str = "",
+        base_url: str = "https://generativelanguage.googleapis.com/v1beta/",
+        max_concurrency: int = 8,
+        requests_per_second: Optional[float] = None,
+    ):
+        """
+        Parameters
+        ----------
+        model : str
+            リランキングに使うモデル名
+        api_key : str
+            APIキー。指定しない場合は環境変数GEMINI_API_KEYを使う
+        base_url : str
+            APIのベースURL。動作確認時はモックサーバのURLを指定する
+        max_concurrency : int
+            同時に送信するリクエスト数の上限
+        requests_per_second : float, optional
+            1秒あたりのリクエスト数の上限
+        """
         load_dotenv()
 
         self.model = model
+        self.model_name = model
         self.api_key = api_key or os.getenv("GEMINI_API_KEY")
 
         if not self.api_key:
             raise ValueError("OpenAI API key must be provided either via parameter or environment variable.")
 
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url="https://generativelanguage.googleapis.com/v1beta/",
+        self.client = get_api_client(
+            base_url, self.api_key, max_concurrency=max_concurrency, requests_per_second=requests_per_second
         )
 
-    def rerank(self, query: str, results: List[Dict]) -> List[Dict]:
+    def score(self, query: str, results: List[Dict]) -> List[float]:
         """
-        Geminiを用いて検索結果をリランキングする。
+        Geminiを用いて検索結果のスコアを計算する。
 
         Parameters
         ----------
@@ -42,25 +64,42 @@ class GeminiReranker(BaseReranker):
 
         Returns
         -------
-        List[Dict]
-            リランキング後の検索結果のリスト
+        List[float]
+            検索結果と同じ順のスコアのリスト
+        """
+        return self.score_batch([query], [results])[0]
+
+    def score_batch(self, queries: List[str], results_list: List[List[Dict]]) -> List[List[float]]:
+        """
+        複数のクエリのスコア計算を、同時実行数の上限まで並行してGeminiに送信する。
+
+        Parameters
+        ----------
+        queries : List[str]
+            ユーザーのクエリのリスト
+        results_list : List[List[Dict]]
+            クエリごとの検索結果のリスト
+
+        Returns
+        -------
+        List[List[float]]
+            クエリごとのスコアのリスト
         """
+        return self.client.run(self._score_batch_async(queries, results_list))
+
+    async def _score_batch_async(self, queries: List[str], results_list: List[List[Dict]]) -> List[List[float]]:
         # LLMにプロンプトを送信してスコアを取得
-        prompt = self.build_prompt(query, results)
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "user", "content": prompt},
-            ],
-            response_format={"type": "json_object"},
+        responses = await asyncio.gather(
+            *[
+                self.client.chat_completion(
+                    self.model,
+                    [{"role": "user", "content": self.build_prompt(query, results)}],
+                    response_format={"type": "json_object"},
+                )
+                for query, results in zip(queries, results_list)
+            ]
         )
-        scores = self.parse_response(str(response.choices[0].message.content))
-
-        # スコアを結果に追加してソート
-        for result, score in zip(results, scores):
-            result["score"] = score
-        sorted_results = sorted(results, key=lambda x: (x["score"], -x["distance"]), reverse=True)
-        return sorted_results
+        return [self.parse_response(response) for response in responses]
 
     def build_prompt(self, query: str, results: List[Dict]) -> str:
         """
@@ -80,11 +119,7 @@ class GeminiReranker(BaseReranker):
         """
         prompt = ""
         for idx, result in enumerate(results, 1):
-            lecture_name = result["metadata"]["lecture_name"]
-            description = ", ".join(
-                [f"{key}: {value}" for key, value in result["metadata"].items() if key != "lecture_no"]
-            )
-            prompt += f"{idx}. 講義名: {lecture_name}\n   説明: {description}\n\n"
+            prompt += f"{idx}. {self.build_document(result['metadata'])}"
         prompt += (
             f"上記の講義について、ユーザーのクエリ '{query}' に対する関連度スコアを1から10で評価してください。\n"
             "関連度スコア(1~10)を以下のJSON形式(Dict[str, List[int]])で返してください。\n{'scores': [score, ...]}"
@@ -1,6 +1,7 @@
 # src/search/__init__.py
 
 from .base import BaseSearcher
-from .simple_search import SimpleSearcher
+from .metadata_store import MetadataStore
+from .simple_search import SimpleSearcher, build_id_selector, build_search_parameters
 
-__all__ = ["BaseSearcher", "SimpleSearcher"]
+__all__ = ["BaseSearcher", "MetadataStore", "SimpleSearcher", "build_id_selector", "build_search_parameters"]
@@ -1,7 +1,9 @@
 # src/search/base.py
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Union
+
+import numpy as np
 
 
 class BaseSearcher(ABC):
@@ -10,18 +12,26 @@ class BaseSearcher(ABC):
     """
 
     @abstractmethod
-    def search(self, query_vector: List[float], metadata_filter: Optional[Dict] = None, top_k: int = 10) -> List[Dict]:
+    def search(
+        self,
+        query_vector: Union[List[float], np.ndarray],
+        metadata_filter: Optional[Dict] = None,
+        top_k: int = 10,
+        search_params: Optional[Dict] = None,
+    ) -> List[Dict]:
         """
         検索を実行するメソッド。
 
         Parameters
         ----------
-        query_vector : List[float]
+        query_vector : List[float] or np.ndarray
             クエリの埋め込みベクトル
         metadata_filter : Dict, optional
             メタデータによるフィルタリング条件
         top_k : int
             取得する上位K件
+        search_params : Dict, optional
+            インデックスの検索時パラメータ(nprobe, ef_search など)
 
         Returns
         -------
@@ -29,3 +39,35 @@ class BaseSearcher(ABC):
             検索結果のリスト
         """
         pass
+
+    def search_batch(
+        self,
+        query_matrix: np.ndarray,
+        metadata_filter: Optional[Dict] = None,
+        top_k: int = 10,
+        search_params: Optional[Dict] = None,
+    ) -> List[List[Dict]]:
+        """
+        同じフィルタ条件で複数のクエリの検索をまとめて実行するメソッド。
+        デフォルトでは1クエリずつ `search` を呼び出す。
+
+        Parameters
+        ----------
+        query_matrix : np.ndarray
+            クエリの埋め込みベクトルを行に持つ2次元配列
+        metadata_filter : Dict, optional
+            メタデータによるフィルタリング条件
+        top_k : int
+            取得する上位K件
+        search_params : Dict, optional
+            インデックスの検索時パラメータ(nprobe, ef_search など)
+
+        Returns
+        -------
+        List[List[Dict]]
+            クエリごとの検索結果のリスト
+        """
+        return [
+            self.search(query_vector, metadata_filter=metadata_filter, top_k=top_k, search_params=search_params)
+            for query_vector in query_matrix
+        ]
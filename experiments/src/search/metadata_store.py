@@ -0,0 +1,164 @@
+# src/search/metadata_store.py
+
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+# 整数コード化して保持するメタデータのキー
+CATEGORICAL_KEYS = [
+    "department",
+    "section",
+    "授業形態",
+    "使用言語",
+    "開講年度・開講期",
+    "レベル",
+    "学問分野",
+]
+
+# 曜時限のビットマスク表現。月1~金5の25コマと集中講義の計26ビット
+TIMETABLE_KEY = "曜時限"
+TIMETABLE_SLOTS = [f"{day}{period}" for day in ["月", "火", "水", "木", "金"] for period in range(1, 6)] + ["集中講義"]
+TIMETABLE_SLOT_BITS = {slot: 1 << i for i, slot in enumerate(TIMETABLE_SLOTS)}
+
+
+class MetadataStore:
+    """
+    チャンクのメタデータを列ごとに整数コード化して保持し、フィルタ条件をNumPyの配列演算で評価するクラス。
+    """
+
+    def __init__(self, metadata_list: List[Dict]):
+        """
+        Parameters
+        ----------
+        metadata_list : List[Dict]
+            チャンクIDの順に並んだメタデータのリスト
+        """
+        self.metadata_list = metadata_list
+        self.size = len(metadata_list)
+
+        # カテゴリ列: 値 -> コードの辞書と、チャンクごとのコード(欠損は-1)
+        self.vocabularies: Dict[str, Dict] = {}
+        self.columns: Dict[str, np.ndarray] = {}
+        for key in CATEGORICAL_KEYS:
+            self._build_column(key)
+
+        # 曜時限列: コマのビットマスクと、部分一致用の文字列コード
+        self._build_column(TIMETABLE_KEY)
+        self.timetable_missing = np.array([TIMETABLE_KEY not in metadata for metadata in metadata_list], dtype=bool)
+        vocabulary_bits = np.zeros(len(self.vocabularies[TIMETABLE_KEY]) + 1, dtype=np.uint32)
+        for value, code in self.vocabularies[TIMETABLE_KEY].items():
+            vocabulary_bits[code] = self._timetable_bits(value)
+        # 欠損(-1)は末尾の0を参照する
+        self.timetable = vocabulary_bits[self.columns[TIMETABLE_KEY]]
+
+    def _build_column(self, key: str) -> np.ndarray:
+        """
+        メタデータの1キー分を整数コードの列に変換して登録する。
+        """
+        vocabulary: Dict = {}
+        column = np.full(self.size, -1, dtype=np.int32)
+        for idx, metadata in enumerate(self.metadata_list):
+            if key in metadata:
+                column[idx] = vocabulary.setdefault(metadata[key], len(vocabulary))
+        self.vocabularies[key] = vocabulary
+        self.columns[key] = column
+        return column
+
+    @staticmethod
+    def _timetable_bits(value: Optional[str]) -> int:
+        """
+        曜時限の文字列から、含まれるコマのビットマスクを作成する。
+        """
+        if not isinstance(value, str):
+            return 0
+        bits = 0
+        for slot, bit in TIMETABLE_SLOT_BITS.items():
+            if slot in value:
+                bits |= bit
+        return bits
+
+    def _equal_mask(self, key: str, value: object) -> np.ndarray:
+        """
+        メタデータの値が完全一致するチャンクのマスクを返す。
+        """
+        if key not in self.columns:
+            # 事前に列化していないキーは初回の参照時に列化する
+            self._build_column(key)
+        code = self.vocabularies[key].get(value)
+        if code is None:
+            return np.zeros(self.size, dtype=bool)
+        mask: np.ndarray = self.columns[key] == code
+        return mask
+
+    def _timetable_mask(self, conditions: Union[str, Sequence[str]]) -> np.ndarray:
+        """
+        指定したコマのいずれかを含むチャンクのマスクを返す。
+        曜時限が記載されていないチャンクは、条件が1つ以上あれば常に一致とする。
+        """
+        if isinstance(conditions, str):
+            conditions = [conditions]
+        if not conditions:
+            return np.zeros(self.size, dtype=bool)
+
+        condition_bits = 0
+        unknown_conditions = []
+        for condition in conditions:
+            if condition in TIMETABLE_SLOT_BITS:
+                condition_bits |= TIMETABLE_SLOT_BITS[condition]
+            else:
+                unknown_conditions.append(condition)
+
+        mask: np.ndarray = (self.timetable & condition_bits) != 0
+        mask |= self.timetable_missing
+        if unknown_conditions:
+            # ビットに対応しない条件は、曜時限の異なり文字列に対して部分一致で評価する
+            matched_codes = [
+                code
+                for value, code in self.vocabularies[TIMETABLE_KEY].items()
+                if isinstance(value, str) and any(condition in value for condition in unknown_conditions)
+            ]
+            mask |= np.isin(self.columns[TIMETABLE_KEY], matched_codes)
+        return mask
+
+    def mask(self, filters: Optional[Dict]) -> np.ndarray:
+        """
+        フィルタ条件に合致するチャンクのマスクを返す。
+
+        Parameters
+        ----------
+        filters : Dict, optional
+            フィルタリング条件。曜時限はコマのリストで指定し、いずれかを含めば一致とする。
+            それ以外のキーは値の完全一致で判定する。
+
+        Returns
+        -------
+        np.ndarray
+            チャンクIDの順に並んだbool配列
+        """
+        mask = np.ones(self.size, dtype=bool)
+        if not filters:
+            return mask
+        for key, value in filters.items():
+            if key == TIMETABLE_KEY:
+                mask &= self._timetable_mask(value)
+            else:
+                mask &= self._equal_mask(key, value)
+        return mask
+
+    def filter(self, filters: Optional[Dict]) -> np.ndarray:
+        """
+        フィルタ条件に合致するチャンクIDの配列を返す。
+
+        Parameters
+        ----------
+        filters : Dict, optional
+            フィルタリング条件
+
+        Returns
+        -------
+        np.ndarray
+            条件に合致するチャンクIDの昇順の配列
+        """
+        if not filters:
+            return np.arange(self.size, dtype=np.int64)
+        return np.flatnonzero(self.mask(filters)).astype(np.int64)
@@ -1,12 +1,73 @@
 # src/search/simple_search.py
 
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
 import faiss
 import numpy as np
 from loguru import logger
 
 from .base import BaseSearcher
+from .metadata_store import MetadataStore
+
+
+def build_id_selector(mask: np.ndarray) -> faiss.IDSelector:
+    """
+    bool配列のマスクから、Trueの位置のIDを選択するFAISSのセレクタを作成する。
+
+    Parameters
+    ----------
+    mask : np.ndarray
+        IDの順に並んだbool配列
+
+    Returns
+    -------
+    faiss.IDSelector
+        ビットマップによるIDのセレクタ
+    """
+    bitmap = np.packbits(mask, bitorder="little")
+    # FAISSのPythonラッパーはビットマップの配列のみを受け取るが、型スタブはC++の (n, bitmap) の引数を記述している
+    selector: faiss.IDSelector = faiss.IDSelectorBitmap(bitmap)  # type: ignore[call-arg, arg-type]
+    return selector
+
+
+def build_search_parameters(
+    index: faiss.Index, selector: Optional[faiss.IDSelector], search_params: Dict
+) -> Optional[faiss.SearchParameters]:
+    """
+    インデックスの種類に応じたFAISSの検索時パラメータを作成する。
+
+    Parameters
+    ----------
+    index : faiss.Index
+        検索するFAISSインデックス
+    selector : faiss.IDSelector, optional
+        検索対象とするIDのセレクタ
+    search_params : Dict
+        検索時パラメータ(nprobe, ef_search)。指定しない場合はインデックスの値を使う。
+
+    Returns
+    -------
+    faiss.SearchParameters, optional
+        FAISSの検索時パラメータ。指定が不要な場合はNone
+    """
+    params: faiss.SearchParameters
+    index_ivf = faiss.try_extract_index_ivf(index)
+    if index_ivf is not None:
+        ivf_params = faiss.SearchParametersIVF()
+        ivf_params.nprobe = search_params.get("nprobe", index_ivf.nprobe)
+        params = ivf_params
+    elif isinstance(index, faiss.IndexHNSW):
+        # SearchParametersHNSWはFAISSの型スタブに定義されていない
+        hnsw_params = faiss.SearchParametersHNSW()  # type: ignore[attr-defined]
+        hnsw_params.efSearch = search_params.get("ef_search", index.hnsw.efSearch)
+        params = hnsw_params
+    elif selector is None:
+        return None
+    else:
+        params = faiss.SearchParameters()
+    if selector is not None:
+        params.sel = selector
+    return params
 
 
 class SimpleSearcher(BaseSearcher):
@@ -14,94 +75,288 @@ class SimpleSearcher(BaseSearcher):
     FAISSを用いたベクトル類似度検索クラス。
     """
 
-    def __init__(self, index: faiss.Index, id_to_metadata: Dict):
+    def __init__(
+        self,
+        index: faiss.Index,
+        id_to_metadata: Dict[int, Dict],
+        vectors: Optional[np.ndarray] = None,
+        search_params: Optional[Dict] = None,
+        exact_search_threshold: int = 0,
+        normalize: bool = False,
+        rescore_factor: int = 0,
+    ):
+        """
+        Parameters
+        ----------
+        index : faiss.Index
+            FAISSインデックス (Flat, IVF, HNSW)
+        id_to_metadata : Dict[int, Dict]
+            チャンクIDからメタデータへの対応
+        vectors : np.ndarray, optional
+            チャンクIDを行番号とするベクトル行列。指定しない場合はインデックスから復元する。
+        search_params : Dict, optional
+            デフォルトの検索時パラメータ(nprobe, ef_search)
+        exact_search_threshold : int
+            近似インデックスの場合に、フィルタ後の件数がこの値以下ならベクトル行列で全件探索する
+        normalize : bool
+            インデックスのベクトルをL2正規化している場合はTrue。クエリも正規化して検索する。
+        rescore_factor : int
+            2以上の場合、量子化・近似インデックスから候補をこの倍数だけ多めに取得し、
+            ベクトル行列との正確な距離で並べ替える
+        """
         self.index = index
         self.id_to_metadata = id_to_metadata
+        self.search_params = search_params or {}
+        self.exact_search_threshold = exact_search_threshold
+        self.normalize = normalize
+        self.rescore_factor = rescore_factor
+
+        # ベクトルはチャンクIDを行番号とする1つの連続した行列として保持する
+        # 保存済みの行列(np.memmap)が渡されない場合はインデックスから一括で復元する
+        if vectors is None:
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            if self.rescore_factor > 1 and not self.is_exact_index:
+                # 量子化・近似インデックスから復元したベクトルは誤差を含むため、正確な距離での並べ替えには使わない
+                logger.warning("Rescoring is disabled because the vectors are reconstructed from a lossy index.")
+                self.rescore_factor = 0
+        if vectors.shape != (self.index.ntotal, self.index.d):
+            raise ValueError(
+                f"Shape of vectors {vectors.shape} does not match the index ({self.index.ntotal}, {self.index.d})."
+            )
+        self.vectors = vectors
+
+        # 科目とチャンクの対応を事前計算
+        # chunk_to_lecture[チャンクID] = 科目番号(lecture_nosの位置)
+        # lecture_chunk_ids[lecture_offsets[i] : lecture_offsets[i + 1]] = i番目の科目のチャンクID
+        lecture_to_idx: Dict[str, int] = {}
+        self.chunk_to_lecture = np.empty(len(self.id_to_metadata), dtype=np.int32)
+        for idx in range(len(self.id_to_metadata)):
+            lecture_no = self.id_to_metadata[idx]["lecture_no"]
+            self.chunk_to_lecture[idx] = lecture_to_idx.setdefault(lecture_no, len(lecture_to_idx))
+        self.lecture_nos = list(lecture_to_idx.keys())
+        self.lecture_to_idx = lecture_to_idx
+        chunk_counts = np.bincount(self.chunk_to_lecture, minlength=len(self.lecture_nos))
+        self.lecture_offsets = np.concatenate([[0], np.cumsum(chunk_counts)]).astype(np.int64)
+        self.lecture_chunk_ids = np.argsort(self.chunk_to_lecture, kind="stable").astype(np.int64)
+        self.max_chunks_per_lecture = int(chunk_counts.max()) if len(chunk_counts) else 0
+        self.avg_chunks_per_lecture = float(chunk_counts.mean()) if len(chunk_counts) else 0.0
 
-        self.id_to_vector = {}
-        for idx in range(self.index.ntotal):
-            vector = np.zeros(self.index.d, dtype=np.float32)
-            self.index.reconstruct(idx, vector)
-            self.id_to_vector[str(idx)] = vector
+        # フィルタリング用のメタデータ列を構築
+        self.metadata_store = MetadataStore([self.id_to_metadata[idx] for idx in range(len(self.id_to_metadata))])
 
-    def search(self, query_vector: List[float], metadata_filter: Optional[Dict] = None, top_k: int = 10) -> List[Dict]:
+        logger.info(
+            f"Lectures: {len(self.lecture_nos)}, chunks per lecture: "
+            f"max={self.max_chunks_per_lecture}, avg={self.avg_chunks_per_lecture:.2f}"
+        )
+
+    def get_lecture_chunk_ids(self, lecture_no: str) -> np.ndarray:
+        """
+        科目に属するチャンクIDの配列を返す。
+
+        Parameters
+        ----------
+        lecture_no : str
+            科目番号
+
+        Returns
+        -------
+        np.ndarray
+            チャンクIDの配列
+        """
+        idx = self.lecture_to_idx[lecture_no]
+        return self.lecture_chunk_ids[self.lecture_offsets[idx] : self.lecture_offsets[idx + 1]]
+
+    def search(
+        self,
+        query_vector: Union[List[float], np.ndarray],
+        metadata_filter: Optional[Dict] = None,
+        top_k: int = 10,
+        search_params: Optional[Dict] = None,
+    ) -> List[Dict]:
         """
         クエリとのベクトル類似度に基づいた検索を行う。
 
         Parameters
         ----------
-        query_vector : List[float]
+        query_vector : List[float] or np.ndarray
             クエリの埋め込みベクトル
         metadata_filter : Dict, optional
             メタデータによるフィルタリング条件
         top_k : int
             取得する上位K件
+        search_params : Dict, optional
+            検索時パラメータ(nprobe, ef_search)。指定しない場合は初期化時の値を使う。
 
         Returns
         -------
         List[Dict]
             検索結果のリスト
         """
-        # フィルタリング
-        filtered_ids = self.apply_metadata_filter(metadata_filter)
-        if not filtered_ids:
-            return []
-        logger.info(f"Filtered: {self.index.ntotal} -> {len(filtered_ids)}")
+        query_matrix = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+        return self.search_batch(
+            query_matrix, metadata_filter=metadata_filter, top_k=top_k, search_params=search_params
+        )[0]
 
-        # フィルタ済みIDのベクトルを取得
-        filtered_vectors = [self.id_to_vector[id_] for id_ in filtered_ids]
+    def search_batch(
+        self,
+        query_matrix: np.ndarray,
+        metadata_filter: Optional[Dict] = None,
+        top_k: int = 10,
+        search_params: Optional[Dict] = None,
+    ) -> List[List[Dict]]:
+        """
+        同じフィルタ条件で複数のクエリの検索を1回のFAISS呼び出しでまとめて行う。
 
-        # 一時的なFAISSインデックスを作成
-        filtered_vectors_np = np.array(filtered_vectors).astype("float32")
-        temp_index = faiss.IndexFlatL2(filtered_vectors_np.shape[1])
-        temp_index.add(filtered_vectors_np)
+        Parameters
+        ----------
+        query_matrix : np.ndarray
+            クエリの埋め込みベクトルを行に持つ2次元配列
+        metadata_filter : Dict, optional
+            メタデータによるフィルタリング条件
+        top_k : int
+            取得する上位K件
+        search_params : Dict, optional
+            検索時パラメータ(nprobe, ef_search)。指定しない場合は初期化時の値を使う。
 
+        Returns
+        -------
+        List[List[Dict]]
+            クエリごとの検索結果のリスト
+        """
         # クエリベクトルの整形
-        query_np = np.array(query_vector).astype("float32").reshape(1, -1)
+        query_np = np.array(query_matrix, dtype=np.float32).reshape(-1, self.index.d)
+        if self.normalize:
+            faiss.normalize_L2(query_np)
 
-        # 1科目に対するチャンク数の最大値を取得
-        lecture_nos = [value["lecture_no"] for value in self.id_to_metadata.values()]
-        max_freq = 0
-        for lecture_no in set(lecture_nos):
-            freq = lecture_nos.count(lecture_no)
-            if freq > max_freq:
-                max_freq = freq
+        # フィルタリング
+        filter_mask = self.metadata_store.mask(metadata_filter)
+        n_filtered = int(np.count_nonzero(filter_mask))
+        if n_filtered == 0:
+            return [[] for _ in range(len(query_np))]
+        logger.info(f"Filtered: {self.index.ntotal} -> {n_filtered}")
+
+        # 1科目あたりのチャンク数の最大値だけ多めに取得し、科目単位でtop_k件を確保する
+        n_candidates = min(top_k * self.max_chunks_per_lecture, n_filtered)
 
         # 類似度検索
-        distances, indices = temp_index.search(query_np, top_k * max_freq)
+        if 0 < self.exact_search_threshold and n_filtered <= self.exact_search_threshold and not self.is_exact_index:
+            # 近似インデックスでは絞り込みが強いと候補が不足するため、ベクトル行列で全件探索する
+            distances, indices = self._exact_search(query_np, filter_mask, n_candidates)
+        else:
+            # フィルタがある場合はメインのインデックス上でビットマップによりIDを絞り込んで検索する
+            selector = None
+            if n_filtered < self.index.ntotal:
+                selector = build_id_selector(filter_mask)
+            params = build_search_parameters(self.index, selector, {**self.search_params, **(search_params or {})})
+            if self.rescore_factor > 1 and not self.is_exact_index:
+                # 量子化・近似された距離で多めに候補を取り、正確な距離で並べ替える
+                n_rescore = min(n_candidates * self.rescore_factor, n_filtered)
+                distances, indices = self.index.search(query_np, n_rescore, params=params)
+                distances, indices = self._rescore(query_np, indices, n_candidates)
+            else:
+                distances, indices = self.index.search(query_np, n_candidates, params=params)
+
+        return [self._build_results(distances[i], indices[i], top_k) for i in range(len(query_np))]
+
+    @property
+    def is_exact_index(self) -> bool:
+        """
+        インデックスが全件探索(IndexFlat)かどうか。
+        """
+        return isinstance(self.index, faiss.IndexFlat)
+
+    def _exact_search(self, query_np: np.ndarray, filter_mask: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        フィルタ条件に合致するチャンクのベクトルに対して全件探索を行う。
+
+        Parameters
+        ----------
+        query_np : np.ndarray
+            クエリの埋め込みベクトルを行に持つ2次元配列
+        filter_mask : np.ndarray
+            フィルタ条件に合致するチャンクのマスク
+        k : int
+            取得する件数
+
+        Returns
+        -------
+        np.ndarray
+            距離の配列
+        np.ndarray
+            チャンクIDの配列(該当なしは-1)
+        """
+        ids = np.flatnonzero(filter_mask)
+        distances, positions = faiss.knn(query_np, np.asarray(self.vectors[ids], dtype=np.float32), k)
+        indices = np.where(positions >= 0, ids[positions], -1)
+        return distances, indices
+
+    def _rescore(self, query_np: np.ndarray, indices: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        候補チャンクについてベクトル行列との正確なL2距離(二乗)を計算し、上位k件に並べ替える。
+
+        Parameters
+        ----------
+        query_np : np.ndarray
+            クエリの埋め込みベクトルを行に持つ2次元配列
+        indices : np.ndarray
+            候補チャンクのID(該当なしは-1)
+        k : int
+            取得する件数
+
+        Returns
+        -------
+        np.ndarray
+            距離の配列
+        np.ndarray
+            チャンクIDの配列(該当なしは-1)
+        """
+        valid = indices >= 0
+        candidate_vectors = np.asarray(self.vectors[np.where(valid, indices, 0).ravel()], dtype=np.float32)
+        candidate_vectors = candidate_vectors.reshape(*indices.shape, -1)
+        distances = np.sum((candidate_vectors - query_np[:, None, :]) ** 2, axis=2)
+        distances[~valid] = np.inf
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        distances = np.take_along_axis(distances, order, axis=1)
+        indices = np.where(np.isinf(distances), -1, np.take_along_axis(indices, order, axis=1))
+        return distances, indices
+
+    def _build_results(self, distances: np.ndarray, indices: np.ndarray, top_k: int) -> List[Dict]:
+        """
+        1クエリ分の検索結果を整形する。各科目について最も距離の近いチャンクのみを残す。
+
+        Parameters
+        ----------
+        distances : np.ndarray
+            候補チャンクとの距離
+        indices : np.ndarray
+            候補チャンクのID(該当なしは-1)
+        top_k : int
+            取得する上位K件
+
+        Returns
+        -------
+        List[Dict]
+            検索結果のリスト
+        """
+        valid = indices != -1
+        chunk_ids = indices[valid]
+        valid_distances = distances[valid]
+        _, first_positions = np.unique(self.chunk_to_lecture[chunk_ids], return_index=True)
+        first_positions = np.sort(first_positions)[:top_k]
 
-        # 検索結果の整形
         results = []
-        top_lecture_list = []
-        for idx in indices[0]:
-            if idx == -1:
-                continue
-            actual_id = filtered_ids[idx]
-            metadata = self.id_to_metadata.get(str(actual_id), {})
-            top_lecture_list.append(metadata["lecture_no"])
-        top_lecture_set = set(top_lecture_list)
-        top_lecture_count = 0
-        for distance, idx in zip(distances[0], indices[0]):
-            if idx == -1:
-                continue
-            actual_id = filtered_ids[idx]
-            metadata = self.id_to_metadata.get(str(actual_id), {})
-            if metadata["lecture_no"] in top_lecture_set:
-                results.append(
-                    {
-                        "distance": float(distance),
-                        "metadata": metadata,
-                    }
-                )
-                top_lecture_set.remove(metadata["lecture_no"])
-                top_lecture_count += 1
-            if top_lecture_count >= top_k:
-                break
+        for pos in first_positions:
+            results.append(
+                {
+                    "distance": float(valid_distances[pos]),
+                    "metadata": self.id_to_metadata.get(int(chunk_ids[pos]), {}),
+                }
+            )
         return results
 
-    def apply_metadata_filter(self, filters: Optional[Dict]) -> List[str]:
+    def apply_metadata_filter(self, filters: Optional[Dict]) -> np.ndarray:
         """
-        メタデータによるフィルタリングを適用して、対象となるIDのリストを返す。
+        メタデータによるフィルタリングを適用して、対象となるIDの配列を返す。
 
         Parameters
         ----------
@@ -110,28 +365,7 @@ class SimpleSearcher(BaseSearcher):
 
         Returns
         -------
-        List[str]
-            フィルタ条件に合致するIDのリスト
-        """
-        if not filters:
-            # フィルタが指定されていない場合は全IDを返す
-            return list(self.id_to_metadata.keys())
-
-        filtered_ids = []
-        for id_, metadata in self.id_to_metadata.items():
-            match = True
-            for key, value in filters.items():
-                if key == "曜時限":
-                    for cond_weekday in value:
-                        if cond_weekday in metadata.get("曜時限", value):
-                            break
-                    else:
-                        match = False
-                        break
-                    break
-                elif (key not in metadata) or (metadata[key] != value):
-                    match = False
-                    break
-            if match:
-                filtered_ids.append(id_)
-        return filtered_ids
+        np.ndarray
+            フィルタ条件に合致するIDの配列
+        """
+        return self.metadata_store.filter(filters)
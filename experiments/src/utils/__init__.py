@@ -1,14 +1,43 @@
 # src/utils/__init__.py
 
-from .io import load_htmls_under_dir, load_json, load_pickle, save_json, save_list_json, save_pickle
+from .api_client import ApiError, AsyncApiClient, get_api_client
+from .hashing import text_hash
+from .io import (
+    is_archive,
+    iter_htmls_in_archive,
+    iter_htmls_under_dir,
+    load_archive_index,
+    load_htmls_under_dir,
+    load_json,
+    load_npy,
+    load_pickle,
+    save_json,
+    save_list_json,
+    save_npy,
+    save_pickle,
+)
+from .parsed_store import ParsedSyllabusStore
 from .syllabus_parser import SyllabusParser
+from .text import normalize_query
 
 __all__ = [
+    "ApiError",
+    "AsyncApiClient",
+    "get_api_client",
+    "is_archive",
+    "iter_htmls_in_archive",
+    "iter_htmls_under_dir",
+    "load_archive_index",
     "load_htmls_under_dir",
     "load_json",
+    "load_npy",
     "load_pickle",
+    "normalize_query",
+    "ParsedSyllabusStore",
     "save_json",
     "save_list_json",
+    "save_npy",
     "save_pickle",
     "SyllabusParser",
+    "text_hash",
 ]
@@ -0,0 +1,394 @@
+# src/utils/api_client.py
+
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+import aiohttp
+import numpy as np
+from loguru import logger
+
+T = TypeVar("T")
+
+# リトライの対象とするHTTPステータス
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    トークンバケットによるリクエストレートの制限。
+    平均 `rate` 件/秒、最大 `capacity` 件のバーストまでリクエストを許可する。
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """
+        トークンを1つ消費する。トークンがない場合は補充されるまで待つ。
+        """
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ApiMetrics:
+    """
+    エンドポイントごとのリクエスト数・リトライ数・失敗数・レイテンシを集計するクラス。
+    常駐するプロセスでもメモリが増え続けないよう、レイテンシは直近 `latency_window` 件のみを保持する。
+    """
+
+    def __init__(self, latency_window: int = 10000) -> None:
+        """
+        Parameters
+        ----------
+        latency_window : int
+            エンドポイントごとに保持するレイテンシの件数
+        """
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.retries: Dict[str, int] = defaultdict(int)
+        self.failures: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=latency_window))
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        エンドポイントごとの集計結果を返す。レイテンシはミリ秒で、直近 `latency_window` 件の分位点。
+        """
+        stats = {}
+        for endpoint, n_requests in self.requests.items():
+            latencies = self.latencies[endpoint]
+            stats[endpoint] = {
+                "requests": n_requests,
+                "retries": self.retries[endpoint],
+                "failures": self.failures[endpoint],
+                "statuses": dict(self.statuses[endpoint]),
+                "latency_ms_p50": float(np.percentile(latencies, 50)) if latencies else None,
+                "latency_ms_p95": float(np.percentile(latencies, 95)) if latencies else None,
+            }
+        return stats
+
+
+class ApiError(Exception):
+    """
+    リトライしても成功しなかった、またはリトライ対象外のエラーが返ったAPIリクエスト。
+    """
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class AsyncApiClient:
+    """
+    OpenAI互換APIの非同期クライアント。
+    コネクションプールを共有し、同時実行数の上限・トークンバケットによるレート制限・429/5xxのリトライを行う。
+
+    イベントループは専用のバックグラウンドスレッドで動かすため、同期コードからは `run` で呼び出せる。
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        max_concurrency: int = 8,
+        requests_per_second: Optional[float] = None,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: float = 120.0,
+    ):
+        """
+        Parameters
+        ----------
+        base_url : str
+            APIのベースURL
+        api_key : str
+            APIキー
+        max_concurrency : int
+            同時に送信するリクエスト数の上限
+        requests_per_second : float, optional
+            1秒あたりのリクエスト数の上限。指定しない場合は制限しない
+        max_retries : int
+            429/5xx・通信エラー時の最大リトライ回数
+        backoff_base : float
+            リトライ間隔の基準(秒)。試行ごとに倍にし、ジッターを加える
+        backoff_max : float
+            リトライ間隔の上限(秒)
+        timeout : float
+            1リクエストのタイムアウト(秒)
+        """
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.metrics = ApiMetrics()
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="api-client", daemon=True)
+        self.thread.start()
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.bucket: Optional[TokenBucket] = None
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """
+        コルーチンをクライアントのイベントループで実行し、結果を待つ。
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()  # type: ignore
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # セッション・セマフォはイベントループ上で作成する必要があるため、最初のリクエスト時に作成する
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            if self.requests_per_second:
+                self.bucket = TokenBucket(self.requests_per_second)
+        return self.session
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        """
+        リトライまでの待ち時間。Retry-Afterヘッダがあればそれに従う。
+        """
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    async def request(self, method: str, endpoint: str, **kwargs: Any) -> Tuple[bytes, str]:
+        """
+        APIにリクエストを送信し、レスポンスの本文とContent-Typeを返す。
+        429/5xxと通信エラーは指数バックオフでリトライする。
+
+        Parameters
+        ----------
+        method : str
+            HTTPメソッド
+        endpoint : str
+            ベースURLからの相対パス ("embeddings" など)
+        **kwargs : Any
+            `aiohttp.ClientSession.request` に渡す引数
+
+        Returns
+        -------
+        Tuple[bytes, str]
+            レスポンスの本文とContent-Type
+        """
+        session = self._get_session()
+        assert self.semaphore is not None
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        metric_key = endpoint.split("/")[0]
+
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                await self.bucket.acquire()
+            async with self.semaphore:
+                start = time.perf_counter()
+                self.metrics.requests[metric_key] += 1
+                try:
+                    async with session.request(method, url, **kwargs) as response:
+                        body = await response.read()
+                        status = response.status
+                        retry_after = response.headers.get("Retry-After")
+                        content_type = response.content_type
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status, body, retry_after, content_type = -1, str(e).encode("utf-8"), None, ""
+                self.metrics.latencies[metric_key].append((time.perf_counter() - start) * 1000)
+                self.metrics.statuses[metric_key][status] += 1
+
+            if 200 <= status < 300:
+                return body, content_type
+            if status != -1 and status not in RETRY_STATUSES:
+                self.metrics.failures[metric_key] += 1
+                raise ApiError(status, body.decode("utf-8", errors="replace"))
+            if attempt < self.max_retries:
+                delay = self._backoff(attempt, retry_after)
+                self.metrics.retries[metric_key] += 1
+                logger.warning(f"{method} {endpoint} failed with {status}; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        self.metrics.failures[metric_key] += 1
+        raise ApiError(status, body.decode("utf-8", errors="replace"))
+
+    async def request_json(self, method: str, endpoint: str, **kwargs: Any) -> Dict:
+        """
+        APIにリクエストを送信し、JSONのレスポンスを返す。
+        """
+        body, _ = await self.request(method, endpoint, **kwargs)
+        return dict(json.loads(body))
+
+    async def embeddings(self, model: str, texts: List[str]) -> List[List[float]]:
+        """
+        テキストのリストを埋め込む。
+
+        Parameters
+        ----------
+        model : str
+            埋め込みモデル名
+        texts : List[str]
+            埋め込むテキストのリスト
+
+        Returns
+        -------
+        List[List[float]]
+            入力と同じ順の埋め込みベクトル
+        """
+        response = await self.request_json(
+            "POST", "embeddings", json={"model": model, "input": texts, "encoding_format": "float"}
+        )
+        data = sorted(response["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    async def chat_completion(self, model: str, messages: List[Dict], **kwargs: Any) -> str:
+        """
+        チャット補完を実行し、1件目の応答のテキストを返す。
+
+        Parameters
+        ----------
+        model : str
+            モデル名
+        messages : List[Dict]
+            メッセージのリスト
+        **kwargs : Any
+            リクエストに追加するパラメータ (response_formatなど)
+
+        Returns
+        -------
+        str
+            応答のテキスト
+        """
+        response = await self.request_json(
+            "POST", "chat/completions", json={"model": model, "messages": messages, **kwargs}
+        )
+        return str(response["choices"][0]["message"]["content"])
+
+    async def upload_file(self, path: str, purpose: str) -> Dict:
+        """
+        ファイルをアップロードする。
+        """
+        with open(path, "rb") as f:
+            form = aiohttp.FormData()
+            form.add_field("purpose", purpose)
+            form.add_field("file", f.read(), filename=path.split("/")[-1])
+        return await self.request_json("POST", "files", data=form)
+
+    async def file_content(self, file_id: str) -> bytes:
+        """
+        ファイルの内容を取得する。
+        """
+        body, _ = await self.request("GET", f"files/{file_id}/content")
+        return body
+
+    async def create_batch(self, input_file_id: str, endpoint: str, completion_window: str = "24h") -> Dict:
+        """
+        バッチジョブを作成する。
+        """
+        return await self.request_json(
+            "POST",
+            "batches",
+            json={"input_file_id": input_file_id, "endpoint": endpoint, "completion_window": completion_window},
+        )
+
+    async def retrieve_batch(self, batch_id: str) -> Dict:
+        """
+        バッチジョブの状態を取得する。
+        """
+        return await self.request_json("GET", f"batches/{batch_id}")
+
+    async def wait_for_batch(self, batch_id: str, poll_interval: float = 10.0, max_interval: float = 300.0) -> Dict:
+        """
+        バッチジョブが終了するまで待つ。ポーリング間隔は `max_interval` まで徐々に延ばす。
+
+        Parameters
+        ----------
+        batch_id : str
+            バッチジョブのID
+        poll_interval : float
+            最初のポーリング間隔(秒)
+        max_interval : float
+            ポーリング間隔の上限(秒)
+
+        Returns
+        -------
+        Dict
+            終了したバッチジョブ
+        """
+        interval = poll_interval
+        while True:
+            batch = await self.retrieve_batch(batch_id)
+            if batch["status"] in ("completed", "failed", "expired", "cancelled"):
+                return batch
+            await asyncio.sleep(interval)
+            interval = min(interval * 1.5, max_interval)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        エンドポイントごとのリクエスト数・リトライ数・失敗数・レイテンシを返す。
+        """
+        return self.metrics.stats()
+
+    def close(self) -> None:
+        """
+        セッションを閉じ、イベントループを停止する。
+        """
+        if self.session is not None:
+            self.run(self.session.close())
+            self.session = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+# (ベースURL, APIキー) ごとに共有するクライアント
+_clients: Dict[Tuple[str, str], AsyncApiClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_api_client(base_url: str, api_key: str, **kwargs: Any) -> AsyncApiClient:
+    """
+    (ベースURL, APIキー) ごとに共有する非同期クライアントを返す。
+    同じAPIを使う埋め込み・リランキングなどでコネクションプールとレート制限を共有するため、
+    クライアントの設定は最初に作成した際のものを使う。
+
+    Parameters
+    ----------
+    base_url : str
+        APIのベースURL
+    api_key : str
+        APIキー
+    **kwargs : Any
+        `AsyncApiClient` に渡す設定
+
+    Returns
+    -------
+    AsyncApiClient
+        共有の非同期クライアント
+    """
+    with _clients_lock:
+        key = (base_url, api_key)
+        if key not in _clients:
+            _clients[key] = AsyncApiClient(base_url, api_key, **kwargs)
+        return _clients[key]
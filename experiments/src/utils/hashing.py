@@ -0,0 +1,20 @@
+# src/utils/hashing.py
+
+import hashlib
+
+
+def text_hash(text: str) -> str:
+    """
+    テキストのSHA-256ハッシュ値を返す関数。
+
+    Parameters
+    ----------
+    text : str
+        ハッシュ値を計算するテキスト
+
+    Returns
+    -------
+    str
+        16進数表記のハッシュ値
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
@@ -1,19 +1,226 @@
 # src/utils/io.py
 
 import json
+import os
 import pickle
-from pathlib import Path
-from typing import Any, Dict, List
+import tarfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
 
+import numpy as np
 
-def load_htmls_under_dir(dir_path: str) -> List[Dict]:
+T = TypeVar("T")
+
+# アーカイブの隣に保存する、HTMLメンバーの索引ファイルの接尾辞
+ARCHIVE_INDEX_SUFFIX = ".index.json"
+
+
+def _read_html(file_path: Path) -> Optional[Dict]:
     """
-    ディレクトリ内およびサブディレクトリ内のHTMLファイルを読み込む関数。
+    HTMLファイルを1件読み込む。読み込みに失敗した場合はNoneを返す。
+    """
+    try:
+        return {
+            "html_content": file_path.read_text(encoding="utf-8"),
+            "lecture_no": file_path.stem,
+        }
+    except Exception as e:
+        print(f"Failed to read {file_path}: {e}")
+        return None
+
+
+def _iter_in_order(read: Callable[[T], Optional[Dict]], items: List[T], prefetch_workers: int) -> Iterator[Dict]:
+    """
+    `items` を順に `read` で読み込み、読み込めたレコードを返す。
+    `prefetch_workers` が1以上の場合はスレッドで先読みし、先読みする件数はスレッド数の4倍までとする。
+    """
+    if prefetch_workers <= 0:
+        for item in items:
+            entry = read(item)
+            if entry is not None:
+                yield entry
+        return
+
+    with ThreadPoolExecutor(max_workers=prefetch_workers) as executor:
+        pending: Deque[Future] = deque()
+        for item in items:
+            pending.append(executor.submit(read, item))
+            if len(pending) >= prefetch_workers * 4:
+                entry = pending.popleft().result()
+                if entry is not None:
+                    yield entry
+        while pending:
+            entry = pending.popleft().result()
+            if entry is not None:
+                yield entry
+
+
+def is_archive(path: str) -> bool:
+    """
+    パスがzipまたはtarのアーカイブかどうかを返す関数。
+    圧縮されたtarもTrueを返し、読み込み時にエラーとする(ディレクトリとして誤って扱わないため)。
+    """
+    return os.path.isfile(path) and (zipfile.is_zipfile(path) or tarfile.is_tarfile(path))
+
+
+def _scan_archive(archive_path: str) -> Dict:
+    """
+    アーカイブ内のHTMLメンバーを走査し、メンバー名と科目番号の索引を、ディレクトリから読む場合と同じパスの順に作る。
+
+    圧縮されたtar(.tar.gzなど)は、パスの順に読むには全体を展開するかメモリに載せる必要があるため扱わない。
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            names = [info.filename for info in zf.infolist() if not info.is_dir() and info.filename.endswith(".html")]
+        names.sort(key=lambda name: PurePosixPath(name).parts)
+        return {"format": "zip", "members": [[name, PurePosixPath(name).stem, 0, 0] for name in names]}
+
+    try:
+        tf = tarfile.open(archive_path, "r:")
+    except tarfile.ReadError:
+        raise ValueError(
+            f"{archive_path} is a compressed tar archive, which cannot be read in path order without unpacking. "
+            "Use a zip or an uncompressed tar archive instead."
+        )
+    with tf:
+        members: List[List[Any]] = [
+            [info.name, PurePosixPath(info.name).stem, info.offset_data, info.size]
+            for info in tf
+            if info.isfile() and info.name.endswith(".html")
+        ]
+    members.sort(key=lambda member: PurePosixPath(member[0]).parts)
+    return {"format": "tar", "members": members}
+
+
+def load_archive_index(archive_path: str) -> Dict:
+    """
+    アーカイブ内のHTMLメンバーの索引を返す関数。
+    索引はアーカイブの隣に保存し、アーカイブのサイズ・更新時刻が変わらない限り再利用する。
+
+    Parameters
+    ----------
+    archive_path : str
+        zipまたは非圧縮のtarのアーカイブのパス
+
+    Returns
+    -------
+    Dict
+        {"format": "zip" | "tar", "members": [[メンバー名, 科目番号, データの位置, サイズ], ...]}
+    """
+    stat = os.stat(archive_path)
+    index_path = archive_path + ARCHIVE_INDEX_SUFFIX
+    if os.path.exists(index_path):
+        try:
+            index: Dict = load_json(index_path)
+            if index["size"] == stat.st_size and index["mtime_ns"] == stat.st_mtime_ns:
+                return index
+        except Exception as e:
+            print(f"Failed to load {index_path}: {e}")
+
+    index = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, **_scan_archive(archive_path)}
+    try:
+        save_json(index, index_path)
+    except OSError as e:
+        # 読み取り専用のボリュームなどでは索引を保存せずに続ける
+        print(f"Failed to save {index_path}: {e}")
+    return index
+
+
+def iter_htmls_in_archive(archive_path: str, prefetch_workers: int = 0) -> Iterator[Dict]:
+    """
+    zipまたは非圧縮のtarのアーカイブ内のHTMLファイルを、展開せずにパスの順に1件ずつ読み込むジェネレータ。
+    初回の読み込み時に、アーカイブの隣へメンバーの索引 `<archive>.index.json` を書き込む(`load_archive_index`)。
+
+    Parameters
+    ----------
+    archive_path : str
+        zipまたは非圧縮のtarのアーカイブのパス
+    prefetch_workers : int, optional
+        1以上の場合、このスレッド数で先読みする, by default 0
+
+    Yields
+    ------
+    Dict
+        ファイル名とHTMLコンテンツの辞書
+        {"html_content": "<html>...</html>", "lecture_no": "12345"}
+    """
+    index = load_archive_index(archive_path)
+    members = index["members"]
+
+    if index["format"] == "zip":
+        with zipfile.ZipFile(archive_path) as zf:
+
+            def read_zip_member(member: List) -> Optional[Dict]:
+                try:
+                    return {"html_content": zf.read(member[0]).decode("utf-8"), "lecture_no": member[1]}
+                except Exception as e:
+                    print(f"Failed to read {member[0]} in {archive_path}: {e}")
+                    return None
+
+            yield from _iter_in_order(read_zip_member, members, prefetch_workers)
+
+    elif index["format"] == "tar":
+        # 非圧縮のtarは、索引に保存したデータの位置から直接読む
+        lock = threading.Lock()
+        with open(archive_path, "rb") as f:
+
+            def read_tar_member(member: List) -> Optional[Dict]:
+                try:
+                    with lock:
+                        f.seek(member[2])
+                        data = f.read(member[3])
+                    return {"html_content": data.decode("utf-8"), "lecture_no": member[1]}
+                except Exception as e:
+                    print(f"Failed to read {member[0]} in {archive_path}: {e}")
+                    return None
+
+            yield from _iter_in_order(read_tar_member, members, prefetch_workers)
+
+    else:
+        raise ValueError(f"Unsupported archive format in {archive_path}{ARCHIVE_INDEX_SUFFIX}: {index['format']}")
+
+
+def iter_htmls_under_dir(dir_path: str, prefetch_workers: int = 0) -> Iterator[Dict]:
+    """
+    ディレクトリ内およびサブディレクトリ内のHTMLファイルを1件ずつ読み込むジェネレータ。
+    ファイルはパスの順に返すため、実行ごとの順序は一定になる。
+    `dir_path` がzipまたは非圧縮のtarのアーカイブの場合は、展開せずにアーカイブから同じパスの順に読み込む。
+    その際、アーカイブの隣にメンバーの索引 `<archive>.index.json` を書き込む。
 
     Parameters
     ----------
     dir_path : str
-        HTMLファイルが格納されているディレクトリのパス
+        HTMLファイルが格納されているディレクトリ、またはそれを固めたアーカイブのパス
+    prefetch_workers : int, optional
+        1以上の場合、このスレッド数で先読みする(先読みする件数はスレッド数の4倍まで), by default 0
+
+    Yields
+    ------
+    Dict
+        ファイル名とHTMLコンテンツの辞書
+        {"html_content": "<html>...</html>", "lecture_no": "12345"}
+    """
+    if is_archive(dir_path):
+        yield from iter_htmls_in_archive(dir_path, prefetch_workers)
+        return
+    yield from _iter_in_order(_read_html, sorted(Path(dir_path).rglob("*.html")), prefetch_workers)
+
+
+def load_htmls_under_dir(dir_path: str, prefetch_workers: int = 0) -> List[Dict]:
+    """
+    ディレクトリ内およびサブディレクトリ内(またはアーカイブ内)のHTMLファイルを読み込む関数。
+    全件をメモリに載せるため、大きなコーパスでは `iter_htmls_under_dir` を使う。
+
+    Parameters
+    ----------
+    dir_path : str
+        HTMLファイルが格納されているディレクトリ、またはそれを固めたアーカイブのパス
+    prefetch_workers : int, optional
+        ファイルを先読みするスレッド数, by default 0
 
     Returns
     -------
@@ -24,21 +231,7 @@ def load_htmls_under_dir(dir_path: str) -> List[Dict]:
             {"html_content": "<html>...</html>", "lecture_no": "12346"},
         ]
     """
-    html_files = []
-    path = Path(dir_path)
-    for file_path in path.rglob("*.html"):
-        try:
-            html_content = file_path.read_text(encoding="utf-8")
-            lecture_no = file_path.stem
-            html_files.append(
-                {
-                    "html_content": html_content,
-                    "lecture_no": lecture_no,
-                }
-            )
-        except Exception as e:
-            print(f"Failed to read {file_path}: {e}")
-    return html_files
+    return list(iter_htmls_under_dir(dir_path, prefetch_workers))
 
 
 def load_json(path: str) -> Any:
@@ -59,6 +252,26 @@ def load_json(path: str) -> Any:
         return json.load(f)
 
 
+def load_npy(path: str, mmap: bool = False) -> np.ndarray:
+    """
+    .npyファイルを読み込む関数。
+
+    Parameters
+    ----------
+    path : str
+        読み込む.npyファイルのパス
+    mmap : bool, optional
+        Trueの場合はメモリマップとして読み込む, by default False
+
+    Returns
+    -------
+    np.ndarray
+        読み込んだ配列
+    """
+    array: np.ndarray = np.load(path, mmap_mode="r" if mmap else None)
+    return array
+
+
 def load_pickle(path: str) -> Any:
     """
     Pickleファイルを読み込む関数。
@@ -108,6 +321,20 @@ def save_list_json(data: List, path: str) -> None:
             f.write(json.dumps(d) + "\n")
 
 
+def save_npy(data: np.ndarray, path: str) -> None:
+    """
+    配列を.npyファイルに書き込む関数。
+
+    Parameters
+    ----------
+    data : np.ndarray
+        書き込む配列
+    path : str
+        書き込む先の.npyファイルのパス
+    """
+    np.save(path, np.ascontiguousarray(data))
+
+
 def save_pickle(data: Any, path: str) -> None:
     """
     Pickleファイルにデータを書き込む関数。
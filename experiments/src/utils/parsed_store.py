@@ -0,0 +1,152 @@
+# src/utils/parsed_store.py
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, Optional
+
+from .hashing import text_hash
+
+
+class ParsedSyllabusStore:
+    """
+    シラバスのHTMLのパース結果をSQLiteに保存する永続ストア。
+    (科目番号, HTMLのハッシュ値, パーサ) をキーとし、前処理の方式やチャンクサイズを変えてもHTMLを再パースせずに済むようにする。
+
+    前処理のプロセスプールに渡せるよう、SQLiteの接続はプロセスごとに初めて使う時点で開く。
+    """
+
+    def __init__(self, path: str, parser: str = "html.parser"):
+        """
+        Parameters
+        ----------
+        path : str
+            SQLiteファイルのパス
+        parser : str
+            パース結果を作ったパーサ(BeautifulSoupのパーサ名)。パーサごとに別のエントリとして保存する
+        """
+        self.path = path
+        self.parser = parser
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        state["_pid"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """
+        現在のプロセスのSQLite接続。フォーク・spawnされたプロセスでは新しく接続し直す。
+        """
+        if self._conn is None or self._pid != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # 複数プロセスからの同時書き込みでは、ロックが解放されるまで待つ
+            self._conn = sqlite3.connect(self.path, timeout=60.0, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS parsed_syllabi ("
+                "lecture_no TEXT NOT NULL, content_hash TEXT NOT NULL, parser TEXT NOT NULL, parsed TEXT NOT NULL, "
+                "PRIMARY KEY (lecture_no, content_hash, parser))"
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, lecture_no: str, html_content: str) -> Optional[Dict[str, Optional[str]]]:
+        """
+        パース結果を取得する。
+
+        Parameters
+        ----------
+        lecture_no : str
+            科目番号
+        html_content : str
+            HTMLコンテンツ
+
+        Returns
+        -------
+        Dict[str, Optional[str]], optional
+            パース結果の辞書。保存されていない場合はNone
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT parsed FROM parsed_syllabi WHERE lecture_no = ? AND content_hash = ? AND parser = ?",
+                (lecture_no, text_hash(html_content), self.parser),
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        parsed: Dict[str, Optional[str]] = json.loads(row[0])
+        return parsed
+
+    def put(self, lecture_no: str, html_content: str, parsed: Dict[str, Optional[str]]) -> None:
+        """
+        パース結果を保存する。
+
+        Parameters
+        ----------
+        lecture_no : str
+            科目番号
+        html_content : str
+            HTMLコンテンツ
+        parsed : Dict[str, Optional[str]]
+            パース結果の辞書
+        """
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO parsed_syllabi (lecture_no, content_hash, parser, parsed) VALUES (?, ?, ?, ?)",
+                (lecture_no, text_hash(html_content), self.parser, json.dumps(parsed, ensure_ascii=False)),
+            )
+            self.conn.commit()
+
+    def get_or_parse(
+        self, lecture_no: str, html_content: str, parse: Callable[[str], Dict[str, Optional[str]]]
+    ) -> Dict[str, Optional[str]]:
+        """
+        保存されたパース結果を返す。保存されていない場合は `parse` でパースして保存する。
+
+        Parameters
+        ----------
+        lecture_no : str
+            科目番号
+        html_content : str
+            HTMLコンテンツ
+        parse : Callable[[str], Dict[str, Optional[str]]]
+            HTMLコンテンツをパースする関数
+
+        Returns
+        -------
+        Dict[str, Optional[str]]
+            パース結果の辞書
+        """
+        parsed = self.get(lecture_no, html_content)
+        if parsed is None:
+            parsed = parse(html_content)
+            self.put(lecture_no, html_content, parsed)
+        return parsed
+
+    def stats(self) -> Dict[str, int]:
+        """
+        現在のプロセスでのヒット数・ミス数を返す。
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        with self._lock:
+            (n_entries,) = self.conn.execute("SELECT COUNT(*) FROM parsed_syllabi").fetchone()
+        return int(n_entries)
@@ -1,12 +1,83 @@
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from bs4 import BeautifulSoup
 from bs4.element import Tag
 
+SUBHEADING_CLASS = "lesson_plan_subheading"
+SELL_CLASS = "lesson_plan_sell"
+
 
 class SyllabusParser:
-    def __init__(self, html: str) -> None:
-        self.soup = BeautifulSoup(html, "html.parser")
+    def __init__(self, html: str, single_pass: bool = False, features: str = "html.parser") -> None:
+        """
+        Parameters
+        ----------
+        html : str
+            シラバスのHTML
+        single_pass : bool
+            Trueの場合、見出し要素を1回の走査で索引化してから各項目を抽出する。
+            見出しごとに文書全体を探索する通常のモードと同じ結果を返す。
+        features : str
+            BeautifulSoupのパーサ。"lxml"は高速だが、不正なHTMLの補正が"html.parser"と異なる場合がある
+        """
+        self.soup = BeautifulSoup(html, features)
+        self.single_pass = single_pass
+        if single_pass:
+            self._build_heading_index()
+
+    def _build_heading_index(self) -> None:
+        """
+        文書を1回だけ走査し、見出し要素(span/div.lesson_plan_subheading)とtd.lesson_plan_sellを文書順に記録する。
+        """
+        # (要素, 要素の.string) / (要素, get_text(strip=True)) のリスト
+        self.subheading_spans: List[Tuple[Tag, Optional[str]]] = []
+        self.subheading_divs: List[Tuple[Tag, str]] = []
+        self.sell_tds: List[Tuple[Tag, Optional[str]]] = []
+        for tag in self.soup.find_all(["span", "div", "td"]):
+            classes = tag.get_attribute_list("class")
+            if tag.name == "span" and SUBHEADING_CLASS in classes:
+                self.subheading_spans.append((tag, tag.string))
+            elif tag.name == "div" and SUBHEADING_CLASS in classes:
+                self.subheading_divs.append((tag, tag.get_text(strip=True)))
+            elif tag.name == "td" and SELL_CLASS in classes:
+                self.sell_tds.append((tag, tag.string))
+
+    def _find_subheading_span(self, keyword: str, exact: bool = False) -> Optional[Tag]:
+        """
+        文字列が `keyword` を含む(`exact` の場合は一致する)最初のspan.lesson_plan_subheadingを返す。
+        """
+        if self.single_pass:
+            for tag, string in self.subheading_spans:
+                if string is not None and (string == keyword if exact else keyword in string):
+                    return tag
+            return None
+        if exact:
+            found = self.soup.find("span", class_=SUBHEADING_CLASS, string=keyword)
+        else:
+            found = self.soup.find("span", class_=SUBHEADING_CLASS, string=lambda x: x and keyword in x)
+        return found if isinstance(found, Tag) else None
+
+    def _find_sell_td(self, keyword: str) -> Optional[Tag]:
+        """
+        文字列が `keyword` を含む最初のtd.lesson_plan_sellを返す。
+        """
+        if self.single_pass:
+            for tag, string in self.sell_tds:
+                if string and keyword in string:
+                    return tag
+            return None
+        found = self.soup.find("td", class_=SELL_CLASS, string=lambda x: x and keyword in x)
+        return found if isinstance(found, Tag) else None
+
+    def _iter_subheading_divs(self) -> Iterator[Tuple[Tag, str]]:
+        """
+        div.lesson_plan_subheadingと、そのテキストを文書順に返す。
+        """
+        if self.single_pass:
+            yield from self.subheading_divs
+            return
+        for sub in self.soup.find_all("div", class_=SUBHEADING_CLASS):
+            yield sub, sub.get_text(strip=True)
 
     def _get_text_after_subheading(self, heading_text: str) -> Optional[str]:
         """
@@ -14,9 +85,8 @@ class SyllabusParser:
         次の兄弟ノードまたは親要素内のテキストを取得するためのユーティリティメソッド。
         """
         # lesson_plan_subheadingのdivを全て取得
-        subheadings = self.soup.find_all("div", class_="lesson_plan_subheading")
-        for sub in subheadings:
-            if heading_text in sub.get_text(strip=True):
+        for sub, sub_text in self._iter_subheading_divs():
+            if heading_text in sub_text:
                 # subheadingの親要素には次に続くテキストが格納されているケースが多い
                 # subheadingの次のdivもしくは同列の内容を取得する
                 # 基本的には次のsiblingや同じセル内の次のテキストノードをたどる
@@ -51,9 +121,7 @@ class SyllabusParser:
 
         # 科目ナンバリング:
         # テキスト中で「(科目ナンバリング)」の直後の行にある。
-        numbering_td = self.soup.find(
-            "span", class_="lesson_plan_subheading", string=lambda x: x and "(科目ナンバリング)" in x
-        )
+        numbering_td = self._find_subheading_span("(科目ナンバリング)")
         if numbering_td:
             # numbering_tdの親要素tableから、対応する次のtdを取得
             numbering_parent = numbering_td.find_parent("table")
@@ -68,7 +136,7 @@ class SyllabusParser:
                         break
 
         # 英訳: 「(英 訳)」の行を探す
-        eng_td = self.soup.find("span", class_="lesson_plan_subheading", string=lambda x: x and "(英 訳)" in x)
+        eng_td = self._find_subheading_span("(英 訳)")
         if eng_td:
             eng_parent = eng_td.find_parent("table")
             if isinstance(eng_parent, Tag):
@@ -85,7 +153,7 @@ class SyllabusParser:
 
         # 所属部局, 職名, 氏名:
         # 「(所属部局)」「(職 名)」「(氏 名)」はtable内の行を見る
-        teacher_info_table = self.soup.find("td", class_="lesson_plan_sell", string=lambda x: x and "(所属部局)" in x)
+        teacher_info_table = self._find_sell_td("(所属部局)")
         if teacher_info_table:
             # 対象のtdは"所属部局"のテキストを含むノードとは限らないため親方向を再探索
             teacher_info_table = teacher_info_table.find_parent("table")
@@ -93,7 +161,7 @@ class SyllabusParser:
             # 直接発見できない場合はサブヘッダではなく連続的な行を探す
             # 所属部局, 職名, 氏名の行は "(科目名)" などがあるテーブルの隣のtd内にある。
             # もうひとつ方法としては、"(所属部局)"のdivを探す
-            subheading = self.soup.find("span", class_="lesson_plan_subheading", string="(所属部局)")
+            subheading = self._find_subheading_span("(所属部局)", exact=True)
             if subheading:
                 teacher_info_table = subheading.find_parent("table")
 
@@ -119,7 +187,7 @@ class SyllabusParser:
         # 配当学年, 単位数, 開講年度・開講期:
         # (配当学年), (単位数), (開講年度・開講期)は同じ行または隣接行にある
         # "(配当学年)"が記載されている行を探す
-        year_td = self.soup.find("span", class_="lesson_plan_subheading", string=lambda x: x and "(配当学年)" in x)
+        year_td = self._find_subheading_span("(配当学年)")
         if year_td:
             parent_table = year_td.find_parent("table")
             if isinstance(parent_table, Tag):
@@ -143,7 +211,7 @@ class SyllabusParser:
 
         # 曜時限, 授業形態:
         # "(曜時限)" と "(授業形態)" のあるテーブルを探す
-        day_time_td = self.soup.find("span", class_="lesson_plan_subheading", string=lambda x: x and "(曜時限)" in x)
+        day_time_td = self._find_subheading_span("(曜時限)")
         if day_time_td:
             parent_table = day_time_td.find_parent("table")
             if isinstance(parent_table, Tag):
@@ -160,7 +228,7 @@ class SyllabusParser:
                         result["授業形態"] = texts[idx + 1]
 
         # 使用言語
-        lang_td = self.soup.find("span", class_="lesson_plan_subheading", string=lambda x: x and "(使用言語)" in x)
+        lang_td = self._find_subheading_span("(使用言語)")
         if lang_td:
             parent_table = lang_td.find_parent("table")
             if isinstance(parent_table, Tag):
@@ -189,7 +257,7 @@ class SyllabusParser:
 
         # 教科書
         # (教科書) はdiv.lesson_plan_subheadingもしくはspan.lesson_plan_subheadingで探す
-        textbook_sub = self.soup.find("span", class_="lesson_plan_subheading", string=lambda x: x and "(教科書)" in x)
+        textbook_sub = self._find_subheading_span("(教科書)")
         if textbook_sub:
             parent_td = textbook_sub.find_parent("td", class_="lesson_plan_sell")
             if parent_td:
@@ -199,7 +267,7 @@ class SyllabusParser:
                 ).strip()
 
         # 参考書等
-        ref_sub = self.soup.find("span", class_="lesson_plan_subheading", string=lambda x: x and "(参考書等)" in x)
+        ref_sub = self._find_subheading_span("(参考書等)")
         if ref_sub:
             parent_td = ref_sub.find_parent("td", class_="lesson_plan_sell")
             if parent_td:
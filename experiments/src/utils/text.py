@@ -0,0 +1,23 @@
+# src/utils/text.py
+
+import re
+import unicodedata
+
+
+def normalize_query(text: str) -> str:
+    """
+    クエリをキャッシュのキーとして使うために正規化する関数。
+    NFKC正規化(全角英数字・全角空白の半角化など)、英字の小文字化、連続する空白の除去を行う。
+
+    Parameters
+    ----------
+    text : str
+        正規化前のクエリ
+
+    Returns
+    -------
+    str
+        正規化後のクエリ
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    return re.sub(r"\s+", " ", text).strip()
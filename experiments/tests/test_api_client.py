@@ -0,0 +1,15 @@
+# tests/test_api_client.py
+
+from src.utils.api_client import ApiMetrics
+
+
+def test_metrics_keep_only_recent_latencies() -> None:
+    metrics = ApiMetrics(latency_window=3)
+    for latency in [1000.0, 1000.0, 10.0, 20.0, 30.0]:
+        metrics.requests["embeddings"] += 1
+        metrics.latencies["embeddings"].append(latency)
+
+    stats = metrics.stats()["embeddings"]
+    assert len(metrics.latencies["embeddings"]) == 3
+    assert stats["requests"] == 5
+    assert stats["latency_ms_p50"] == 20.0
@@ -0,0 +1,47 @@
+# tests/test_cascade.py
+
+from typing import Dict, List
+
+import pytest
+from src.reranking import CascadeBudget
+
+
+def make_results(distances: List[float]) -> List[Dict]:
+    return [{"distance": distance, "metadata": {"lecture_no": str(i)}} for i, distance in enumerate(distances)]
+
+
+def test_without_limits_all_candidates_are_reranked() -> None:
+    assert CascadeBudget().select(make_results([0.1, 0.2, 0.3])) == 3
+    assert CascadeBudget(min_candidates=3).select([]) == 0
+
+
+def test_max_and_min_candidates_bound_the_count() -> None:
+    results = make_results([0.1 * i for i in range(10)])
+    assert CascadeBudget(max_candidates=4).select(results) == 4
+    assert CascadeBudget(min_candidates=12).select(results) == 10
+
+
+def test_margin_keeps_candidates_close_to_the_top() -> None:
+    # 標準偏差は約2.5なので、margin=0.5では最上位から約1.2以内の3件が対象になる
+    results = make_results([1.0, 1.1, 1.5, 6.0, 6.5])
+    assert CascadeBudget(margin=0.5).select(results) == 3
+    assert CascadeBudget(margin=0.5, min_candidates=4).select(results) == 4
+    assert CascadeBudget(margin=0.5, max_candidates=2).select(results) == 2
+
+
+def test_latency_budget_uses_moving_average_cost() -> None:
+    budget = CascadeBudget(latency_budget_ms=20.0, ema_alpha=0.5)
+    results = make_results([0.1 * i for i in range(10)])
+    # 実測値がないうちは制限しない
+    assert budget.select(results) == 10
+
+    budget.update(n_reranked=10, elapsed_ms=50.0)
+    assert budget.ms_per_candidate == pytest.approx(5.0)
+    assert budget.select(results) == 4
+
+    budget.update(n_reranked=4, elapsed_ms=4.0)
+    assert budget.ms_per_candidate == pytest.approx(3.0)
+    assert budget.select(results) == 6
+
+    budget.update(n_reranked=0, elapsed_ms=0.0)
+    assert budget.ms_per_candidate == pytest.approx(3.0)
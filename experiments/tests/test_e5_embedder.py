@@ -0,0 +1,79 @@
+# tests/test_e5_embedder.py
+
+from typing import Dict, List, Optional
+
+import numpy as np
+import pytest
+from src.embedding import E5Embedder, EmbeddingCache, backend_model_name
+
+
+class CharTokenizer:
+    """
+    1文字を1トークンとし、文字コードをトークンIDとするトークナイザ。
+    """
+
+    def __call__(
+        self,
+        texts: List[str],
+        max_length: int = 512,
+        padding: bool = False,
+        truncation: bool = True,
+        return_tensors: Optional[str] = None,
+    ) -> Dict:
+        input_ids = [[ord(char) for char in text][:max_length] for text in texts]
+        encodings = {"input_ids": input_ids, "attention_mask": [[1] * len(ids) for ids in input_ids]}
+        return self.pad(encodings) if padding else encodings
+
+    def pad(self, encodings: Dict, padding: bool = True, return_tensors: Optional[str] = None) -> Dict:
+        width = max(len(ids) for ids in encodings["input_ids"])
+        return {key: np.array([row + [0] * (width - len(row)) for row in rows]) for key, rows in encodings.items()}
+
+
+def make_embedder(max_tokens_per_batch: Optional[int]) -> E5Embedder:
+    # モデルは読み込まず、トークナイザとforwardのみを差し替える
+    embedder = E5Embedder.__new__(E5Embedder)
+    embedder.tokenizer = CharTokenizer()
+    embedder.hidden_size = 2
+    embedder.batch_size = 4
+    embedder.max_tokens_per_batch = max_tokens_per_batch
+    embedder.onnx_encoder = None
+    return embedder
+
+
+def test_token_budget_batches_restore_input_order(monkeypatch: pytest.MonkeyPatch) -> None:
+    texts = ["a" * 3, "b" * 12, "c", "d" * 7, "e" * 12, "f" * 2, "g" * 5, "h" * 9, "i" * 4]
+    padded_sizes: List[int] = []
+
+    def forward(batch_dict: Dict) -> np.ndarray:
+        # 先頭のトークンIDと実際のトークン数を埋め込みとする
+        padded_sizes.append(batch_dict["input_ids"].size)
+        return np.stack([batch_dict["input_ids"][:, 0], batch_dict["attention_mask"].sum(axis=1)], axis=1)
+
+    embedder = make_embedder(max_tokens_per_batch=24)
+    monkeypatch.setattr(embedder, "_forward", forward)
+    embeddings = embedder._embed(texts)
+
+    # 長さ順に並べ替えてバッチを作っても、出力は入力と同じ順に並ぶ
+    expected = np.array([[ord(text[0]), len(text)] for text in texts], dtype=np.float32)
+    np.testing.assert_array_equal(embeddings, expected)
+    assert max(padded_sizes) <= 24
+
+    # 固定件数のバッチと同じ結果になる
+    baseline = make_embedder(max_tokens_per_batch=None)
+    monkeypatch.setattr(baseline, "_forward", forward)
+    np.testing.assert_array_equal(baseline._embed(texts), embeddings)
+
+
+def test_token_budget_batches_keep_long_texts_alone() -> None:
+    lengths = np.array([4, 40, 8, 4, 30])
+    batches = E5Embedder._token_budget_batches(lengths, max_tokens=16)
+    assert sorted(np.concatenate(batches).tolist()) == list(range(len(lengths)))
+    for batch in batches:
+        assert len(batch) == 1 or lengths[batch].max() * len(batch) <= 16
+
+
+def test_backends_use_separate_cache_keys() -> None:
+    model = "intfloat/multilingual-e5-small"
+    names = [backend_model_name(model), backend_model_name(model, "onnx"), backend_model_name(model, "onnx", True)]
+    assert names == [model, f"{model}@onnx", f"{model}@onnx-int8"]
+    assert len({EmbeddingCache.make_key(name, "passage: ", "テキスト") for name in names}) == 3
@@ -0,0 +1,48 @@
+# tests/test_io.py
+
+import shutil
+import tarfile
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from src.utils import iter_htmls_under_dir
+
+
+def write_tree(root: Path) -> None:
+    for dir_name, lecture_no in [("b", "300"), ("a/x", "201"), ("a/x", "203"), ("a/x", "202"), ("c", "101")]:
+        path = root / "raw" / dir_name / f"{lecture_no}.html"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"<p>{lecture_no}</p>", encoding="utf-8")
+    (root / "raw" / "notes.txt").write_text("not a syllabus", encoding="utf-8")
+
+
+def lecture_nos(records: List[Dict]) -> List[str]:
+    return [record["lecture_no"] for record in records]
+
+
+def test_archives_are_read_in_directory_order(tmp_path: Path) -> None:
+    write_tree(tmp_path)
+    expected = list(iter_htmls_under_dir(str(tmp_path / "raw")))
+    assert lecture_nos(expected) == ["201", "202", "203", "300", "101"]
+
+    zip_path = shutil.make_archive(str(tmp_path / "raw"), "zip", tmp_path, "raw")
+    tar_path = str(tmp_path / "raw.tar")
+    with tarfile.open(tar_path, "w") as tf:
+        # アーカイブ内のメンバーの順はパスの順と異なる
+        for lecture_no, dir_name in [("300", "b"), ("201", "a/x"), ("203", "a/x"), ("101", "c"), ("202", "a/x")]:
+            tf.add(tmp_path / "raw" / dir_name / f"{lecture_no}.html", f"raw/{dir_name}/{lecture_no}.html")
+
+    for archive_path in [zip_path, tar_path]:
+        assert list(iter_htmls_under_dir(archive_path)) == expected
+        assert list(iter_htmls_under_dir(archive_path, prefetch_workers=2)) == expected
+        assert Path(archive_path + ".index.json").exists()
+
+
+def test_compressed_tar_is_rejected(tmp_path: Path) -> None:
+    write_tree(tmp_path)
+    tgz_path = str(tmp_path / "raw.tgz")
+    with tarfile.open(tgz_path, "w:gz") as tf:
+        tf.add(tmp_path / "raw", "raw")
+    with pytest.raises(ValueError):
+        list(iter_htmls_under_dir(tgz_path))
@@ -0,0 +1,66 @@
+# tests/test_parallel_embedder.py
+
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pytest
+from src.embedding import EmbeddingCache, ParallelEmbedder
+from src.embedding.base import BaseEmbedder
+
+
+class PrefixEmbedder(BaseEmbedder):
+    """
+    接頭辞を付けたテキストの長さと文字コードの和を埋め込みとする埋め込みモデル。
+    """
+
+    model_name = "prefix"
+    passage_prefix = "passage: "
+    query_prefix = "query: "
+
+    def __init__(self, cache: Optional[EmbeddingCache] = None) -> None:
+        self.cache = cache
+
+    def embed_passage(self, texts: List[str]) -> np.ndarray:
+        return self._embed_with_cache(
+            texts, self.passage_prefix, lambda batch: self.encode(batch, self.passage_prefix)
+        )
+
+    def embed_query(self, texts: List[str]) -> np.ndarray:
+        return self._embed_with_cache(texts, self.query_prefix, lambda batch: self.encode(batch, self.query_prefix))
+
+    @staticmethod
+    def encode(texts: List[str], prefix: str) -> np.ndarray:
+        return np.array([[len(prefix + text), sum(map(ord, prefix + text))] for text in texts], dtype=np.float32)
+
+
+def test_workers_embed_in_input_order_without_cache() -> None:
+    texts = [f"テキスト{i}" * (i % 4 + 1) for i in range(11)]
+    embedder = ParallelEmbedder(PrefixEmbedder, num_workers=2, num_threads=1)
+    try:
+        np.testing.assert_array_equal(embedder.embed_passage(texts), PrefixEmbedder.encode(texts, "passage: "))
+    finally:
+        embedder.close()
+
+
+def test_cache_is_read_and_written_in_the_parent(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite"))
+    serial = PrefixEmbedder(cache)
+    serial.embed_passage(["a", "b"])
+
+    embedder = ParallelEmbedder(
+        PrefixEmbedder, num_workers=2, model_name="prefix", cache=cache, passage_prefix="passage: "
+    )
+    dispatched: List[List[str]] = []
+
+    def embed(texts: List[str], is_query: bool) -> np.ndarray:
+        dispatched.append(texts)
+        return PrefixEmbedder.encode(texts, "passage: ")
+
+    monkeypatch.setattr(embedder, "_embed", embed)
+    vectors = embedder.embed_passage(["a", "c", "b", "c"])
+
+    # 単一プロセスで保存したキャッシュを共有し、ワーカーにはキャッシュにないテキストのみを渡す
+    assert dispatched == [["c"]]
+    np.testing.assert_array_equal(vectors, PrefixEmbedder.encode(["a", "c", "b", "c"], "passage: "))
+    assert len(cache.get_many([EmbeddingCache.make_key("prefix", "passage: ", "c")])) == 1
@@ -0,0 +1,87 @@
+# tests/test_parsed_store.py
+
+import pickle
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.constants import ID_TO_LECTURE
+from src.preprocessing import SelectedPreprocessor
+from src.utils import ParsedSyllabusStore, SyllabusParser
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "syllabus"
+
+
+class CountingParser:
+    """
+    呼び出されたHTMLを記録しながらSyllabusParserでパースする関数。
+    """
+
+    def __init__(self) -> None:
+        self.calls: List[str] = []
+
+    def __call__(self, html_content: str) -> Dict[str, Optional[str]]:
+        self.calls.append(html_content)
+        return SyllabusParser(html_content).parse()
+
+
+def test_miss_parses_and_hit_returns_stored_result(tmp_path: Path) -> None:
+    html = (FIXTURE_DIR / "complete.html").read_text(encoding="utf-8")
+    store = ParsedSyllabusStore(str(tmp_path / "parsed.sqlite"))
+    parse = CountingParser()
+
+    first = store.get_or_parse("1001", html, parse)
+    second = store.get_or_parse("1001", html, parse)
+    assert first == second == SyllabusParser(html).parse()
+    assert len(parse.calls) == 1
+    assert store.stats() == {"hits": 1, "misses": 1}
+
+    # 別のインスタンス(前処理の別の実行)からも保存済みの結果を読み込める
+    reopened = ParsedSyllabusStore(str(tmp_path / "parsed.sqlite"))
+    assert reopened.get("1001", html) == first
+    assert reopened.get("1002", html) is None
+
+
+def test_changed_html_is_parsed_again(tmp_path: Path) -> None:
+    store = ParsedSyllabusStore(str(tmp_path / "parsed.sqlite"))
+    parse = CountingParser()
+    old_html = (FIXTURE_DIR / "complete.html").read_text(encoding="utf-8")
+    new_html = (FIXTURE_DIR / "missing_plan.html").read_text(encoding="utf-8")
+
+    store.get_or_parse("1001", old_html, parse)
+    # HTMLが更新された科目は、古いパース結果を返さずにパースし直す
+    parsed = store.get_or_parse("1001", new_html, parse)
+    assert parse.calls == [old_html, new_html]
+    assert parsed == SyllabusParser(new_html).parse()
+    assert parsed["授業計画と内容"] is None
+
+
+def test_parsers_are_stored_separately(tmp_path: Path) -> None:
+    html = (FIXTURE_DIR / "complete.html").read_text(encoding="utf-8")
+    path = str(tmp_path / "parsed.sqlite")
+    ParsedSyllabusStore(path, "html.parser").put("1001", html, {"授業の概要・目的": "html.parser"})
+
+    assert ParsedSyllabusStore(path, "lxml").get("1001", html) is None
+    assert ParsedSyllabusStore(path, "html.parser").get("1001", html) == {"授業の概要・目的": "html.parser"}
+
+
+def test_store_survives_pickling(tmp_path: Path) -> None:
+    html = (FIXTURE_DIR / "complete.html").read_text(encoding="utf-8")
+    store = ParsedSyllabusStore(str(tmp_path / "parsed.sqlite"))
+    store.put("1001", html, {"授業の概要・目的": "概要"})
+    # プロセスプールに渡すときは接続を持たずに複製され、複製先で接続し直す
+    restored = pickle.loads(pickle.dumps(store))
+    assert restored._conn is None
+    assert restored.get("1001", html) == {"授業の概要・目的": "概要"}
+
+
+def test_preprocessor_output_is_unchanged_by_store(tmp_path: Path) -> None:
+    html = (FIXTURE_DIR / "complete.html").read_text(encoding="utf-8")
+    lecture_no = next(iter(ID_TO_LECTURE))
+    records = [{"html_content": html, "lecture_no": lecture_no}]
+    expected = SelectedPreprocessor().run(records)
+
+    path = str(tmp_path / "parsed.sqlite")
+    assert SelectedPreprocessor(parsed_store_path=path).run(records) == expected
+    cached = SelectedPreprocessor(parsed_store_path=path)
+    assert cached.run(records) == expected
+    assert cached.parsed_store is not None and cached.parsed_store.stats() == {"hits": 1, "misses": 0}
@@ -0,0 +1,109 @@
+# tests/test_pipeline.py
+
+import copy
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pytest
+import src.pipeline as pipeline
+from src.constants import ID_TO_LECTURE
+from src.utils import save_json
+
+LECTURE_NOS = list(ID_TO_LECTURE.keys())[:6]
+
+
+def make_html(overview: str) -> str:
+    return (
+        "<html><body><table><tr><td class='lesson_plan_sell'><div>"
+        f"<div class='lesson_plan_subheading'>(授業の概要・目的)</div>{overview}</div></td></tr></table></body></html>"
+    )
+
+
+def fake_embed(texts: List[str]) -> np.ndarray:
+    return np.array([[len(text), sum(map(ord, text)) % 97, 1.0, 2.0] for text in texts], dtype=np.float32)
+
+
+def fake_embed_to_vectors_file(config: Dict, texts: List[str]) -> np.ndarray:
+    vectors = fake_embed(texts)
+    pipeline.save_vectors(config, vectors)
+    return vectors
+
+
+@pytest.fixture
+def config(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Dict:
+    monkeypatch.setattr(pipeline, "embed_passages", lambda config, texts: fake_embed(texts))
+    monkeypatch.setattr(pipeline, "embed_passages_to_vectors_file", fake_embed_to_vectors_file)
+    return {
+        "data": {"input_dir": str(tmp_path / "raw")},
+        "summary": {"summary_dir": str(tmp_path / "summary"), "summary_name": "summary_data.json"},
+        "index": {
+            "index_dir": str(tmp_path / "index"),
+            "embedding_name": "faiss_index.bin",
+            "processed_data_name": "processed_data.json",
+            "vectors_name": "vectors.npy",
+            "type": "flat",
+            "incremental": True,
+            "hashes_name": "lecture_hashes.json",
+        },
+        "preprocessing": {"method": "simple_selected", "chunk_size": 16, "normalization": True},
+    }
+
+
+def write_page(config: Dict, lecture_no: str, overview: str) -> None:
+    path = Path(config["data"]["input_dir"]) / f"{lecture_no}.html"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(make_html(overview), encoding="utf-8")
+
+
+def test_summaries_follow_lectures_after_incremental_update(config: Dict) -> None:
+    summaries = {lecture_no: f"summary of {lecture_no}" for lecture_no in LECTURE_NOS}
+    os.makedirs(config["summary"]["summary_dir"])
+    save_json(summaries, os.path.join(config["summary"]["summary_dir"], config["summary"]["summary_name"]))
+    for i, lecture_no in enumerate(LECTURE_NOS[:5]):
+        write_page(config, lecture_no, f"概要{i}" * (i + 3))
+    pipeline.pipeline_indexing(config)
+
+    # 1科目を変更、1科目を削除、1科目を追加して差分更新する
+    write_page(config, LECTURE_NOS[1], "変更後の概要" * 5)
+    os.remove(Path(config["data"]["input_dir"]) / f"{LECTURE_NOS[2]}.html")
+    write_page(config, LECTURE_NOS[5], "追加した科目の概要" * 4)
+    index, processed_data, summary_data = pipeline.pipeline_indexing(config)
+
+    # 差分更新の結果は、同じ入力から作り直した場合と一致する
+    fresh_config = copy.deepcopy(config)
+    fresh_config["index"]["index_dir"] += "_fresh"
+    _, fresh_processed_data, _ = pipeline.pipeline_indexing(fresh_config)
+    assert index.ntotal == len(fresh_processed_data)
+    assert sorted(map(str, processed_data)) == sorted(map(str, fresh_processed_data))
+
+    # 要約は位置ではなく科目番号で対応づけられる
+    id_to_metadata = pipeline.build_id_to_metadata(processed_data, summary_data)
+    lecture_nos = {metadata["lecture_no"] for metadata in id_to_metadata.values()}
+    assert lecture_nos == set(LECTURE_NOS) - {LECTURE_NOS[2]}
+    for metadata in id_to_metadata.values():
+        assert metadata["summary"] == summaries[metadata["lecture_no"]]
+
+
+def test_list_summary_data_is_not_matched_by_position(tmp_path: Path) -> None:
+    path = str(tmp_path / "summary_data.json")
+    save_json(["positional summary"], path)
+    assert pipeline.load_summary_data(path) == {}
+    assert pipeline.build_id_to_metadata([{"metadata": {"lecture_no": "1"}}], {})[0]["summary"] == ""
+
+
+@pytest.mark.parametrize("quantization", ["none", "int8"])
+def test_missing_vectors_are_restored_exactly(config: Dict, quantization: str) -> None:
+    config["index"].update({"incremental": False, "quantization": quantization})
+    for i, lecture_no in enumerate(LECTURE_NOS):
+        write_page(config, lecture_no, f"概要{i}" * (i + 3))
+    _, processed_data, _ = pipeline.pipeline_indexing(config)
+
+    # ベクトル行列を保存していなかった頃のインデックスを読み込む
+    os.remove(pipeline.get_vectors_path(config))
+    pipeline.pipeline_indexing(config)
+
+    # 量子化したインデックスからは復元せずに埋め込み直すため、保存されるベクトルは元の埋め込みと一致する
+    vectors = np.load(pipeline.get_vectors_path(config))
+    assert np.array_equal(vectors, fake_embed([entry["text_chunk"] for entry in processed_data]))
@@ -0,0 +1,34 @@
+# tests/test_preprocessing.py
+
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+from src.constants import ID_TO_LECTURE
+from src.preprocessing import BasePreprocessor, SelectedPreprocessor, SimplePreprocessor
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "syllabus"
+
+
+def make_records(n_records: int = 10) -> List[Dict]:
+    """
+    フィクスチャのHTMLを実在する科目番号に割り当てたレコードを作成する。
+    """
+    htmls = [path.read_text(encoding="utf-8") for path in sorted(FIXTURE_DIR.glob("*.html"))]
+    lecture_nos = list(ID_TO_LECTURE)[:n_records]
+    return [
+        {"html_content": htmls[i % len(htmls)], "lecture_no": lecture_no} for i, lecture_no in enumerate(lecture_nos)
+    ]
+
+
+@pytest.mark.parametrize("preprocessor_class", [SimplePreprocessor, SelectedPreprocessor])
+def test_parallel_output_matches_serial(preprocessor_class: type) -> None:
+    records = make_records()
+    serial: BasePreprocessor = preprocessor_class(chunk_size=128)
+    parallel: BasePreprocessor = preprocessor_class(chunk_size=128, num_workers=2)
+    # 複数のタスクに分かれ、順序の入れ替わりが起こりうるようにする
+    parallel.records_per_task = 3
+
+    expected = serial.run(records)
+    assert len(expected) >= len(records)
+    assert parallel.run(iter(records)) == expected
@@ -0,0 +1,40 @@
+# tests/test_query_cache.py
+
+from typing import List
+
+import numpy as np
+from src.embedding import QueryCachingEmbedder
+from src.embedding.base import BaseEmbedder
+
+
+class RecordingEmbedder(BaseEmbedder):
+    model_name = "recording"
+
+    def __init__(self) -> None:
+        self.calls: List[List[str]] = []
+
+    def embed_passage(self, texts: List[str]) -> np.ndarray:
+        return self.embed_query(texts)
+
+    def embed_query(self, texts: List[str]) -> np.ndarray:
+        self.calls.append(list(texts))
+        return np.array([[len(text), sum(map(ord, text)) % 31] for text in texts], dtype=np.float32)
+
+
+def test_original_text_is_embedded_and_normalized_text_is_the_key() -> None:
+    embedder = RecordingEmbedder()
+    cached = QueryCachingEmbedder(embedder, max_size=8)
+    vectors = cached.embed_query(["Ｈｅｌｌｏ  World", "hello world"])
+
+    # キャッシュの有無で埋め込みが変わらない
+    assert embedder.calls == [["Ｈｅｌｌｏ  World"]]
+    np.testing.assert_array_equal(vectors[0], RecordingEmbedder().embed_query(["Ｈｅｌｌｏ  World"])[0])
+    np.testing.assert_array_equal(vectors[0], vectors[1])
+
+
+def test_hits_and_misses_are_counted_per_query() -> None:
+    cached = QueryCachingEmbedder(RecordingEmbedder(), max_size=8)
+    cached.embed_query(["a", "a", "b"])
+    assert cached.stats() == {"hits": 0, "spill_hits": 0, "misses": 3, "size": 2}
+    cached.embed_query(["a", "b", "b", "c"])
+    assert cached.stats() == {"hits": 3, "spill_hits": 0, "misses": 4, "size": 3}
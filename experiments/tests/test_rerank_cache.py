@@ -0,0 +1,40 @@
+# tests/test_rerank_cache.py
+
+from typing import Dict, List
+
+import pytest
+from src.reranking import BaseReranker, CachedReranker, ScoreCache
+
+
+class ShortReranker(BaseReranker):
+    """
+    要求された件数より1件少ないスコアを返すリランキングクラス。
+    """
+
+    model_name = "short"
+
+    def score(self, query: str, results: List[Dict]) -> List[float]:
+        return [float(i) for i in range(len(results) - 1)]
+
+
+class IndexReranker(BaseReranker):
+    model_name = "index"
+
+    def score(self, query: str, results: List[Dict]) -> List[float]:
+        return [float(result["metadata"]["lecture_no"]) for result in results]
+
+
+def make_results(lecture_nos: List[str]) -> List[Dict]:
+    return [{"metadata": {"lecture_no": lecture_no}, "distance": 0.0} for lecture_no in lecture_nos]
+
+
+def test_score_count_mismatch_raises() -> None:
+    reranker = CachedReranker(ShortReranker(), ScoreCache(max_size=16))
+    with pytest.raises(ValueError):
+        reranker.score_batch(["query"], [make_results(["1", "2", "3"])])
+
+
+def test_cached_scores_stay_at_their_index() -> None:
+    reranker = CachedReranker(IndexReranker(), ScoreCache(max_size=16))
+    reranker.score_batch(["query"], [make_results(["2"])])
+    assert reranker.score_batch(["query"], [make_results(["1", "2", "3"])]) == [[1.0, 2.0, 3.0]]
@@ -0,0 +1,66 @@
+# tests/test_rerank_documents.py
+
+from typing import Dict, List
+
+from src.reranking import BgeReranker, GeminiReranker, RerankDocumentBuilder
+
+RESULTS: List[Dict] = [
+    {
+        "distance": 0.1,
+        "metadata": {
+            "lecture_no": "1001",
+            "lecture_name": "法学入門",
+            "department": "法学部",
+            "授業形態": "講義",
+            "曜時限": "月1",
+            "summary": "法の基礎を学ぶ。",
+        },
+    },
+    {
+        "distance": 0.2,
+        "metadata": {
+            "lecture_no": "1002",
+            "lecture_name": "民法演習",
+            "department": "法学部",
+            "summary": "",
+            "教科書": None,
+        },
+    },
+]
+
+
+def baseline_documents(results: List[Dict]) -> List[str]:
+    """
+    RerankDocumentBuilder導入前のBgeReranker.build_documentsと同じ文書を返す。
+    """
+    documents = []
+    for idx, result in enumerate(results, 1):
+        lecture_name = result["metadata"]["lecture_name"]
+        metadata = result["metadata"]
+        description = ", ".join([f"{key}: {value}" for key, value in metadata.items() if key != "lecture_no"])
+        documents.append(f"{idx}. 講義名: {lecture_name}\n   説明: {description}\n\n")
+    return documents
+
+
+def test_default_documents_match_baseline_without_rank_prefix() -> None:
+    # モデルは読み込まず、文書の作成のみを確認する
+    reranker = BgeReranker.__new__(BgeReranker)
+    expected = [document[len(f"{idx}. ") :] for idx, document in enumerate(baseline_documents(RESULTS), 1)]
+    assert reranker.build_documents(RESULTS) == expected
+    assert [RerankDocumentBuilder().build(result["metadata"]) for result in RESULTS] == expected
+
+
+def test_default_gemini_prompt_matches_baseline() -> None:
+    reranker = GeminiReranker.__new__(GeminiReranker)
+    query = "法律の歴史"
+    expected = "".join(baseline_documents(RESULTS)) + (
+        f"上記の講義について、ユーザーのクエリ '{query}' に対する関連度スコアを1から10で評価してください。\n"
+        "関連度スコア(1~10)を以下のJSON形式(Dict[str, List[int]])で返してください。\n{'scores': [score, ...]}"
+    )
+    assert reranker.build_prompt(query, RESULTS) == expected
+
+
+def test_fields_and_max_chars_limit_the_document() -> None:
+    builder = RerankDocumentBuilder(fields=["summary", "department", "シラバスにない項目"], max_chars=30)
+    document = builder.build(RESULTS[0]["metadata"])
+    assert document == "講義名: 法学入門\n   説明: summary: 法の基礎\n\n"
@@ -0,0 +1,219 @@
+# tests/test_search.py
+
+from typing import Dict, List, Optional, Tuple, Union
+
+import faiss
+import numpy as np
+import pytest
+from src.search import BaseSearcher, MetadataStore, SimpleSearcher
+
+DEPARTMENTS = ["法学部", "文学部", "工学部"]
+TIMETABLE = ["月1", "火2", "水3,木4", "金5", "集中講義", "その他"]
+
+
+def make_corpus(n_lectures: int = 60, dimension: int = 8, seed: int = 0) -> Tuple[np.ndarray, Dict[int, Dict]]:
+    """
+    1科目あたり1~4チャンクの合成コーパスを作る。チャンクIDの順に科目がまとまって並ぶ。
+    """
+    rng = np.random.default_rng(seed)
+    id_to_metadata: Dict[int, Dict] = {}
+    for lecture in range(n_lectures):
+        metadata = {
+            "lecture_no": str(1000 + lecture),
+            "department": DEPARTMENTS[lecture % len(DEPARTMENTS)],
+            "授業形態": ["講義", "演習"][lecture % 2],
+        }
+        if lecture % 7:
+            metadata["曜時限"] = TIMETABLE[lecture % len(TIMETABLE)]
+        for _ in range(int(rng.integers(1, 5))):
+            id_to_metadata[len(id_to_metadata)] = dict(metadata)
+    vectors = rng.standard_normal((len(id_to_metadata), dimension)).astype(np.float32)
+    return vectors, id_to_metadata
+
+
+def reference_metadata_filter(id_to_metadata: Dict[int, Dict], filters: Optional[Dict]) -> List[int]:
+    """
+    MetadataStore導入前のSimpleSearcher.apply_metadata_filterと同じ判定で、条件に合致するIDを返す。
+    """
+    if not filters:
+        return list(id_to_metadata.keys())
+    filtered_ids = []
+    for id_, metadata in id_to_metadata.items():
+        match = True
+        for key, value in filters.items():
+            if key == "曜時限":
+                for cond_weekday in value:
+                    if cond_weekday in metadata.get("曜時限", value):
+                        break
+                else:
+                    match = False
+                    break
+                break
+            elif (key not in metadata) or (metadata[key] != value):
+                match = False
+                break
+        if match:
+            filtered_ids.append(id_)
+    return filtered_ids
+
+
+def make_flat_searcher(vectors: np.ndarray, id_to_metadata: Dict[int, Dict]) -> SimpleSearcher:
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return SimpleSearcher(index, id_to_metadata)
+
+
+class RecordingSearcher(BaseSearcher):
+    def __init__(self) -> None:
+        self.search_params_list: List[Optional[Dict]] = []
+
+    def search(
+        self,
+        query_vector: Union[List[float], np.ndarray],
+        metadata_filter: Optional[Dict] = None,
+        top_k: int = 10,
+        search_params: Optional[Dict] = None,
+    ) -> List[Dict]:
+        self.search_params_list.append(search_params)
+        return []
+
+
+def test_default_search_batch_passes_search_params() -> None:
+    searcher = RecordingSearcher()
+    searcher.search_batch(np.zeros((2, 4), dtype=np.float32), search_params={"nprobe": 32})
+    assert searcher.search_params_list == [{"nprobe": 32}, {"nprobe": 32}]
+
+
+def test_search_returns_nearest_chunk_per_lecture() -> None:
+    vectors, id_to_metadata = make_corpus()
+    searcher = make_flat_searcher(vectors, id_to_metadata)
+    query = np.random.default_rng(1).standard_normal((1, vectors.shape[1])).astype(np.float32)[0]
+
+    # 科目ごとに最も近いチャンクの距離を総当たりで求め、近い順に並べたものと一致する
+    distances = np.sum((vectors - query) ** 2, axis=1)
+    nearest: Dict[str, float] = {}
+    for idx, distance in enumerate(distances):
+        lecture_no = id_to_metadata[idx]["lecture_no"]
+        nearest[lecture_no] = min(nearest.get(lecture_no, np.inf), float(distance))
+    expected = sorted(nearest.items(), key=lambda item: item[1])[:10]
+
+    results = searcher.search(query, top_k=10)
+    assert [result["metadata"]["lecture_no"] for result in results] == [lecture_no for lecture_no, _ in expected]
+    assert np.allclose([result["distance"] for result in results], [distance for _, distance in expected], rtol=1e-4)
+
+
+def brute_force_search(
+    vectors: np.ndarray, id_to_metadata: Dict[int, Dict], query: np.ndarray, ids: List[int], top_k: int
+) -> List[str]:
+    """
+    指定したチャンクのみを総当たりで探索し、科目ごとに最も近いチャンクで並べた科目番号を返す。
+    """
+    nearest: Dict[str, float] = {}
+    for idx in ids:
+        lecture_no = id_to_metadata[idx]["lecture_no"]
+        nearest[lecture_no] = min(nearest.get(lecture_no, np.inf), float(np.sum((vectors[idx] - query) ** 2)))
+    return [lecture_no for lecture_no, _ in sorted(nearest.items(), key=lambda item: item[1])[:top_k]]
+
+
+def make_ivf_index(vectors: np.ndarray, nlist: int) -> faiss.Index:
+    quantizer = faiss.IndexFlatL2(vectors.shape[1])
+    index = faiss.IndexIVFFlat(quantizer, vectors.shape[1], nlist)
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+@pytest.mark.parametrize("metadata_filter", [{"department": "法学部"}, {"授業形態": "演習", "曜時限": ["月1", "金5"]}])
+def test_filtered_search_matches_brute_force(metadata_filter: Dict) -> None:
+    vectors, id_to_metadata = make_corpus()
+    query = np.random.default_rng(2).standard_normal((1, vectors.shape[1])).astype(np.float32)[0]
+    ids = reference_metadata_filter(id_to_metadata, metadata_filter)
+    expected = brute_force_search(vectors, id_to_metadata, query, ids, top_k=5)
+
+    # ビットマップでIDを絞り込んでメインのインデックスを検索する(IVFは全クラスタを探索して正確な結果にする)
+    searchers = [
+        make_flat_searcher(vectors, id_to_metadata),
+        SimpleSearcher(make_ivf_index(vectors, nlist=4), id_to_metadata, search_params={"nprobe": 4}),
+    ]
+    for searcher in searchers:
+        results = searcher.search(query, metadata_filter=metadata_filter, top_k=5)
+        assert [result["metadata"]["lecture_no"] for result in results] == expected
+
+
+def test_lecture_chunk_ids_cover_each_lecture() -> None:
+    vectors, id_to_metadata = make_corpus()
+    searcher = make_flat_searcher(vectors, id_to_metadata)
+    for lecture_no in searcher.lecture_nos:
+        expected = [idx for idx, metadata in id_to_metadata.items() if metadata["lecture_no"] == lecture_no]
+        assert searcher.get_lecture_chunk_ids(lecture_no).tolist() == expected
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        None,
+        {},
+        {"department": "法学部"},
+        {"department": "医学部"},
+        {"授業形態": "演習", "department": "文学部"},
+        {"氏名": "山田"},
+        {"曜時限": ["月1"]},
+        {"曜時限": ["水3", "集中講義"]},
+        {"曜時限": ["その"]},
+        {"曜時限": []},
+        {"department": "工学部", "曜時限": ["金5", "木4"]},
+    ],
+)
+def test_metadata_store_matches_reference_filter(filters: Optional[Dict]) -> None:
+    # アプリと同様に、曜時限は条件の最後に指定する
+    _, id_to_metadata = make_corpus()
+    store = MetadataStore([id_to_metadata[idx] for idx in range(len(id_to_metadata))])
+    expected = reference_metadata_filter(id_to_metadata, filters)
+    assert np.flatnonzero(store.mask(filters)).tolist() == expected
+    assert store.filter(filters).tolist() == expected
+
+
+@pytest.mark.parametrize("metadata_filter", [None, {"department": "文学部"}, {"曜時限": ["集中講義"]}])
+def test_search_batch_matches_per_query_search(metadata_filter: Optional[Dict]) -> None:
+    vectors, id_to_metadata = make_corpus()
+    searcher = make_flat_searcher(vectors, id_to_metadata)
+    queries = np.random.default_rng(3).standard_normal((5, vectors.shape[1])).astype(np.float32)
+
+    batch_results = searcher.search_batch(queries, metadata_filter=metadata_filter, top_k=5)
+    assert batch_results == [searcher.search(query, metadata_filter=metadata_filter, top_k=5) for query in queries]
+    ids = reference_metadata_filter(id_to_metadata, metadata_filter)
+    for query, results in zip(queries, batch_results):
+        expected = brute_force_search(vectors, id_to_metadata, query, ids, top_k=5)
+        assert [result["metadata"]["lecture_no"] for result in results] == expected
+
+
+def test_rescore_orders_candidates_by_exact_distance() -> None:
+    vectors, id_to_metadata = make_corpus()
+    searcher = make_flat_searcher(vectors, id_to_metadata)
+    queries = np.random.default_rng(4).standard_normal((2, vectors.shape[1])).astype(np.float32)
+    candidates = np.array([[5, -1, 0, 9, 3], [7, 2, -1, -1, 8]], dtype=np.int64)
+
+    distances, indices = searcher._rescore(queries, candidates, k=4)
+    for query, row_candidates, row_distances, row_indices in zip(queries, candidates, distances, indices):
+        valid = row_candidates[row_candidates >= 0]
+        exact = np.sum((vectors[valid] - query) ** 2, axis=1)
+        order = np.argsort(exact, kind="stable")[:4]
+        n_valid = len(order)
+        assert row_indices[:n_valid].tolist() == valid[order].tolist()
+        assert np.allclose(row_distances[:n_valid], exact[order], rtol=1e-5)
+        # 候補が足りない分は-1で埋める
+        assert (row_indices[n_valid:] == -1).all()
+
+
+def test_quantized_index_with_rescore_returns_exact_distances() -> None:
+    vectors, id_to_metadata = make_corpus()
+    index = faiss.IndexScalarQuantizer(vectors.shape[1], faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    index.train(vectors)
+    index.add(vectors)
+    searcher = SimpleSearcher(index, id_to_metadata, vectors=vectors, rescore_factor=4)
+    query = np.random.default_rng(5).standard_normal((1, vectors.shape[1])).astype(np.float32)[0]
+
+    for result in searcher.search(query, top_k=5):
+        chunk_ids = searcher.get_lecture_chunk_ids(result["metadata"]["lecture_no"])
+        exact = np.sum((vectors[chunk_ids] - query) ** 2, axis=1)
+        assert np.isclose(result["distance"], exact.min(), rtol=1e-5)
@@ -0,0 +1,27 @@
+# tests/test_syllabus_parser.py
+
+from pathlib import Path
+
+import pytest
+from src.utils import SyllabusParser
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "syllabus"
+FIXTURES = sorted(FIXTURE_DIR.glob("*.html"))
+
+
+@pytest.mark.parametrize("path", FIXTURES, ids=[path.stem for path in FIXTURES])
+@pytest.mark.parametrize("features", ["html.parser", "lxml"])
+def test_single_pass_matches_default_mode(path: Path, features: str) -> None:
+    if features == "lxml":
+        pytest.importorskip("lxml")
+    html = path.read_text(encoding="utf-8")
+    expected = SyllabusParser(html, single_pass=False, features=features).parse()
+    assert SyllabusParser(html, single_pass=True, features=features).parse() == expected
+
+
+def test_fixture_fields_are_extracted() -> None:
+    data = SyllabusParser((FIXTURE_DIR / "complete.html").read_text(encoding="utf-8"), single_pass=True).parse()
+    assert all(value is not None for value in data.values())
+
+    data = SyllabusParser((FIXTURE_DIR / "missing_plan.html").read_text(encoding="utf-8"), single_pass=True).parse()
+    assert data["授業計画と内容"] is None
@@ -0,0 +1,75 @@
+# tests/test_writer.py
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pytest
+from src.embedding import CheckpointedEmbeddingWriter
+from src.embedding.base import BaseEmbedder
+from src.utils import load_json
+
+TEXTS = [f"テキスト{i}" * (i % 4 + 1) for i in range(25)]
+
+
+class CountingEmbedder(BaseEmbedder):
+    """
+    埋め込んだテキストを記録し、`fail_at` 回目の呼び出しで例外を送出する埋め込みモデル。
+    """
+
+    model_name = "counting"
+
+    def __init__(self, fail_at: Optional[int] = None) -> None:
+        self.fail_at = fail_at
+        self.embedded: List[str] = []
+
+    def embed_passage(self, texts: List[str]) -> np.ndarray:
+        if self.fail_at is not None and len(self.embedded) // 7 + 1 == self.fail_at:
+            raise RuntimeError("interrupted")
+        self.embedded.extend(texts)
+        return np.array([[len(text), sum(map(ord, text)) % 13, 1.0] for text in texts], dtype=np.float32)
+
+    def embed_query(self, texts: List[str]) -> np.ndarray:
+        return self.embed_passage(texts)
+
+
+def interrupt(writer: CheckpointedEmbeddingWriter, normalize: bool = False) -> None:
+    # 3回目の埋め込みで中断し、2回分(14件)のチェックポイントを残す
+    with pytest.raises(RuntimeError):
+        writer.run(CountingEmbedder(fail_at=3), TEXTS, normalize=normalize)
+    assert load_json(writer.checkpoint_path)["completed"] == 14
+
+
+def test_resume_embeds_only_remaining_rows(tmp_path: Path) -> None:
+    writer = CheckpointedEmbeddingWriter(str(tmp_path / "vectors.npy"), dtype="float16", checkpoint_every=7)
+    interrupt(writer)
+
+    embedder = CountingEmbedder()
+    vectors = writer.run(embedder, TEXTS)
+    assert embedder.embedded == TEXTS[14:]
+    expected = CountingEmbedder().embed_passage(TEXTS).astype(np.float16)
+    np.testing.assert_array_equal(vectors, expected)
+    assert not Path(writer.checkpoint_path).exists()
+
+
+@pytest.mark.parametrize(
+    "changed",
+    [
+        {"texts": TEXTS[::-1]},
+        {"normalize": True},
+        {"dtype": "float32"},
+    ],
+)
+def test_checkpoint_with_different_inputs_is_ignored(tmp_path: Path, changed: Dict) -> None:
+    path = str(tmp_path / "vectors.npy")
+    interrupt(CheckpointedEmbeddingWriter(path, dtype="float16", checkpoint_every=7))
+
+    # 入力テキスト・正規化の有無・dtypeのいずれかが異なる場合は最初から埋め込み直す
+    writer = CheckpointedEmbeddingWriter(path, dtype=changed.get("dtype", "float16"), checkpoint_every=7)
+    texts = changed.get("texts", TEXTS)
+    embedder = CountingEmbedder()
+    vectors = writer.run(embedder, texts, normalize=changed.get("normalize", False))
+    assert embedder.embedded == texts
+    assert vectors.dtype == writer.dtype
+    if changed.get("normalize"):
+        np.testing.assert_allclose(np.linalg.norm(np.asarray(vectors, dtype=np.float32), axis=1), 1.0, rtol=1e-3)